@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU time per edge of capturing the codes of corpus.irrp from the
+notification stream of pigpiod: per edge as pigpio.pi delivers it to
+IRRP.cbf(), and in blocks through notify_capture to IRRP.cbf_block(),
+with and without numpy.
+
+python3 benchmark/bench_capture.py
+"""
+
+
+from os import path
+import struct
+import sys
+import time
+
+import pigpio
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from gpio_backend import SimulatedPi  # noqa: E402
+from irrp_binary import open_records  # noqa: E402
+from irrp_with_class import IRRP  # noqa: E402
+from notify_capture import REPORT, edge_segments  # noqa: E402
+from numpy_support import enable_numpy  # noqa: E402
+
+GPIO = 17
+CORPUS_FILENAME = path.join(path.dirname(path.abspath(__file__)),
+                            "corpus.irrp")
+
+
+def reports(code, tick=1000000):
+    """
+    The notification stream of code: its edges after a pause, and the
+    watchdog timeout.
+    """
+    data = [REPORT.pack(0, 0, tick, 1 << GPIO)]
+    tick += 300000
+    level = 0
+    for length in [0] + list(code):
+        tick += length
+        data.append(REPORT.pack(0, 0, tick, level << GPIO))
+        level = 1 - level
+    data.append(REPORT.pack(0, pigpio.NTFY_FLAGS_WDOG | GPIO,
+                            tick + 130000, 0))
+    return b"".join(data)
+
+
+def per_edge(irrp, data):
+    # The loop of pigpio._callback_thread.run() for one callback.
+    last_level = 1 << GPIO
+    bit = 1 << GPIO
+    for offset in range(0, len(data), 12):
+        seq, flags, tick, level = struct.unpack(
+            "HHII", data[offset:offset + 12])
+        if flags == 0:
+            changed = level ^ last_level
+            last_level = level
+            if bit & changed:
+                irrp.cbf(GPIO, 1 if bit & level else 0, tick)
+        elif flags & pigpio.NTFY_FLAGS_WDOG:
+            irrp.cbf(GPIO, pigpio.TIMEOUT, tick)
+
+
+def in_blocks(irrp, data):
+    segments, _, _ = edge_segments(data, GPIO, 0, 1)
+    for lengths, timed_out in segments:
+        irrp.cbf_block(lengths, timed_out)
+
+
+def measure(irrp, capture, streams, repeat):
+    """
+    Return the CPU microseconds per edge and the captured codes.
+    """
+    edges = sum(len(code) + 1 for code, _ in streams) * repeat
+    captured = []
+    t0 = time.process_time()
+    for _ in range(repeat):
+        captured = []
+        for code, data in streams:
+            irrp.last_tick = 0
+            irrp.edge_count = 0
+            irrp.fetching_code = True
+            capture(irrp, data)
+            captured.append(irrp.edges[:irrp.edge_count].tolist())
+    seconds = time.process_time() - t0
+    return seconds / edges * 1e6, captured
+
+
+def main(repeat=50):
+    corpus = open_records(CORPUS_FILENAME)
+    streams = [(corpus[name], reports(corpus[name]))
+               for name in sorted(corpus)]
+    codes = [code for code, _ in streams]
+    irrp = IRRP(gpio=GPIO, filename="unused.irrp", post=130,
+                no_confirm=True)
+    irrp.pi = SimulatedPi()
+
+    for name, capture in (("per edge, cbf", per_edge),
+                          ("blocks, cbf_block", in_blocks)):
+        us, captured = measure(irrp, capture, streams, repeat)
+        if captured != codes:
+            raise AssertionError("{} captured other codes".format(name))
+        print("{:<26} {:>6.2f} us/edge".format(name, us))
+    if enable_numpy():
+        us, captured = measure(irrp, in_blocks, streams, repeat)
+        if captured != codes:
+            raise AssertionError("numpy captured other codes")
+        print("{:<26} {:>6.2f} us/edge".format(
+            "blocks, cbf_block, numpy", us))
+    print("{} edges per capture of {} codes".format(
+        sum(len(code) + 1 for code in codes), len(codes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of carrier generation.
+
+python3 benchmark/bench_carrier.py
+"""
+
+
+from os import path
+import sys
+import timeit
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+import carrier  # noqa: E402
+import numpy_support  # noqa: E402
+from numpy_support import enable_numpy  # noqa: E402
+
+GPIO = 17
+FREQ = 38.0
+# NEC leader, NEC bit mark and the marks of a long A/C frame.
+MARKS = [9000, 560, 3400, 430, 420, 440]
+
+
+def pulses(wf):
+    return [(p.gpio_on, p.gpio_off, p.delay) for p in wf]
+
+
+def check():
+    for micros in MARKS:
+        if (pulses(carrier.carrier_loop(GPIO, FREQ, micros)) !=
+                pulses(carrier.build_carrier(GPIO, FREQ, micros))):
+            raise AssertionError("carrier mismatch at {} us".format(micros))
+
+
+def bench(name, func, number):
+    seconds = timeit.timeit(lambda: [func(GPIO, FREQ, m) for m in MARKS],
+                            number=number)
+    print("{:<16} {:>10.1f} us/code".format(name, seconds / number * 1e6))
+
+
+def main(number=2000):
+    enable_numpy()
+    check()
+    print("numpy: {}".format("yes" if numpy_support.numpy is not None
+                             else "no"))
+    bench("loop", carrier.carrier_loop, number)
+    bench("vectorized", carrier.build_carrier, number)
+    table = carrier.CarrierTable()
+    bench("memoized", table.get, number)
+
+
+if __name__ == "__main__":
+    main()
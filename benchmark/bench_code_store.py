@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compare resolving the ID list and one code of a 1,000 code .irrp file
+by parsing the file for each (as before CodeStore) with CodeStore.
+
+The file is then converted with irrp_binary.py, and the .irrpb file is
+checked to be resolved by IRRPFile, left out of the sync manifest, and
+unmapped when CodeStore drops it.
+
+python3 benchmark/bench_code_store.py
+"""
+
+
+from os import path
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from code_store import CodeStore  # noqa: E402
+from drive_sync import data_manifest  # noqa: E402
+from irrp_binary import to_binary  # noqa: E402
+from irrp_file import IRRPFile  # noqa: E402
+
+
+def make_irrp(filename, codes=1000, seed=1):
+    rnd = random.Random(seed)
+    records = {}
+    for n in range(codes):
+        code = [9000, 4500]
+        for _ in range(rnd.choice([32, 48, 144])):
+            code += [560, rnd.choice([560, 1690])]
+        records["code_{:04d}".format(n)] = code + [560]
+    # Same layout as IRRP.record writes.
+    with open(filename, "w") as f:
+        f.write(json.dumps(records, sort_keys=True).replace("],", "],\n") +
+                "\n")
+    return list(records)
+
+
+def parse_per_send(filename, code_id):
+    with open(filename, "r") as irrp:
+        id_list = list(json.load(irrp).keys())
+    with open(filename, "r") as irrp:
+        code = json.load(irrp)[code_id]
+    return id_list, code
+
+
+def code_store_send(store, filename, code_id):
+    return store.get_id_list(filename), store.get_code(filename, code_id)
+
+
+def bench(name, func, ids, number):
+    start = time.perf_counter()
+    for n in range(number):
+        func(ids[n % len(ids)])
+    seconds = time.perf_counter() - start
+    print("{:<16} {:>10.3f} ms/send".format(name, seconds / number * 1e3))
+
+
+def check_binary(smartrc_dir, filename, ids):
+    to_binary(filename)
+    binary_filename = filename + "b"
+    irrpfile = IRRPFile(smartrc_dir, code_store=CodeStore())
+    if irrpfile.get_latest_filename() != binary_filename:
+        raise AssertionError("IRRPFile resolved {}".format(
+            irrpfile.get_latest_filename()))
+    if irrpfile.get_id_list() != ids:
+        raise AssertionError("the .irrpb file has other IDs")
+    if path.basename(binary_filename) in data_manifest(smartrc_dir):
+        raise AssertionError("the .irrpb file would be synced")
+
+    store = CodeStore(max_files=1)
+    records = store.load(binary_filename)
+    store.load(filename)
+    if not records.mm.closed:
+        raise AssertionError("the dropped .irrpb file is still mapped")
+
+
+def main(number=200):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        data_dir = path.join(tmp_dir, "data")
+        os.makedirs(data_dir)
+        filename = path.join(data_dir, "smartrc_20190101_000000.irrp")
+        ids = make_irrp(filename)
+        print("{} codes, {} bytes".format(len(ids), path.getsize(filename)))
+        store = CodeStore()
+        if (parse_per_send(filename, ids[0]) !=
+                code_store_send(store, filename, ids[0])):
+            raise AssertionError("CodeStore returned different codes")
+        bench("parse per send",
+              lambda i: parse_per_send(filename, i), ids, number)
+        bench("code store",
+              lambda i: code_store_send(store, filename, i), ids, number)
+        print("code store parsed the file {} time(s)".format(store.loads))
+        check_binary(tmp_dir, filename, sorted(ids))
+        print(".irrpb resolved, not synced, unmapped when dropped")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
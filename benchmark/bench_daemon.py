@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latency from the smartrc client to the end of the IR transmission.
+
+Start the bot or the daemon first, then
+
+python3 benchmark/bench_daemon.py SMARTRC_DIR ID
+
+"ping" is the socket round trip alone.  "send" returns when the daemon
+has finished transmitting ID.  "command" runs the whole smartrc command
+(interpreter start, client, daemon) and "fallback" the same command
+without the daemon, i.e. smartrc.py in a new process.
+"""
+
+
+from os import path
+import argparse
+import subprocess
+import sys
+import time
+
+SRC_DIR = path.join(path.dirname(path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from smartrc_client import request  # noqa: E402
+
+
+def timings(func, number):
+    result = []
+    for _ in range(number):
+        t0 = time.perf_counter()
+        func()
+        result.append((time.perf_counter() - t0) * 1000)
+    return sorted(result)
+
+
+def report(name, result):
+    print("{:<10} {:>8.2f} {:>8.2f} {:>8.2f}".format(
+        name, result[0], result[len(result) // 2],
+        result[int(len(result) * 0.95)]))
+
+
+def checked_request(smartrc_dir, command, send_id=None):
+    reply = request(smartrc_dir, command, send_id)
+    if reply is None:
+        raise SystemExit("smartrc daemon is not running")
+    if not reply["ok"]:
+        raise SystemExit(reply["message"])
+
+
+def run_command(script, smartrc_dir, send_id, extra=[]):
+    subprocess.run([sys.executable, path.join(SRC_DIR, script), smartrc_dir,
+                    "send", send_id] + extra, input=b"y\n",
+                   stdout=subprocess.DEVNULL, check=True)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("smartrc_dir")
+    p.add_argument("id")
+    p.add_argument("-n", "--number", type=int, default=50)
+    p.add_argument("--fallback", action="store_true",
+                   help="also time smartrc.py without the daemon")
+    args = p.parse_args()
+
+    checked_request(args.smartrc_dir, "send", args.id)  # Warm up.
+    print("{:<10} {:>8} {:>8} {:>8}  (ms, {} runs)".format(
+        "", "min", "median", "p95", args.number))
+    report("ping", timings(
+        lambda: checked_request(args.smartrc_dir, "ping"), args.number))
+    report("send", timings(
+        lambda: checked_request(args.smartrc_dir, "send", args.id),
+        args.number))
+    report("command", timings(
+        lambda: run_command("smartrc_client.py", args.smartrc_dir, args.id),
+        max(args.number // 5, 1)))
+    if args.fallback:
+        report("fallback", timings(
+            lambda: run_command("smartrc.py", args.smartrc_dir, args.id,
+                                ["--yes"]),
+            max(args.number // 5, 1)))
+
+
+if __name__ == "__main__":
+    main()
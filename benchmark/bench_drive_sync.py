@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Files transferred by DriveSync against a local directory standing in
+for the Drive folder: a first upload, an upload after one new snapshot,
+a download to a second Pi and a download with nothing new.  Then the
+first Pi compacts data/ and keeps 10 snapshots, and neither Pi may bring
+the removed files back.
+
+python3 benchmark/bench_drive_sync.py
+"""
+
+
+from os import path
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from drive_sync import DriveSync, LocalDirTransport  # noqa: E402
+from snapshot_store import SnapshotStore  # noqa: E402
+
+
+def make_pi(tmp_dir, name):
+    smartrc_dir = path.join(tmp_dir, name)
+    os.makedirs(path.join(smartrc_dir, "data"))
+    return smartrc_dir
+
+
+def write_snapshot(smartrc_dir, n, codes=50):
+    records = {"code_{:03d}".format(c): [9000, 4500] + [560, 1690] * 32
+               for c in range(codes + n % 7)}
+    filename = path.join(smartrc_dir, "data",
+                         "smartrc_2019{:04d}_000000.irrp".format(n))
+    with open(filename, "w") as f:
+        json.dump(records, f)
+
+
+def step(name, func, transport):
+    uploads, downloads = transport.uploads, transport.downloads
+    t0 = time.perf_counter()
+    names = func()
+    print("{:<28} {:>5} files {:>5} up {:>5} down {:>8.1f} ms".format(
+        name, len(names), transport.uploads - uploads,
+        transport.downloads - downloads, (time.perf_counter() - t0) * 1000))
+    return names
+
+
+def check_gc(sync_a, sync_b, transport):
+    store = SnapshotStore(sync_a.DATA_DIR)
+    store.compact()
+    store.gc(keep=10)
+    step("upload, after gc", sync_a.upload, transport)
+    if step("download, after gc", sync_a.download, transport):
+        raise AssertionError("removed files were downloaded again")
+    kept = set(os.listdir(sync_a.DATA_DIR))
+    if not set(step("download, other Pi", sync_b.download,
+                    transport)) <= kept:
+        raise AssertionError("removed files were downloaded")
+    if step("upload, other Pi", sync_b.upload, transport):
+        raise AssertionError("removed files were uploaded again")
+    with open(path.join(transport.DIR, DriveSync.MANIFEST_NAME)) as f:
+        remote = json.load(f)
+    live = {name for name in remote if remote[name] is not None}
+    if live != {name for name in kept if not name.startswith(".")}:
+        raise AssertionError("the manifest does not match the kept files")
+
+
+def main(snapshots=200):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        drive_dir = path.join(tmp_dir, "drive")
+        os.makedirs(drive_dir)
+        transport = LocalDirTransport(drive_dir)
+        pi_a = make_pi(tmp_dir, "a")
+        pi_b = make_pi(tmp_dir, "b")
+        for n in range(snapshots):
+            write_snapshot(pi_a, n)
+        sync_a = DriveSync(pi_a, transport)
+        sync_b = DriveSync(pi_b, transport)
+
+        step("upload, first", sync_a.upload, transport)
+        step("upload, unchanged", sync_a.upload, transport)
+        write_snapshot(pi_a, snapshots)
+        step("upload, one new snapshot", sync_a.upload, transport)
+        step("download, empty Pi", sync_b.download, transport)
+        step("download, unchanged", sync_b.download, transport)
+        write_snapshot(pi_a, snapshots + 1)
+        sync_a.upload()
+        if step("download, one new snapshot", sync_b.download,
+                transport) != ["smartrc_2019{:04d}_000000.irrp".format(
+                    snapshots + 1)]:
+            raise AssertionError("unexpected download")
+        if (sorted(os.listdir(path.join(pi_a, "data"))) !=
+                sorted(os.listdir(path.join(pi_b, "data")))):
+            raise AssertionError("data/ differs after the download")
+        check_gc(sync_a, sync_b, transport)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
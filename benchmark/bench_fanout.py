@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sending codes of corpus.irrp on three IR LEDs on SimulatedPi: one send
+per GPIO after another against one send on all three at once.  Each
+GPIO is checked to emit the recorded code, and [ROUTING] of the
+settings to pick the GPIOs of a code.
+
+python3 benchmark/bench_fanout.py
+"""
+
+
+from os import path
+import configparser
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from gpio_backend import SimulatedPi  # noqa: E402
+from irrp_binary import open_records  # noqa: E402
+from irrp_file import dumps_records  # noqa: E402
+from irrp_with_class import IRRP  # noqa: E402
+from pigpio_connection import PigpioConnection  # noqa: E402
+from routing import parse_routing, route, route_all  # noqa: E402
+
+GPIOS = [17, 22, 27]
+NAMES = ["aeha_light_on", "nec_tv_power", "sony_tv_input"]
+CORPUS_FILENAME = path.join(path.dirname(path.abspath(__file__)),
+                            "corpus.irrp")
+ROUTING = """
+[ROUTING]
+aeha_* = 22
+NEC_TV_* = 17, 27, 17
+"""
+
+
+def library():
+    irrp = IRRP(gpio=GPIOS[0], filename="unused.irrp", no_confirm=True)
+    corpus = open_records(CORPUS_FILENAME)
+    records = {name: list(corpus[name]) for name in NAMES}
+    for code in records.values():
+        irrp.normalise(code)
+    irrp.tidy(records)
+    return records
+
+
+def same_lengths(sent, code, cycle):
+    return (len(sent) == len(code) and
+            all(abs(s - c) <= cycle for s, c in zip(sent, code)))
+
+
+def check_routing():
+    config = configparser.ConfigParser()
+    config.read_string(ROUTING)
+    routing = parse_routing(config["ROUTING"])
+    expected = {"aeha_light_on": [22], "nec_tv_power": [17, 27],
+                "sony_tv_input": GPIOS}
+    for name, gpios in expected.items():
+        if route(name, routing, GPIOS) != gpios:
+            raise AssertionError("{} was routed to {}".format(
+                name, route(name, routing, GPIOS)))
+    if route_all(NAMES, routing, [4]) != [22, 17, 27, 4]:
+        raise AssertionError("scene was routed to {}".format(
+            route_all(NAMES, routing, [4])))
+
+
+def send(connection, filename, gpio, name):
+    irrp = IRRP(gpio=gpio, filename=filename, no_confirm=True,
+                connection=connection)
+    irrp.playback(name)
+
+
+def main():
+    check_routing()
+    records = library()
+    tmp_dir = tempfile.mkdtemp()
+    filename = path.join(tmp_dir, "smartrc_bench.irrp")
+    with open(filename, "w") as f:
+        f.write(dumps_records(records))
+    connection = PigpioConnection(factory=SimulatedPi)
+    pi = connection.acquire()
+    cycle = 1000.0 / 38.0
+    results = []
+    try:
+        for label, targets in (("one GPIO", [GPIOS[0]]),
+                               ("each GPIO in turn", GPIOS),
+                               ("all GPIOs at once", [GPIOS])):
+            pi.commands.clear()
+            sent = len(pi.sent)
+            t0 = time.perf_counter()
+            for name in NAMES:
+                for target in targets:
+                    send(connection, filename, target, name)
+            ms = (time.perf_counter() - t0) * 1000
+            waves = pi.commands["wave_create"]
+            index = sent
+            for name in NAMES:
+                for target in targets:
+                    gpios = target if isinstance(target, list) else [target]
+                    for gpio in gpios:
+                        if not same_lengths(pi.sent_code(gpio, index),
+                                            records[name], cycle):
+                            raise AssertionError("{} was not emitted on "
+                                                 "GPIO {}".format(name, gpio))
+                    index += 1
+            results.append((label, ms, waves, pi.round_trips))
+    finally:
+        connection.close()
+        shutil.rmtree(tmp_dir)
+
+    print("{} codes on {} GPIOs".format(len(NAMES), len(GPIOS)))
+    print("{:<18} {:>9} {:>6} {:>12}".format(
+        "", "ms", "waves", "round trips"))
+    for label, ms, waves, trips in results:
+        print("{:<18} {:>9.1f} {:>6} {:>12}".format(label, ms, waves, trips))
+
+
+if __name__ == "__main__":
+    main()
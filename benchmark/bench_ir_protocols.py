@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Round trip of ir_protocols on jittered codes and the size of an .irrp
+file with and without descriptors.
+
+python3 benchmark/bench_ir_protocols.py
+"""
+
+
+from os import path
+import random
+import sys
+import timeit
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from ir_protocols import describe, encode  # noqa: E402
+from irrp_file import dumps_records  # noqa: E402
+
+DESCRIPTORS = [
+    {"protocol": "NEC", "address": 0x40, "command": 0x12, "repeat": 0},
+    {"protocol": "NEC", "address": 0x1234, "command": 0x5678, "repeat": 2,
+     "gap": 40000},
+    {"protocol": "SONY", "address": 1, "command": 21, "bits": 12,
+     "repeat": 2, "gap": 25000},
+    {"protocol": "SONY", "address": 0x1ABC, "command": 99, "bits": 20,
+     "repeat": 0},
+    {"protocol": "RC5", "address": 5, "command": 0x35, "toggle": 1,
+     "repeat": 0},
+    {"protocol": "RC5", "address": 0, "command": 0x41, "toggle": 0,
+     "repeat": 1, "gap": 89000},
+    {"protocol": "AEHA", "address": 0x2002, "data": [128, 0, 61, 189],
+     "unit": 425, "repeat": 0},
+    {"protocol": "AEHA", "address": 0x2002,
+     "data": [random.Random(n).randrange(256) for n in range(16)],
+     "unit": 440, "repeat": 1, "gap": 10000},
+]
+
+
+def jitter(code, rng):
+    # Receivers lengthen marks and shorten spaces by about 60 us.
+    return [int(length * rng.uniform(0.92, 1.08)) + (-60 if i & 1 else 60)
+            for i, length in enumerate(code)]
+
+
+def same(descriptor, decoded):
+    if type(decoded) is not dict:
+        return False
+    for key in descriptor:
+        if key in ("unit", "gap"):
+            if abs(decoded[key] - descriptor[key]) > descriptor[key] * 0.1:
+                return False
+        elif decoded[key] != descriptor[key]:
+            return False
+    return True
+
+
+def main(trials=200):
+    rng = random.Random(0)
+    for descriptor in DESCRIPTORS:
+        code = encode(descriptor)
+        if describe(code) != descriptor:
+            raise AssertionError("round trip failed: {}".format(descriptor))
+        ok = sum(same(descriptor, describe(jitter(code, rng)))
+                 for _ in range(trials))
+        print("{:<5} {:>4} lengths  decoded {:>3}/{} jittered".format(
+            descriptor["protocol"], len(code), ok, trials))
+
+    raw = {"code_{}".format(n): jitter(encode(d), rng)
+           for n, d in enumerate(DESCRIPTORS)}
+    described = {k: describe(v) for k, v in raw.items()}
+    print("file size: raw {} bytes, described {} bytes".format(
+        len(dumps_records(raw)), len(dumps_records(described))))
+    seconds = timeit.timeit(lambda: [describe(c) for c in raw.values()],
+                            number=100)
+    print("describe: {:.1f} us/code".format(seconds / 100 / len(raw) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recording one code into a library of many: the whole library tidied
+again by tidy() against only the new code by tidy_new(), and what the
+next snapshot writes in either case.
+
+python3 benchmark/bench_merge_record.py
+"""
+
+
+from os import path
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from irrp_with_class import IRRP  # noqa: E402
+from snapshot_store import SnapshotStore  # noqa: E402
+
+MARK = 560
+SPACES = (560, 1690)
+
+
+def raw_code(rng, bits):
+    code = [int(9000 * rng.uniform(0.95, 1.05)),
+            int(4500 * rng.uniform(0.95, 1.05))]
+    for bit in bits:
+        code.append(int(MARK * rng.uniform(0.9, 1.1)))
+        code.append(int(SPACES[bit] * rng.uniform(0.9, 1.1)))
+    code.append(int(MARK * rng.uniform(0.9, 1.1)))
+    return code
+
+
+def library(irrp, rng, size):
+    records = {"code_{:03d}".format(n): raw_code(
+        rng, [rng.randrange(2) for _ in range(32)]) for n in range(size)}
+    irrp.tidy(records)
+    return records
+
+
+def copy(records):
+    return {k: list(v) for k, v in records.items()}
+
+
+def changed(before, after):
+    return sorted(k for k in after if before.get(k) != after[k])
+
+
+def main(size=300, trials=20):
+    irrp = IRRP(gpio=0, filename="unused.irrp", no_confirm=True)
+    rng = random.Random(0)
+    records = library(irrp, rng, size)
+    bits = [rng.randrange(2) for _ in range(32)]
+    new_code = raw_code(rng, bits)
+
+    full = copy(records)
+    full["new"] = list(new_code)
+    t0 = time.perf_counter()
+    for _ in range(trials):
+        irrp.tidy(copy(full))
+    full_seconds = (time.perf_counter() - t0) / trials
+    irrp.tidy(full)
+
+    merged = copy(records)
+    merged["new"] = list(new_code)
+    t0 = time.perf_counter()
+    for _ in range(trials):
+        irrp.tidy_new(copy(merged), ["new"])
+    new_seconds = (time.perf_counter() - t0) / trials
+    irrp.tidy_new(merged, ["new"])
+
+    # The new code must come out as the full tidy makes it, within
+    # tolerance, and with the lengths the library already uses.
+    if not irrp.compare(list(full["new"]), list(merged["new"])):
+        raise AssertionError("tidy_new differs from tidy")
+    known = set(v for k, code in records.items() for v in code)
+    if not set(merged["new"]) <= known:
+        raise AssertionError("tidy_new added new lengths")
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        store = SnapshotStore(tmp_dir)
+        store.commit(records, path.join(tmp_dir,
+                                        "snapshot_20190101_000000.json"))
+        for name, result in (("tidy", full), ("tidy_new", merged)):
+            writes = store.writes
+            store.commit(result, path.join(
+                tmp_dir, "snapshot_20190102_000000.json"))
+            print("{:<9} {:>7.2f} ms, {:>3} of {} codes changed, "
+                  "{:>3} code files written".format(
+                      name, (full_seconds if name == "tidy" else
+                             new_seconds) * 1000,
+                      len(changed(records, result)) - 1, size,
+                      store.writes - writes))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cost of timing the stages of sends, and the stages themselves.
+
+The marks of one send are timed with NULL_TRACE, as without [METRICS],
+and with a Trace.  Then sends are served by SmartrcDaemon on SimulatedPi
+from a temporary smartrc directory with a [METRICS] section, and the
+stages are read back with "smartrc stats" and from /metrics.
+
+python3 benchmark/bench_metrics.py
+"""
+
+
+from os import path
+from urllib.request import urlopen
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from metrics import Metrics, NULL_TRACE  # noqa: E402
+from smartrc_client import request  # noqa: E402
+from smartrc_daemon import SmartrcDaemon, start_server  # noqa: E402
+
+STAGES = ["parse", "queue", "resolve", "load", "wave_build", "wave_chain",
+          "tx"]
+SENDS = 20
+
+SETTING = """[SLACK]
+SLACK_API_TOKEN = xoxb-benchmark
+CHANNEL_ID = C00000000
+
+[BASIC]
+LOCATION = benchmark
+is_WITH_RECODER = True
+
+[SLACKBOT]
+DEFAULT_REPLY = benchmark
+
+[GPIO]
+RECORD = 18
+PLAYBACK = 17
+
+[PIGPIO]
+BACKEND = simulated
+
+[METRICS]
+HOST = 127.0.0.1
+PORT = 0
+"""
+
+
+def send_marks(trace):
+    for stage in STAGES:
+        trace.mark(stage)
+    trace.finish("reply")
+
+
+def overhead(number=100000):
+    metrics = Metrics()
+    null = min(timeit.repeat(lambda: send_marks(NULL_TRACE), number=number,
+                             repeat=5)) / number
+    traced = min(timeit.repeat(lambda: send_marks(metrics.trace()),
+                               number=number, repeat=5)) / number
+    print("per send: {:.2f} us without [METRICS], {:.2f} us with".format(
+        null * 1e6, traced * 1e6))
+
+
+def make_smartrc_dir(tmp_dir):
+    for dirname in ("setting", "data", "smartrc_completion.d"):
+        os.makedirs(path.join(tmp_dir, dirname))
+    with open(path.join(tmp_dir, "setting", ".smartrc.cfg"), "w") as f:
+        f.write(SETTING)
+    with open(path.join(tmp_dir, "data",
+                        "smartrc_20190101_000000.irrp"), "w") as f:
+        json.dump({"tv_power": [9000, 4500] + [560, 1690] * 32 + [560]}, f)
+
+
+def checked_request(smartrc_dir, command, send_id=None):
+    reply = request(smartrc_dir, command, send_id)
+    if reply is None or not reply["ok"]:
+        raise AssertionError("{} failed: {}".format(command, reply))
+    return reply["message"]
+
+
+def main():
+    overhead()
+    tmp_dir = tempfile.mkdtemp()
+    daemon = server = metrics_server = None
+    try:
+        make_smartrc_dir(tmp_dir)
+        daemon = SmartrcDaemon(tmp_dir)
+        server = start_server(daemon)
+        metrics_server = daemon.serve_metrics()
+        for _ in range(SENDS):
+            checked_request(tmp_dir, "send", "tv_power")
+        print(checked_request(tmp_dir, "stats"))
+        url = "http://127.0.0.1:{}/metrics".format(
+            metrics_server.server_address[1])
+        text = urlopen(url).read().decode("utf-8")
+        for stage in STAGES + ["reply", "total"]:
+            line = 'smartrc_stage_seconds_count{{stage="{}"}} {}'.format(
+                stage, SENDS)
+            if line not in text.splitlines():
+                raise AssertionError("{} is missing from {}".format(
+                    line, url))
+        print("{} lines of {}".format(len(text.splitlines()), url))
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if daemon is not None and daemon.pigpio_connection is not None:
+            daemon.pigpio_connection.close()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
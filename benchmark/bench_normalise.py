@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check that IRRP.normalise_sorted gives the same result as
+IRRP.normalise_pairwise on captured-like codes, and time both.
+
+python3 benchmark/bench_normalise.py
+"""
+
+
+from os import path
+import random
+import sys
+import time
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from irrp_with_class import IRRP  # noqa: E402
+
+
+def capture(marks_spaces, jitter, rnd):
+    """
+    Add reception jitter (percent) to nominal mark/space lengths.
+    """
+    return [int(round(v * (1 + rnd.uniform(-jitter, jitter) / 100.0)))
+            for v in marks_spaces]
+
+
+def nec(rnd, bits=32):
+    code = [9000, 4500]
+    for _ in range(bits):
+        code += [560, rnd.choice([560, 1690])]
+    return code + [560]
+
+
+def aeha(rnd, length_bytes):
+    t = 425
+    code = [8 * t, 4 * t]
+    for _ in range(length_bytes * 8):
+        code += [t, rnd.choice([t, 3 * t])]
+    return code + [t]
+
+
+def corpus(seed=1):
+    rnd = random.Random(seed)
+    codes = []
+    for jitter in (3, 8, 14, 20):
+        codes.append(capture(nec(rnd), jitter, rnd))
+        codes.append(capture(aeha(rnd, 18), jitter, rnd))  # 291 edges
+        codes.append(capture(aeha(rnd, 37), jitter, rnd))  # 595 edges
+    # Random lengths exercise the order dependent grouping.
+    for _ in range(50):
+        codes.append([rnd.randint(100, 3000)
+                      for _ in range(rnd.randint(1, 200))])
+    return codes
+
+
+def check(irrp, codes):
+    for code in codes:
+        pairwise = code[:]
+        irrp.normalise_pairwise(pairwise)
+        fast = code[:]
+        irrp.normalise_sorted(fast)
+        if pairwise != fast:
+            raise AssertionError("normalise mismatch: {}".format(code))
+
+
+def bench(name, func, codes, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        for code in codes:
+            func(code[:])
+    seconds = time.perf_counter() - start
+    print("{:<10} {:>10.1f} ms".format(name, seconds / number * 1e3))
+
+
+def main(number=5):
+    codes = corpus()
+    for tolerance in (5, 15, 25):
+        check(IRRP(gpio=None, filename=None, tolerance=tolerance), codes)
+    print("sorted and pairwise agree on {} codes".format(len(codes)))
+    irrp = IRRP(gpio=None, filename=None)
+    long_codes = [c for c in codes if len(c) > 250]
+    bench("pairwise", irrp.normalise_pairwise, long_codes, number)
+    bench("sorted", irrp.normalise_sorted, long_codes, number)
+
+
+if __name__ == "__main__":
+    main()
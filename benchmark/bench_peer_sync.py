@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Push snapshots from one Pi to several peers, all on localhost: a first
+push of many snapshots, a push of one new snapshot, and a push with
+nothing new.  Also checks that a wrong secret is refused, that no server
+starts without a secret and that a snapshot is not overwritten with
+other contents, and tries multicast discovery.
+
+python3 benchmark/bench_peer_sync.py
+"""
+
+
+from os import path
+import filecmp
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from exceptions import PeerSyncError  # noqa: E402
+from peer_sync import (DiscoveryResponder, PeerClient,  # noqa: E402
+                       PeerServer, discover, push_to_peers)
+
+SECRET = "benchmark"
+
+
+def make_pi(tmp_dir, name):
+    smartrc_dir = path.join(tmp_dir, name)
+    os.makedirs(path.join(smartrc_dir, "data"))
+    return smartrc_dir
+
+
+def write_snapshot(smartrc_dir, n, codes=50):
+    records = {"code_{:03d}".format(c): [9000, 4500] + [560, 1690] * 32
+               for c in range(codes + n % 7)}
+    filename = path.join(smartrc_dir, "data",
+                         "smartrc_2019{:04d}_000000.irrp".format(n))
+    with open(filename, "w") as f:
+        json.dump(records, f)
+
+
+def timed_push(name, smartrc_dir, peers):
+    t0 = time.perf_counter()
+    results = push_to_peers(smartrc_dir, peers, SECRET)
+    seconds = time.perf_counter() - t0
+    for peer, result in results.items():
+        if isinstance(result, Exception):
+            raise AssertionError("{}: {}".format(peer, result.message))
+    sent = sum(len(r) for r in results.values())
+    print("{:<24} {:>5} files to {} peers {:>8.1f} ms".format(
+        name, sent, len(peers), seconds * 1000))
+
+
+def check_overwrite(recorder, server, peer):
+    filename = path.join(recorder, "data", "snapshot_20190101_000000.json")
+    with open(filename, "w") as f:
+        json.dump({"tv_power": "0" * 64}, f)
+    push_to_peers(recorder, [peer], SECRET)
+    with open(filename, "w") as f:
+        json.dump({"tv_power": "1" * 64}, f)
+    result = push_to_peers(recorder, [peer], SECRET)[peer]
+    peer_filename = path.join(server.DATA_DIR, path.basename(filename))
+    if (not isinstance(result, PeerSyncError) or
+            filecmp.cmp(filename, peer_filename, shallow=False)):
+        raise AssertionError("a snapshot was overwritten: {}".format(result))
+    print("overwrite: {}".format(result.message))
+
+
+def main(snapshots=200, peer_count=3):
+    tmp_dir = tempfile.mkdtemp()
+    servers = []
+    try:
+        recorder = make_pi(tmp_dir, "recorder")
+        for n in range(snapshots):
+            write_snapshot(recorder, n)
+        for n in range(peer_count):
+            server = PeerServer(make_pi(tmp_dir, "peer{}".format(n)),
+                                port=0, host="127.0.0.1", secret=SECRET,
+                                verbose=False)
+            threading.Thread(target=server.serve_forever,
+                             daemon=True).start()
+            servers.append(server)
+        peers = [("127.0.0.1", s.server_address[1]) for s in servers]
+
+        timed_push("first push", recorder, peers)
+        write_snapshot(recorder, snapshots)
+        timed_push("one new snapshot", recorder, peers)
+        timed_push("nothing new", recorder, peers)
+
+        for server in servers:
+            comparison = filecmp.dircmp(path.join(recorder, "data"),
+                                        server.DATA_DIR, ignore=[])
+            if (comparison.left_only or comparison.right_only or
+                    comparison.diff_files):
+                raise AssertionError("{} differs".format(server.DATA_DIR))
+
+        try:
+            PeerClient("127.0.0.1", peers[0][1], "wrong").push(recorder)
+            raise AssertionError("wrong secret was accepted")
+        except PeerSyncError as err:
+            print("wrong secret: {}".format(err.message))
+
+        try:
+            PeerServer(make_pi(tmp_dir, "open"), port=0, host="127.0.0.1")
+            raise AssertionError("a server without a secret was started")
+        except PeerSyncError as err:
+            print("no secret: {}".format(err.message))
+
+        check_overwrite(recorder, servers[0], peers[0])
+
+        try:
+            responder = DiscoveryResponder(servers[0])
+        except OSError as err:
+            print("discovery: not available here ({})".format(err))
+        else:
+            threading.Thread(target=responder.serve_forever,
+                             daemon=True).start()
+            print("discovery: {}".format(discover(timeout=0.5)))
+            responder.close()
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
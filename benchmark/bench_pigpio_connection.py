@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PigpioConnection and IRRP.playback against a fake pigpiod on a local
+socket, which answers the commands of the pigpio socket protocol and
+closes a connection when told to:
+
+    idle     the connections are closed while idle, acquire() must find
+             out and reconnect
+    before   the socket breaks before the chain is sent, the send is
+             retried once on a new connection
+    after    the socket breaks after wave_chain, the chain is not sent
+             again and PigpioConnectionError is raised
+
+python3 benchmark/bench_pigpio_connection.py
+"""
+
+
+from collections import Counter
+from os import path
+import json
+import shutil
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import pigpio
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from exceptions import PigpioConnectionError  # noqa: E402
+from irrp_with_class import IRRP  # noqa: E402
+from pigpio_connection import PigpioConnection  # noqa: E402
+from wave_cache import WaveCache  # noqa: E402
+
+GPIO = 17
+CODE = [9000, 4500] + [560, 1690] * 32 + [560]
+# Command numbers of the pigpio socket protocol.
+WVNEW = 53
+WVCRE = 49
+WVCHA = 93
+TICK = 16
+
+
+def recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+class FakePigpiodHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.sockets.append(self.request)
+        while True:
+            header = recv_exactly(self.request, 16)
+            if header is None:
+                return
+            cmd, p1, p2, p3 = struct.unpack("IIII", header)
+            if p3 and recv_exactly(self.request, p3) is None:
+                return
+            with server.lock:
+                server.commands[cmd] += 1
+                if cmd == server.break_on:
+                    # Executed, but the reply never arrives.
+                    server.break_on = None
+                    self.request.close()
+                    return
+                result = 0
+                if cmd == WVCRE:
+                    result = server.next_wave
+                    server.next_wave += 1
+                elif cmd == TICK:
+                    result = int(time.monotonic() * 1e6) & 0xFFFFFFFF
+            self.request.sendall(struct.pack("IIII", cmd, p1, p2, result))
+
+
+class FakePigpiod(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakePigpiodHandler)
+        self.lock = threading.Lock()
+        self.commands = Counter()
+        self.sockets = []
+        self.break_on = None
+        self.next_wave = 0
+
+    def drop_connections(self):
+        with self.lock:
+            for sock in self.sockets:
+                try:
+                    sock.shutdown(2)
+                except OSError:
+                    pass
+            self.sockets = []
+
+
+def check_idle(server, connection):
+    pi = connection.acquire()
+    generation = connection.generation
+    server.drop_connections()
+    time.sleep(0.05)
+    t0 = time.perf_counter()
+    if connection.acquire() is pi or connection.generation == generation:
+        raise AssertionError("a broken idle connection was kept")
+    ms = (time.perf_counter() - t0) * 1000
+    connection.acquire().get_current_tick()
+    return ms
+
+
+def send(server, connection, filename, break_on):
+    server.break_on = break_on
+    chains = server.commands[WVCHA]
+    irrp = IRRP(gpio=GPIO, filename=filename, no_confirm=True,
+                connection=connection, wave_cache=WaveCache())
+    generation = connection.generation
+    try:
+        irrp.playback("tv_power")
+        error = None
+    except PigpioConnectionError as err:
+        error = err.message
+    if connection.generation == generation:
+        raise AssertionError("pigpiod was not reconnected")
+    return server.commands[WVCHA] - chains, error
+
+
+def main():
+    server = FakePigpiod()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tmp_dir = tempfile.mkdtemp()
+    filename = path.join(tmp_dir, "smartrc_bench.irrp")
+    with open(filename, "w") as f:
+        json.dump({"tv_power": CODE}, f)
+    connection = PigpioConnection(host="127.0.0.1",
+                                  port=server.server_address[1],
+                                  health_check_interval=0.0)
+    try:
+        ms = check_idle(server, connection)
+        print("idle: reconnected in {:.2f} ms".format(ms))
+
+        sent, error = send(server, connection, filename, WVNEW)
+        if sent != 1 or error is not None:
+            raise AssertionError("break before sending: {} chains sent, "
+                                 "{}".format(sent, error))
+        print("before: sent once after reconnecting")
+
+        sent, error = send(server, connection, filename, WVCHA)
+        if sent != 1 or error is None:
+            raise AssertionError("break after wave_chain: {} chains sent, "
+                                 "{}".format(sent, error))
+        print("after: sent once, {}".format(error))
+    except pigpio.error as err:
+        raise AssertionError(str(err))
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
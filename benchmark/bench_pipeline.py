@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end record and playback of IRRP on SimulatedPi:
+
+    capture -> normalise -> tidy -> serialize -> load -> wave build -> emit
+
+The corpus, corpus.irrp, holds codes as a receiver delivers them: NEC,
+Sony and AEHA remotes and long AEHA air conditioner codes.  Each run
+checks that the edges are captured exactly and that the emitted marks
+and spaces match the tidy codes, and that a WaveCache smaller than the
+corpus counts the wave memory pigpiod holds.  The pigpiod round trips,
+pulses and waves are compared with baseline.json and a change fails the
+run.  Times depend on the machine and are only shown.
+
+python3 benchmark/bench_pipeline.py [--save] [--realtime]
+python3 benchmark/bench_pipeline.py --make-corpus
+"""
+
+
+from os import path
+import argparse
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import pigpio
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from gpio_backend import SimulatedPi  # noqa: E402
+from ir_protocols import encode, to_code  # noqa: E402
+from irrp_binary import open_records  # noqa: E402
+from irrp_file import dumps_records, file_signature  # noqa: E402
+from irrp_with_class import IRRP  # noqa: E402
+from tx_scheduler import chain_duration  # noqa: E402
+from wave_cache import WaveCache  # noqa: E402
+
+BENCHMARK_DIR = path.dirname(path.abspath(__file__))
+CORPUS_FILENAME = path.join(BENCHMARK_DIR, "corpus.irrp")
+BASELINE_FILENAME = path.join(BENCHMARK_DIR, "baseline.json")
+GPIO = 17
+# About half of the pulses of the corpus.
+CACHE_PULSES = 2500
+CACHE_SENDS = 100
+
+CORPUS = {
+    "nec_tv_power": {"protocol": "NEC", "address": 0x40, "command": 0x12,
+                     "repeat": 0},
+    "nec_amp_volume_up": {"protocol": "NEC", "address": 0x1234,
+                          "command": 0x5678, "repeat": 2, "gap": 40000},
+    "sony_tv_input": {"protocol": "SONY", "address": 1, "command": 37,
+                      "bits": 12, "repeat": 2, "gap": 25000},
+    "sony_bd_play": {"protocol": "SONY", "address": 0x1ABC, "command": 26,
+                     "bits": 20, "repeat": 2, "gap": 25000},
+    "aeha_light_on": {"protocol": "AEHA", "address": 0x2C52,
+                      "data": [0x09, 0x2D], "unit": 425, "repeat": 0},
+    "ac_cool_26": {"protocol": "AEHA", "address": 0x2002,
+                   "data": [random.Random(18).randrange(256)
+                            for _ in range(18)],
+                   "unit": 430, "repeat": 1, "gap": 10000},
+    "ac_heat_22": {"protocol": "AEHA", "address": 0x1463,
+                   "data": [random.Random(27).randrange(256)
+                            for _ in range(27)],
+                   "unit": 440, "repeat": 1, "gap": 35000},
+}
+
+
+def jitter(code, rng):
+    # Receivers lengthen marks and shorten spaces by about 60 us.
+    return [int(length * rng.uniform(0.92, 1.08)) + (-60 if i & 1 else 60)
+            for i, length in enumerate(code)]
+
+
+def make_corpus():
+    rng = random.Random(0)
+    corpus = {name: jitter(encode(descriptor), rng)
+              for name, descriptor in sorted(CORPUS.items())}
+    with open(CORPUS_FILENAME, "w") as f:
+        f.write(dumps_records(corpus))
+    print("Wrote {} codes to {}".format(len(corpus), CORPUS_FILENAME))
+
+
+def timed(func, repeat):
+    """
+    Return the result of func and its best time in ms of repeat runs.
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - t0) * 1000)
+    return result, min(times)
+
+
+def capture(irrp, pi, code):
+    """
+    Feed code to IRRP.cbf at once and return the edges it captured.
+    """
+    irrp.edge_count = 0
+    irrp.code_ready.clear()
+    irrp.fetching_code = True
+    pi.replay(GPIO, code)
+    if not irrp.code_ready.is_set():
+        raise AssertionError("code was not captured")
+    return irrp.edges[:irrp.edge_count].tolist()
+
+
+def wait_fetching(irrp):
+    while not irrp.fetching_code:
+        time.sleep(0.001)
+
+
+def same_lengths(sent, code, cycle):
+    return (len(sent) == len(code) and
+            all(abs(s - c) <= cycle for s, c in zip(sent, code)))
+
+
+class Pipeline:
+    def __init__(self, realtime=False, repeat=20):
+        self.realtime = realtime
+        self.repeat = repeat
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = path.join(self.tmp_dir, "smartrc_bench.irrp")
+        self.pi = SimulatedPi()
+        self.irrp = IRRP(gpio=GPIO, filename=self.filename, post=130,
+                         no_confirm=True)
+        self.irrp.pi = self.pi
+        self.stages = {}
+        self.counts = {}
+
+    def close(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def stage(self, name, func, repeat=None):
+        trips = self.pi.round_trips
+        result, ms = timed(func, repeat or self.repeat)
+        self.stages[name] = ms
+        trips = (self.pi.round_trips - trips) // (repeat or self.repeat)
+        if trips:
+            self.counts[name + "_round_trips"] = trips
+        return result
+
+    def run(self, corpus):
+        irrp = self.irrp
+        pi = self.pi
+
+        cb = pi.callback(GPIO, pigpio.EITHER_EDGE, irrp.cbf)
+        captured = self.stage("capture", lambda: {
+            name: capture(irrp, pi, code)
+            for name, code in corpus.items()})
+        cb.cancel()
+        for name, code in corpus.items():
+            if captured[name] != code:
+                raise AssertionError("{} was not captured exactly".format(
+                    name))
+
+        def normalise():
+            codes = {k: list(v) for k, v in captured.items()}
+            for code in codes.values():
+                irrp.normalise(code)
+            return codes
+        normalised = self.stage("normalise", normalise)
+
+        def tidy():
+            records = {k: list(v) for k, v in normalised.items()}
+            irrp.tidy(records)
+            return records
+        records = self.stage("tidy", tidy)
+
+        text = self.stage("serialize", lambda: dumps_records(records))
+        with open(self.filename, "w") as f:
+            f.write(text)
+
+        def load():
+            loaded = open_records(self.filename)
+            return {k: to_code(loaded[k]) for k in loaded}
+        if self.stage("load", load) != records:
+            raise AssertionError("loaded codes differ")
+
+        def build():
+            waves = [irrp.create_waves(records[name])
+                     for name in sorted(records)]
+            for w in waves:
+                irrp.delete_waves(w)
+            return waves
+        waves = self.stage("wave_build", build)
+        self.counts["pulses"] = sum(w.pulses for w in waves)
+        self.counts["waves"] = sum(len(w.wave_ids) for w in waves)
+
+        self.emit(records)
+        self.cache(records)
+
+    def emit(self, records):
+        irrp = self.irrp
+        pi = self.pi
+        cycle = 1000.0 / irrp.FREQ
+        overheads = []
+        failed = []
+        for name in sorted(records):
+            waves = irrp.create_waves(records[name])
+            duration = chain_duration(waves.chain, waves.durations) / 1e6
+            t0 = time.perf_counter()
+            try:
+                irrp.tx_scheduler.send(pi, waves.chain, waves.durations)
+            except pigpio.error as err:
+                # Would fail on a Pi as well.
+                print("{}: {}".format(name, err))
+                failed.append(name)
+                continue
+            finally:
+                irrp.delete_waves(waves)
+            overheads.append((time.perf_counter() - t0 - duration) * 1000)
+            if not same_lengths(pi.sent_code(GPIO), records[name], cycle):
+                raise AssertionError("{} was not emitted as recorded".format(
+                    name))
+        self.stages["emit_overhead"] = statistics.median(overheads)
+        self.counts["emit_failures"] = len(failed)
+
+    def cache(self, records):
+        """
+        Build the waves of codes in a random order through a WaveCache of
+        CACHE_PULSES, on a pigpiod of the same size.  Each miss must
+        create its waves at the first try, and the cache must count the
+        pulses and waves pigpiod keeps memory for.
+        """
+        pi = SimulatedPi()
+        pi.MAX_PULSES = CACHE_PULSES
+        irrp = IRRP(gpio=GPIO, filename=self.filename, no_confirm=True,
+                    wave_cache=WaveCache(max_pulses=CACHE_PULSES))
+        irrp.pi = pi
+        signature = file_signature(self.filename)
+        rng = random.Random(1)
+        names = sorted(records)
+        for _ in range(CACHE_SENDS):
+            name = rng.choice(names)
+            creates = pi.commands["wave_create"]
+            waves = irrp.get_waves(name, records[name], signature)
+            creates = pi.commands["wave_create"] - creates
+            if creates not in (0, len(waves.wave_ids)):
+                raise AssertionError("{} did not fit in pigpiod".format(
+                    name))
+            pulses, _, held = irrp.wave_cache.used()
+            if (pulses, held) != (pi.pulses_in_use(), len(pi.slots)):
+                raise AssertionError(
+                    "cache counts {} pulses in {} waves, pigpiod holds {} "
+                    "in {}".format(pulses, held, pi.pulses_in_use(),
+                                   len(pi.slots)))
+        self.counts["cache_misses"] = irrp.wave_cache.misses
+
+    def realtime_latency(self, corpus):
+        """
+        Median ms from the last edge of a code to fetch_code() returning.
+        """
+        irrp = self.irrp
+        pi = self.pi
+        latencies = []
+        cb = pi.callback(GPIO, pigpio.EITHER_EDGE, irrp.cbf)
+        for name, code in sorted(corpus.items()):
+            done = {}
+
+            def replay():
+                wait_fetching(irrp)
+                pi.replay(GPIO, code, realtime=True)
+                done["last_edge"] = time.perf_counter()
+            replayer = threading.Thread(target=replay)
+            replayer.start()
+            irrp.fetch_code()
+            returned = time.perf_counter()
+            replayer.join()
+            latencies.append((returned - done["last_edge"]) * 1000)
+        cb.cancel()
+        return statistics.median(latencies)
+
+
+def compare(stages, counts, baseline):
+    regressions = []
+    print("{:<24} {:>10}".format("stage", "ms"))
+    for name, ms in stages.items():
+        print("{:<24} {:>10.3f}".format(name, ms))
+    print("{:<24} {:>10} {:>10}".format("count", "", "baseline"))
+    for name, count in sorted(counts.items()):
+        base = baseline.get("counts", {}).get(name)
+        mark = ""
+        if base is not None and count != base:
+            mark = "  changed"
+            regressions.append(name)
+        print("{:<24} {:>10} {:>10}{}".format(
+            name, count, "-" if base is None else base, mark))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--save", action="store_true",
+                        help="store the results as the baseline")
+    parser.add_argument("--realtime", action="store_true",
+                        help="also capture with the timing of the codes")
+    parser.add_argument("--make-corpus", action="store_true",
+                        help="write corpus.irrp from CORPUS")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.make_corpus:
+        make_corpus()
+        return
+
+    corpus = open_records(CORPUS_FILENAME)
+    pipeline = Pipeline(repeat=args.repeat)
+    try:
+        pipeline.run(corpus)
+        if args.realtime:
+            pipeline.stages["capture_latency"] =\
+                pipeline.realtime_latency(corpus)
+    finally:
+        pipeline.close()
+
+    try:
+        with open(BASELINE_FILENAME, "r") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    regressions = compare(pipeline.stages, pipeline.counts, baseline)
+    if args.save:
+        with open(BASELINE_FILENAME, "w") as f:
+            json.dump({"counts": pipeline.counts}, f, indent=1,
+                      sort_keys=True)
+            f.write("\n")
+        print("Saved {}".format(BASELINE_FILENAME))
+    elif regressions:
+        print("Regressions: {}".format(", ".join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RtmReceiver on a SlackClient connected to a fake RTM websocket server
+on a local socket:
+
+    latency  one event at a time, from the server sending it to the
+             handler being called
+    batch    many events in one write, which must all be dispatched in
+             order although the socket becomes readable once
+    ping     without traffic for longer than ping_interval the receiver
+             must send {"type": "ping"}
+    close    the server closes the websocket, run() must return or
+             raise SlackConnectionError, which RunSmartrcBot.main handles
+
+python3 benchmark/bench_rtm_receiver.py
+"""
+
+
+from os import path
+import base64
+import hashlib
+import json
+import socket
+import statistics
+import struct
+import sys
+import threading
+import time
+
+from slackclient import SlackClient
+from slackclient.server import SlackConnectionError
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from rtm_receiver import RtmReceiver  # noqa: E402
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+BATCH = 200
+PING_INTERVAL = 0.2
+
+
+def text_frame(text):
+    data = text.encode("utf-8")
+    if len(data) < 126:
+        return struct.pack("!BB", 0x81, len(data)) + data
+    return struct.pack("!BBH", 0x81, 126, len(data)) + data
+
+
+def close_frame():
+    return struct.pack("!BBH", 0x88, 2, 1000)
+
+
+def recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+def read_frame(sock):
+    """
+    Return the opcode and payload of a masked client frame.
+    """
+    b0, b1 = recv_exactly(sock, 2)
+    length = b1 & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", recv_exactly(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", recv_exactly(sock, 8))[0]
+    mask = recv_exactly(sock, 4)
+    data = recv_exactly(sock, length)
+    return b0 & 0x0F, bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+
+class FakeRtmServer:
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(1)
+        self.url = "ws://127.0.0.1:{}/".format(
+            self.listener.getsockname()[1])
+        self.sock = None
+        self.received = []
+        self.accepted = threading.Event()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        self.sock, _ = self.listener.accept()
+        request = b""
+        while not request.endswith(b"\r\n\r\n"):
+            request += self.sock.recv(4096)
+        key = [line.split(b":", 1)[1].strip()
+               for line in request.split(b"\r\n")
+               if line.lower().startswith(b"sec-websocket-key:")][0]
+        accept = base64.b64encode(hashlib.sha1(key + GUID).digest())
+        self.sock.sendall(b"HTTP/1.1 101 Switching Protocols\r\n"
+                          b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                          b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        self.accepted.set()
+        try:
+            while True:
+                opcode, data = read_frame(self.sock)
+                if opcode == 0x8:
+                    return
+                self.received.append(json.loads(data.decode("utf-8")))
+        except (ConnectionError, OSError):
+            pass
+
+    def send(self, *events):
+        self.sock.sendall(b"".join(text_frame(json.dumps(e))
+                                   for e in events))
+
+    def close(self):
+        self.sock.sendall(close_frame())
+        self.sock.close()
+        self.listener.close()
+
+
+class Handler:
+    def __init__(self):
+        self.events = []
+        self.times = []
+        self.condition = threading.Condition()
+
+    def __call__(self, event):
+        with self.condition:
+            self.events.append(event)
+            self.times.append(time.perf_counter())
+            self.condition.notify_all()
+
+    def wait(self, count, timeout=5.0):
+        with self.condition:
+            if not self.condition.wait_for(
+                    lambda: len(self.events) >= count, timeout):
+                raise AssertionError("{} of {} events were dispatched".format(
+                    len(self.events), count))
+
+
+def main():
+    server = FakeRtmServer()
+    sc = SlackClient("xoxb-benchmark")
+    sc.server.connect_slack_websocket(server.url)
+    server.accepted.wait()
+    handler = Handler()
+    receiver = RtmReceiver(sc, handler, ping_interval=PING_INTERVAL)
+    ended = {}
+
+    def run():
+        try:
+            receiver.run()
+            ended["by"] = "return"
+        except SlackConnectionError:
+            ended["by"] = "SlackConnectionError"
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    latencies = []
+    for n in range(50):
+        t0 = time.perf_counter()
+        server.send({"type": "message", "text": "smartrc send {}".format(n)})
+        handler.wait(n + 1)
+        latencies.append((handler.times[-1] - t0) * 1000)
+    print("latency: median {:.3f} ms, max {:.3f} ms".format(
+        statistics.median(latencies), max(latencies)))
+
+    sent = len(handler.events)
+    events = [{"type": "message", "text": str(n)} for n in range(BATCH)]
+    server.send(*events)
+    handler.wait(sent + BATCH)
+    if handler.events[sent:] != events:
+        raise AssertionError("the batch was not dispatched in order")
+    print("batch: {} events dispatched in order".format(BATCH))
+
+    time.sleep(PING_INTERVAL * 3)
+    pings = [e for e in server.received if e.get("type") == "ping"]
+    if not pings:
+        raise AssertionError("no ping was sent while idle")
+    print("ping: {} pings in {:.1f} s idle".format(len(pings),
+                                                   PING_INTERVAL * 3))
+
+    server.close()
+    thread.join(5.0)
+    if thread.is_alive() or "by" not in ended:
+        raise AssertionError("run() did not end as RunSmartrcBot.main "
+                             "expects after the server closed")
+    print("close: run() ended by {}".format(ended.get("by")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Size of data/ and of a Drive upload after many recording sessions with
+.irrp files and with snapshots, the same sessions converted by
+compact(), export to .irrp, and gc().
+
+python3 benchmark/bench_snapshot_store.py
+"""
+
+
+from os import path
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from drive_sync import DriveSync, LocalDirTransport  # noqa: E402
+from irrp_binary import open_records  # noqa: E402
+from irrp_file import IRRPFile, dumps_records  # noqa: E402
+from snapshot_store import SnapshotStore, write_snapshot  # noqa: E402
+
+
+def sessions(count, codes=60):
+    """
+    Libraries of count sessions, each re-recording a few codes.
+    """
+    rng = random.Random(0)
+    records = {}
+    for c in range(codes):
+        records["code_{:03d}".format(c)] = [9000, 4500] + [
+            rng.choice([560, 1690]) for _ in range(66)]
+    for n in range(count):
+        for _ in range(3):
+            code_id = "code_{:03d}".format(rng.randrange(codes + 10))
+            records[code_id] = [9000, 4500] + [
+                rng.choice([560, 1690]) for _ in range(66)]
+        yield n, dict(records)
+
+
+def data_size(data_dir):
+    names = os.listdir(data_dir)
+    return len(names), sum(path.getsize(path.join(data_dir, name))
+                           for name in names)
+
+
+def write_sessions(smartrc_dir, storage, count):
+    data_dir = path.join(smartrc_dir, "data")
+    for n, records in sessions(count):
+        stamp = "2019{:04d}_000000".format(n)
+        if storage == "snapshot":
+            write_snapshot(records,
+                           path.join(data_dir, "snapshot_{}.json".format(
+                               stamp)))
+        else:
+            with open(path.join(data_dir, "smartrc_{}.irrp".format(stamp)),
+                      "w") as f:
+                f.write(dumps_records(records))
+
+
+def main(count=200):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for storage in ("irrp", "snapshot"):
+            smartrc_dir = path.join(tmp_dir, storage)
+            drive_dir = path.join(tmp_dir, storage + "_drive")
+            os.makedirs(path.join(smartrc_dir, "data"))
+            os.makedirs(drive_dir)
+            write_sessions(smartrc_dir, storage, count)
+            sync = DriveSync(smartrc_dir, LocalDirTransport(drive_dir))
+            sync.upload()
+            files, size = data_size(path.join(smartrc_dir, "data"))
+            write_sessions(smartrc_dir, storage, count + 1)
+            t0 = time.perf_counter()
+            uploaded = sync.upload()
+            seconds = time.perf_counter() - t0
+            uploaded_size = sum(
+                path.getsize(path.join(smartrc_dir, "data", name))
+                for name in uploaded)
+            print("{:<9} data/ {:>5} files {:>8} bytes, next session "
+                  "uploads {} files {} bytes in {:.1f} ms".format(
+                      storage, files, size, len(uploaded), uploaded_size,
+                      seconds * 1000))
+
+        # compact() keeps every ID list and code.
+        irrp_dir = path.join(tmp_dir, "irrp", "data")
+        expected = {name[8:23]: open_records(path.join(irrp_dir, name))
+                    for name in os.listdir(irrp_dir)}
+        store = SnapshotStore(irrp_dir)
+        converted = store.compact()
+        for stamp, records in expected.items():
+            snapshot = open_records(path.join(
+                irrp_dir, "snapshot_{}.json".format(stamp)))
+            if {k: snapshot[k] for k in snapshot} != records:
+                raise AssertionError("compact changed {}".format(stamp))
+        files, size = data_size(irrp_dir)
+        print("compact   {} .irrp files -> {} files {} bytes".format(
+            len(converted), files, size))
+
+        latest = IRRPFile(path.join(tmp_dir, "irrp")).get_latest_filename()
+        export_filename = path.join(tmp_dir, "export.irrp")
+        store.export(latest, export_filename)
+        with open(export_filename, "r") as f:
+            if f.read() != dumps_records(expected[latest[-20:-5]]):
+                raise AssertionError("export differs from the .irrp file")
+        print("export    {} matches the .irrp file".format(
+            path.basename(latest)))
+
+        removed = store.gc(keep=10)
+        files, size = data_size(irrp_dir)
+        print("gc        keep 10 snapshots: removed {} files, "
+              "{} files {} bytes left".format(len(removed), files, size))
+        # Every code of the kept snapshots is still there.
+        for name in store.manifests():
+            records = open_records(path.join(irrp_dir, name))
+            if len(list(records.values())) != len(records):
+                raise AssertionError("gc removed a code of {}".format(name))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup cost of the smartrc command per subcommand.
+
+Each measurement runs in a fresh interpreter against a temporary
+smartrc directory and reports the time to import smartrc, to construct
+SmartRemoteControl, to update the completion elements and to import the
+modules the subcommand loads lazily.  The action itself (sending IR,
+talking to Slack or Drive) is not run.
+
+python3 benchmark/bench_startup.py
+"""
+
+
+from os import path
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = path.join(path.dirname(path.abspath(__file__)), "..", "src")
+
+# Modules each subcommand imports on top of smartrc.
+LAZY_IMPORTS = {
+    "send": ["irrp_with_class"],
+    "learn": ["irrp_with_class"],
+    "backup": ["gdrive"],
+    "recovery": ["gdrive"],
+    "share": ["gdrive", "slackclient"],
+}
+
+CHILD = r"""
+import sys, time, json
+t0 = time.perf_counter()
+from smartrc import SmartRemoteControl
+t1 = time.perf_counter()
+smartrc = SmartRemoteControl(sys.argv[1])
+t2 = time.perf_counter()
+smartrc.update_smatrc_completion_elements()
+t3 = time.perf_counter()
+missing = []
+for module in sys.argv[2:]:
+    try:
+        __import__(module)
+    except ImportError:
+        missing.append(module)
+t4 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "init": t2 - t1, "completion": t3 - t2,
+                  "lazy": t4 - t3, "missing": missing}))
+"""
+
+SETTING = """[SLACK]
+SLACK_API_TOKEN = xoxb-benchmark
+CHANNEL_ID = C00000000
+
+[BASIC]
+LOCATION = benchmark
+is_WITH_RECODER = True
+
+[SLACKBOT]
+DEFAULT_REPLY = benchmark
+
+[GPIO]
+RECORD = 18
+PLAYBACK = 17
+"""
+
+
+def make_smartrc_dir(tmp_dir, codes=100):
+    for dirname in ("setting", "data", "smartrc_completion.d"):
+        os.makedirs(path.join(tmp_dir, dirname))
+    with open(path.join(tmp_dir, "setting", ".smartrc.cfg"), "w") as f:
+        f.write(SETTING)
+    records = {"code_{:03d}".format(n): [9000, 4500] + [560, 1690] * 32
+               for n in range(codes)}
+    with open(path.join(tmp_dir, "data",
+                        "smartrc_20190101_000000.irrp"), "w") as f:
+        json.dump(records, f)
+
+
+def measure(smartrc_dir, modules):
+    output = subprocess.check_output(
+        [sys.executable, "-c", CHILD, smartrc_dir] + modules, cwd=SRC_DIR,
+        env=dict(os.environ, PYTHONPATH=SRC_DIR + os.pathsep +
+                 os.environ.get("PYTHONPATH", "")))
+    return json.loads(output.decode())
+
+
+def main(repeat=5):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        make_smartrc_dir(tmp_dir)
+        measure(tmp_dir, [])  # Write the index and completion file once.
+        print("{:<10} {:>8} {:>8} {:>11} {:>8}  (ms, best of {})".format(
+            "command", "import", "init", "completion", "lazy", repeat))
+        for command in ["send", "learn", "backup", "recovery", "share",
+                        "update"]:
+            modules = LAZY_IMPORTS.get(command, [])
+            runs = [measure(tmp_dir, modules) for _ in range(repeat)]
+            best = {k: min(r[k] for r in runs) * 1000
+                    for k in ("import", "init", "completion", "lazy")}
+            note = ""
+            if runs[0]["missing"]:
+                note = "  not installed: {}".format(
+                    ", ".join(runs[0]["missing"]))
+            print("{:<10} {import:>8.1f} {init:>8.1f} {completion:>11.1f}"
+                  " {lazy:>8.1f}{note}".format(command, note=note, **best))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
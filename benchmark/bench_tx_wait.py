@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+wave_tx_busy() round trips per send, polling every 2 ms as before
+against TxScheduler, with a mock pigpio that "sends" a chain in real
+time.  Also reports how late each method notices the end of the chain.
+
+python3 benchmark/bench_tx_wait.py
+"""
+
+
+from os import path
+import sys
+import time
+
+import pigpio
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from carrier import build_carrier  # noqa: E402
+from scene import scene_chains  # noqa: E402
+from tx_scheduler import TxScheduler  # noqa: E402
+
+GPIO = 17
+FREQ = 38.0
+NEC = [9000, 4500] + [560, 1690, 560, 560] * 16 + [560]
+SONY = [2400, 600] + [1200, 600, 600, 600] * 6 + [600]
+
+
+class MockPi:
+    """
+    Keeps pigpiod's view of the waves and reports busy until the
+    transmission of the last chain would have ended.
+    """
+    def __init__(self, start_latency=0.0003):
+        self.start_latency = start_latency
+        self.waves = []
+        self.pending = []
+        self.end = 0.0
+        self.busy_calls = 0
+
+    def wave_add_generic(self, pulses):
+        self.pending += pulses
+
+    def wave_create(self):
+        self.waves.append(sum(p.delay for p in self.pending))
+        self.pending = []
+        return len(self.waves) - 1
+
+    def expand(self, chain, i=0):
+        # Independent of tx_scheduler.chain_duration.
+        total = 0
+        while i < len(chain):
+            if chain[i] != 255:
+                total += self.waves[chain[i]]
+                i += 1
+            elif chain[i + 1] == 0:
+                body, i = self.expand(chain, i + 2)
+                total += body * (chain[i + 2] + 256 * chain[i + 3])
+                i += 4
+            elif chain[i + 1] == 1:
+                return total, i
+            elif chain[i + 1] == 2:
+                total += chain[i + 2] + 256 * chain[i + 3]
+                i += 4
+        return total, i
+
+    def wave_chain(self, chain):
+        duration = self.expand(chain)[0]
+        self.end = time.monotonic() + self.start_latency + duration / 1e6
+
+    def wave_tx_busy(self):
+        self.busy_calls += 1
+        return int(time.monotonic() < self.end)
+
+
+def compile_code(pi, codes):
+    marks = {}
+    spaces = {}
+    durations = {}
+    chains = []
+    for code in codes:
+        chain = []
+        for i, length in enumerate(code):
+            wids = spaces if i & 1 else marks
+            if length not in wids:
+                if i & 1:
+                    pi.wave_add_generic([pigpio.pulse(0, 0, length)])
+                else:
+                    pi.wave_add_generic(build_carrier(GPIO, FREQ, length))
+                wids[length] = pi.wave_create()
+                durations[wids[length]] = pi.waves[wids[length]]
+            chain.append(wids[length])
+        chains.append(chain)
+    return chains, durations
+
+
+def legacy(pi, chain, durations):
+    pi.wave_chain(chain)
+    while pi.wave_tx_busy():
+        time.sleep(0.002)
+
+
+def measure(name, send, waves, chain, durations, number):
+    pi = MockPi()
+    pi.waves = waves
+    late = []
+    for _ in range(number):
+        send(pi, chain, durations)
+        late.append((time.monotonic() - pi.end) * 1000)
+    print("{:<22} {:>10.1f} {:>10.2f} {:>10.2f}".format(
+        name, pi.busy_calls / number, sum(late) / number, max(late)))
+    return pi.busy_calls / number
+
+
+def main(number=20):
+    pi = MockPi()
+    (nec, sony), durations = compile_code(pi, [NEC, SONY])
+    scene = scene_chains([("nec", 1, None), ("sony", 3, 45),
+                          ("nec", 1, None)],
+                         {"nec": nec, "sony": sony}, 100)[0]
+    print("{:<22} {:>10} {:>10} {:>10}".format(
+        "", "busy/send", "late ms", "max ms"))
+    for label, chain in [("NEC", nec), ("Sony", sony), ("scene", scene)]:
+        before = measure("{} 2 ms polling".format(label), legacy,
+                         pi.waves, chain, durations, number)
+        after = measure("{} scheduled".format(label), TxScheduler().send,
+                        pi.waves, chain, durations, number)
+        print("{:<22} {:>10.1f}".format("  saved", before - after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sends that did not fit in pigpiod with one wave per distinct mark and
+space, played back on SimulatedPi with the waves of wave_planner:
+
+    the air conditioner codes of corpus.irrp, whose chains are too long
+    a code with a mark of 300 ms, which takes too many pulses
+    a scene of those codes
+
+Each send is checked to emit the recorded marks and spaces within a
+carrier cycle.
+
+python3 benchmark/bench_wave_planner.py
+"""
+
+
+from os import path
+import shutil
+import sys
+import tempfile
+
+import pigpio
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             "..", "src"))
+
+from gpio_backend import SimulatedPi  # noqa: E402
+from irrp_binary import open_records  # noqa: E402
+from irrp_file import dumps_records  # noqa: E402
+from irrp_with_class import IRRP  # noqa: E402
+from pigpio_connection import PigpioConnection  # noqa: E402
+from wave_cache import WaveCache  # noqa: E402
+from wave_planner import layout  # noqa: E402
+
+GPIO = 17
+CORPUS_FILENAME = path.join(path.dirname(path.abspath(__file__)),
+                            "corpus.irrp")
+# A key held down on a remote that sends one long burst.
+HOLD = [300000, 4500, 560, 1690, 560]
+SCENE = [("ac_cool_26", 1, None), ("hold", 2, 50), ("ac_heat_22", 1, None)]
+
+
+def library():
+    irrp = IRRP(gpio=GPIO, filename="unused.irrp", no_confirm=True)
+    corpus = open_records(CORPUS_FILENAME)
+    records = {name: list(corpus[name]) for name in corpus
+               if name.startswith("ac_")}
+    for code in records.values():
+        irrp.normalise(code)
+    irrp.tidy(records)
+    records["hold"] = HOLD
+    return records
+
+
+def plain_error(irrp, code):
+    """
+    Return the error of sending code with one wave per distinct mark and
+    space, as before the planner, or None.
+    """
+    try:
+        waves = irrp.create_waves(code, plan=layout([code], irrp.FREQ))
+    except pigpio.error as err:
+        return str(err).strip("'")
+    try:
+        irrp.tx_scheduler.send(irrp.pi, waves.chain, waves.durations)
+    except pigpio.error as err:
+        return str(err).strip("'")
+    finally:
+        irrp.delete_waves(waves)
+    return None
+
+
+def same_lengths(sent, code, cycle):
+    return (len(sent) == len(code) and
+            all(abs(s - c) <= cycle for s, c in zip(sent, code)))
+
+
+def main():
+    records = library()
+    tmp_dir = tempfile.mkdtemp()
+    filename = path.join(tmp_dir, "smartrc_bench.irrp")
+    with open(filename, "w") as f:
+        f.write(dumps_records(records))
+    connection = PigpioConnection(factory=SimulatedPi)
+    irrp = IRRP(gpio=GPIO, filename=filename, no_confirm=True,
+                wave_cache=WaveCache(), connection=connection)
+    cycle = 1000.0 / irrp.FREQ
+    try:
+        irrp.pi = connection.acquire()
+        print("{:<11} {:<29} {:>5} {:>5} {:>5} {:>6}".format(
+            "code", "one wave per length", "group", "chunk", "waves",
+            "pulses"))
+        for name in sorted(records):
+            code = records[name]
+            error = plain_error(irrp, code)
+            if error is None:
+                raise AssertionError("{} fits without the planner".format(
+                    name))
+            plan = irrp.plan_waves([code])
+            irrp.playback(name)
+            if not same_lengths(irrp.pi.sent_code(GPIO), code, cycle):
+                raise AssertionError("{} was not emitted as recorded".format(
+                    name))
+            print("{:<11} {:<29} {:>5} {:>5} {:>5} {:>6}".format(
+                name, error, plan.group, plan.chunk or "-", plan.waves,
+                plan.pulses))
+
+        sent = len(irrp.pi.sent)
+        irrp.play_scene(SCENE)
+        codes = [irrp.pi.sent_code(GPIO, i)
+                 for i in range(sent, len(irrp.pi.sent))]
+        print("scene of {} steps sent as {} chains".format(len(SCENE),
+                                                           len(codes)))
+        for name, repeat, gap_ms in SCENE:
+            for _ in range(repeat):
+                # Steps that share a chain are sent as one long code.
+                if not codes:
+                    raise AssertionError("scene was not emitted")
+                code = codes[0][:len(records[name])]
+                if not same_lengths(code, records[name], cycle):
+                    raise AssertionError("{} of the scene was not emitted "
+                                         "as recorded".format(name))
+                codes[0] = codes[0][len(records[name]) + 1:]
+                if not codes[0]:
+                    codes.pop(0)
+        print("wave cache: {} waves, {} pulses".format(
+            irrp.wave_cache.used()[2], irrp.wave_cache.used()[0]))
+    finally:
+        connection.close()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
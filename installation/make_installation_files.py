@@ -31,9 +31,10 @@ class Installation:
                                r" >> {install_sh_dirname}/log/"
                                r"smartrc_bot_$(date +\%Y\%m\%d_\%H\%M\%S).log"
                                r" 2>&1")
-        pigpiod_crontab = [r"@reboot until "
-                           "echo 'm {playback} w   w {playback} 0"
-                           "".format(playback=self.setting.gpio_playback),
+        playbacks = "   ".join("m {playback} w   w {playback} 0"
+                               "".format(playback=playback)
+                               for playback in self.setting.gpio_playbacks)
+        pigpiod_crontab = [r"@reboot until echo '" + playbacks,
                            r"' > /dev/pigpio; do sleep 1s; done"]
         if self.setting.mode:
             pigpiod_crontab.insert(1, r"   m {record} r   pud {record} u"
@@ -55,7 +56,7 @@ class Installation:
 
     def make_smartrc_file(self):
         smartrc_lines = ["#!/bin/bash\n",
-                         "python3 {install_sh_dirname}/src/smartrc.py "
+                         "python3 {install_sh_dirname}/src/smartrc_client.py "
                          "{install_sh_dirname} $@"
                          "".format(install_sh_dirname=self.INSTALL_SH_DIRNAME)]
 
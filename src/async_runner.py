@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run external commands such as gdrive with a timeout and a limit on
+how many run at once.
+"""
+
+
+from collections import deque
+import asyncio
+import subprocess
+import sys
+import threading
+
+
+class AsyncCommandRunner:
+    """
+    Run external commands such as gdrive on an asyncio event loop of its
+    own thread.
+
+    At most max_concurrent commands run at once, a command is killed
+    after timeout seconds, and its output is printed line by line while
+    it runs instead of only when it exits.  run() may be called from any
+    thread and blocks only the calling thread.
+    """
+    def __init__(self, max_concurrent=2, timeout=300.0):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        if sys.version_info < (3, 8):
+            # The child watcher of Python < 3.8 has to be attached from
+            # the main thread to the loop that starts the processes.
+            watcher = asyncio.get_child_watcher()
+            watcher.attach_loop(self.loop)
+        # Created on the loop by execute().
+        self.semaphore = None
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.running = 0
+        self.timeouts = 0
+
+    def run(self, args, timeout=None, echo=True):
+        """
+        Run args and return a subprocess.CompletedProcess with all of
+        stdout and the last lines of stderr.  stdout is printed too if
+        echo, stderr always.  Raise subprocess.TimeoutExpired if the
+        command was killed.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        future = asyncio.run_coroutine_threadsafe(
+            self.execute(list(args), timeout, echo), self.loop)
+        return future.result()
+
+    async def execute(self, args, timeout, echo):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self.semaphore:
+            self.running += 1
+            try:
+                return await self.communicate(args, timeout, echo)
+            finally:
+                self.running -= 1
+
+    async def communicate(self, args, timeout, echo):
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        stdout = []
+        stderr = deque(maxlen=20)
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                self.pump(process.stdout, args[0], stdout, echo),
+                self.pump(process.stderr, args[0], stderr, True),
+                process.wait()), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(args, timeout)
+        return subprocess.CompletedProcess(
+            args, process.returncode, b"".join(stdout), b"".join(stderr))
+
+    async def pump(self, stream, prefix, lines, echo):
+        while True:
+            line = await stream.readline()
+            if not line:
+                return
+            lines.append(line)
+            if echo:
+                print("{}: {}".format(
+                    prefix, line.decode("utf-8", "replace").rstrip()))
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Carrier pulses of IR marks, built a cycle at a time or all at once,
+and memoized per GPIO, frequency and mark length.
+"""
+
+
+from collections import OrderedDict
+import threading
+
+import pigpio
+
+import numpy_support
+
+
+def carrier_loop(gpio, frequency, micros):
+    """
+    Generate carrier square wave one cycle at a time.
+
+    This is the original implementation of IRRP.carrier, kept as the
+    reference for build_carrier().
+    """
+    wf = []
+    cycle = 1000.0 / frequency
+    cycles = int(round(micros/cycle))
+    on = int(round(cycle / 2.0))
+    sofar = 0
+    for c in range(cycles):
+        target = int(round((c+1)*cycle))
+        sofar += on
+        off = target - sofar
+        sofar += off
+        wf.append(pigpio.pulse(1 << gpio, 0, on))
+        wf.append(pigpio.pulse(0, 1 << gpio, off))
+    return wf
+
+
+def gpio_mask(gpio):
+    """
+    Return the bit mask of a GPIO or of a tuple of GPIOs.
+    """
+    if isinstance(gpio, int):
+        return 1 << gpio
+    mask = 0
+    for g in gpio:
+        mask |= 1 << g
+    return mask
+
+
+def carrier_durations(frequency, micros):
+    """
+    Return the on time and the list of off times of every carrier cycle.
+
+    Cycle c ends at round((c+1)*cycle) micros, so its off time is the
+    difference of two consecutive end times minus the on time.
+    """
+    cycle = 1000.0 / frequency
+    cycles = int(round(micros/cycle))
+    on = int(round(cycle / 2.0))
+    numpy = numpy_support.numpy
+    if numpy is not None:
+        targets = numpy.rint(numpy.arange(1, cycles+1) * cycle)
+        offs = numpy.diff(targets, prepend=0.0) - on
+        return on, offs.astype(numpy.int64).tolist()
+    targets = [int(round((c+1)*cycle)) for c in range(cycles)]
+    return on, [t - s - on for s, t in zip([0] + targets, targets)]
+
+
+def build_carrier(gpio, frequency, micros):
+    """
+    Generate the same pulses as carrier_loop(), on all GPIOs of a tuple
+    at once.
+
+    wave_add_generic() only reads the pulses, so the on pulse and the
+    one or two distinct off pulses are shared by all cycles.
+    """
+    on, offs = carrier_durations(frequency, micros)
+    mask = gpio_mask(gpio)
+    on_pulse = pigpio.pulse(mask, 0, on)
+    off_pulses = {}
+    wf = []
+    for off in offs:
+        off_pulse = off_pulses.get(off)
+        if off_pulse is None:
+            off_pulse = off_pulses[off] = pigpio.pulse(0, mask, off)
+        wf.append(on_pulse)
+        wf.append(off_pulse)
+    return wf
+
+
+class CarrierTable:
+    """
+    Memoize carrier pulses per (GPIOs, frequency, mark length) so that
+    identical marks of different codes and sends share one pulse list.
+
+    The returned lists are shared and must not be modified.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, gpio, frequency, micros):
+        key = (gpio, frequency, micros)
+        with self.lock:
+            wf = self.entries.get(key)
+            if wf is not None:
+                self.entries.move_to_end(key)
+                return wf
+        wf = build_carrier(gpio, frequency, micros)
+        with self.lock:
+            self.entries[key] = wf
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return wf
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+carrier_table = CarrierTable()
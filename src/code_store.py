@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parsed .irrp files kept in memory until they change on disk.
+"""
+
+
+from collections import OrderedDict
+import threading
+
+from irrp_file import file_signature
+from irrp_binary import open_records
+
+
+class CodeStore:
+    """
+    Parsed .irrp files shared by IRRPFile, IRRP and the bot.
+
+    A file is parsed once and kept in memory until its file_signature()
+    changes, so the ID list and every code of a send come from the same
+    parse.  Binary .irrp files are memory-mapped instead, and their codes
+    are unpacked on first use.  The map is closed when the file is
+    dropped from the store.  The returned records are shared and must
+    not be modified.
+    """
+    def __init__(self, max_files=4):
+        self.max_files = max_files
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+        self.loads = 0
+
+    def load(self, filename):
+        """
+        Return the records {id: code} of filename.
+        """
+        signature = file_signature(filename)
+        if signature is None:
+            raise FileNotFoundError("Can't open: {}".format(filename))
+        key = signature[0]
+        with self.lock:
+            entry = self.files.get(key)
+            if entry is not None and entry[0] == signature:
+                self.files.move_to_end(key)
+                return entry[1]
+
+        records = open_records(filename)
+
+        with self.lock:
+            self.loads += 1
+            entry = self.files.get(key)
+            if entry is not None and entry[0] == signature:
+                # Loaded by another thread meanwhile.
+                close_records((signature, records))
+                self.files.move_to_end(key)
+                return entry[1]
+            dropped = [self.files.pop(key, None)]
+            self.files[key] = (signature, records)
+            while len(self.files) > self.max_files:
+                dropped.append(self.files.popitem(last=False)[1])
+        for entry in dropped:
+            close_records(entry)
+        return records
+
+    def get_id_list(self, filename):
+        return list(self.load(filename).keys())
+
+    def get_code(self, filename, code_id):
+        return self.load(filename).get(code_id)
+
+    def clear(self):
+        with self.lock:
+            for entry in self.files.values():
+                close_records(entry)
+            self.files.clear()
+
+
+def close_records(entry):
+    """
+    Close the records of a (signature, records) entry if they hold a
+    memory map.
+    """
+    if entry is not None and hasattr(entry[1], "close"):
+        entry[1].close()
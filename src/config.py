@@ -7,6 +7,7 @@ Created on Sun Dec 30 09:25:09 2018
 """
 
 
+from collections import OrderedDict
 import configparser
 from os import path
 
@@ -24,7 +25,10 @@ class ReadSetting:
         self.default_reply = self.config["SLACKBOT"]["DEFAULT_REPLY"]
         if self.mode:
             self.gpio_record = int(self.config["GPIO"]["RECORD"])
-        self.gpio_playback = int(self.config["GPIO"]["PLAYBACK"])
+        # Codes are sent on all of "17, 27" at once, see routing.py.
+        self.gpio_playbacks = [
+            int(gpio) for gpio in self.config["GPIO"]["PLAYBACK"].split(",")]
+        self.gpio_playback = self.gpio_playbacks[0]
 
     def return_gdrive_id(self):
         try:
@@ -32,6 +36,133 @@ class ReadSetting:
         except KeyError:
             return False
 
+    def return_pigpio_address(self):
+        try:
+            host = self.config["PIGPIO"].get("HOST") or None
+            port = self.config["PIGPIO"].get("PORT") or None
+        except KeyError:
+            return None, None
+        if port is not None:
+            port = int(port)
+        return host, port
+
+    def return_pigpio_backend(self):
+        """
+        "pigpio", or "simulated" to run without pigpiod, see
+        gpio_backend.py.
+        """
+        try:
+            return self.config["PIGPIO"].get("BACKEND", "pigpio")
+        except KeyError:
+            return "pigpio"
+
+    def return_peers(self):
+        """
+        Return the [PEERS] section as {"hosts": [(host, port), ...],
+        "port": ..., "multicast": ..., "secret": ...}, or None if there
+        is none.
+        """
+        try:
+            section = self.config["PEERS"]
+        except KeyError:
+            return None
+        port = section.getint("PORT", fallback=51515)
+        hosts = []
+        for host in section.get("HOSTS", fallback="").split(","):
+            host = host.strip()
+            if not host:
+                continue
+            if ":" in host:
+                host, host_port = host.rsplit(":", 1)
+                hosts.append((host, int(host_port)))
+            else:
+                hosts.append((host, port))
+        return {"hosts": hosts, "port": port,
+                "multicast": section.getboolean("MULTICAST", fallback=True),
+                "secret": section.get("SECRET", fallback="") or None}
+
+    def return_metrics(self):
+        """
+        Return the [METRICS] section as {"host": ..., "port": ...}, port
+        being None for no HTTP endpoint, or None if there is none.
+        """
+        try:
+            section = self.config["METRICS"]
+        except KeyError:
+            return None
+        port = section.get("PORT", fallback="9464")
+        return {"host": section.get("HOST", fallback="127.0.0.1"),
+                "port": int(port) if port else None}
+
+    def return_decode(self):
+        """
+        Whether to store recorded codes of known protocols as descriptors.
+        """
+        try:
+            return self.config["RECORD"].getboolean("DECODE", fallback=False)
+        except KeyError:
+            return False
+
+    def return_capture(self):
+        """
+        "notify" to capture edges in blocks from the notification stream
+        of pigpiod, otherwise "callback".
+        """
+        try:
+            capture = self.config["RECORD"].get("CAPTURE", "callback")
+        except KeyError:
+            return "callback"
+        if capture.lower() == "notify":
+            return "notify"
+        return "callback"
+
+    def return_merge(self):
+        """
+        Whether a recording starts from the codes of the latest snapshot.
+        """
+        try:
+            return self.config["RECORD"].getboolean("MERGE", fallback=True)
+        except KeyError:
+            return True
+
+    def return_storage(self):
+        """
+        "snapshot" to record into content-addressed snapshots, otherwise
+        "irrp".
+        """
+        try:
+            storage = self.config["RECORD"].get("STORAGE", "irrp")
+        except KeyError:
+            return "irrp"
+        if storage.lower() == "snapshot":
+            return "snapshot"
+        return "irrp"
+
+    def return_routing(self):
+        """
+        Return {id pattern: [GPIO, ...]} of the [ROUTING] section.
+        """
+        # Imported here because installation/ links to this file only.
+        from routing import parse_routing
+        try:
+            section = self.config["ROUTING"]
+        except KeyError:
+            return OrderedDict()
+        return parse_routing(section)
+
+    def return_scenes(self):
+        """
+        Return {scene name: [(id, repeat, gap_ms), ...]}.
+        """
+        # Imported here because installation/ links to this file only.
+        from scene import parse_scene
+        try:
+            section = self.config["SCENE"]
+        except KeyError:
+            return OrderedDict()
+        return OrderedDict((name, parse_scene(name, section[name]))
+                           for name in section)
+
     def show(self):
         print("self.slack_token: {}".format(self.slack_token))
         print("self.channel_id: {}".format(self.channel_id))
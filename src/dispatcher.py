@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run bot commands off the Slack receive loop, one queue per resource,
+and coalesce repeated Drive runs.
+"""
+
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+
+
+class QueueStats:
+    """
+    Depth and wait times of one dispatcher queue.
+
+    Attributes:
+        waiting -- jobs submitted but not started yet
+        running -- jobs being executed
+        done -- jobs finished
+        total_wait -- sum of the seconds jobs waited before starting
+        max_wait -- longest wait in seconds
+        last_wait -- wait of the most recently started job in seconds
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.done = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def submitted(self):
+        with self.lock:
+            self.waiting += 1
+
+    def started(self, wait):
+        with self.lock:
+            self.waiting -= 1
+            self.running += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.last_wait = wait
+
+    def finished(self):
+        with self.lock:
+            self.running -= 1
+            self.done += 1
+
+    def average_wait(self):
+        started = self.done + self.running
+        return self.total_wait / started if started else 0.0
+
+
+class Coalescer:
+    """
+    Merge requests for the same work that arrive while it is pending.
+
+    Runs of a key are serialized and started with submit, e.g.
+    CommandDispatcher.submit, which returns a Future.  A request made
+    while a run of the key is in progress queues one more run, and
+    requests made while that run is queued share it and its Future, so
+    a burst of e.g. "download_irrp_files" messages results in at most
+    one run in progress and one more after it.  No thread waits for a
+    run: the next one is submitted when the previous one is done.
+    """
+    def __init__(self, submit):
+        self.submit_job = submit
+        self.lock = threading.Lock()
+        self.running = set()
+        self.pending = {}
+        self.coalesced = 0
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        Return a Future of the run of func that serves this request.
+        """
+        with self.lock:
+            if key in self.pending:
+                self.coalesced += 1
+                return self.pending[key][0]
+            future = Future()
+            if key in self.running:
+                self.pending[key] = (future, func, args, kwargs)
+                return future
+            self.running.add(key)
+        self.start(key, future, func, args, kwargs)
+        return future
+
+    def start(self, key, future, func, args, kwargs):
+        job = self.submit_job(func, *args, **kwargs)
+        job.add_done_callback(
+            lambda job: self.finished(key, future, job))
+
+    def finished(self, key, future, job):
+        if job.exception() is not None:
+            future.set_exception(job.exception())
+        else:
+            future.set_result(job.result())
+        with self.lock:
+            queued = self.pending.pop(key, None)
+            if queued is None:
+                self.running.discard(key)
+        if queued is not None:
+            self.start(key, *queued)
+
+
+class CommandDispatcher:
+    """
+    Run bot commands off the Slack receive loop.
+
+    A job submitted with a resource, such as the GPIO of the IR
+    transmitter, runs on a worker dedicated to that resource, so jobs on
+    the same resource are executed one at a time in submission order.
+    Jobs without a resource (Drive sync, Slack replies) run concurrently
+    on a shared pool.
+    """
+    NETWORK = "network"
+
+    def __init__(self, max_workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.serial = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def queue(self, resource):
+        """
+        Return the executor and the stats of the queue for resource.
+        """
+        name = self.NETWORK if resource is None else str(resource)
+        with self.lock:
+            if name not in self.stats:
+                self.stats[name] = QueueStats()
+                if resource is not None:
+                    self.serial[name] = ThreadPoolExecutor(max_workers=1)
+            executor = self.pool if resource is None else self.serial[name]
+            return executor, self.stats[name]
+
+    def submit(self, func, *args, resource=None, **kwargs):
+        executor, stats = self.queue(resource)
+        submitted = time.monotonic()
+
+        def job():
+            stats.started(time.monotonic() - submitted)
+            try:
+                return func(*args, **kwargs)
+            except Exception as err:
+                print("{}: {}".format(type(err).__name__, err))
+                raise
+            finally:
+                stats.finished()
+
+        stats.submitted()
+        return executor.submit(job)
+
+    def report(self):
+        lines = []
+        with self.lock:
+            items = sorted(self.stats.items())
+        for name, stats in items:
+            lines.append("{}: waiting {}, running {}, done {}, "
+                         "wait avg {:.1f} ms max {:.1f} ms "
+                         "last {:.1f} ms".format(
+                             name, stats.waiting, stats.running, stats.done,
+                             stats.average_wait() * 1000,
+                             stats.max_wait * 1000, stats.last_wait * 1000))
+        return "\n".join(lines) if lines else "No commands dispatched"
+
+    def shutdown(self, wait=True):
+        for executor in list(self.serial.values()) + [self.pool]:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Transfer only the files of data/ whose content differs from the shared
+folder.
+
+The shared folder holds smartrc_manifest.json, {name: sha256} of the
+files uploaded to it.  Local hashes are kept in
+.cache/drive_manifest.json and only recomputed when the modification
+time or size of a file changed.  A transport moves whole files:
+GDriveTransport uses the gdrive command, LocalDirTransport a local
+directory, e.g. for trying the sync without Drive.
+"""
+
+
+from os import path
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from exceptions import DriveSyncError
+from irrp_file import write_atomic
+from snapshot_store import CODE_PATTERN, read_tombstones
+
+
+def sha256_of(filename):
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_json(obj, filename):
+    write_atomic(json.dumps(obj, sort_keys=True), filename)
+
+
+def data_manifest(smartrc_dir):
+    """
+    Return {name: sha256} of the files in data/.
+    """
+    data_dir = path.join(smartrc_dir, "data")
+    cache_dir = path.join(smartrc_dir, ".cache")
+    cache_filename = path.join(cache_dir, "drive_manifest.json")
+    try:
+        with open(cache_filename, "r") as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    manifest = {}
+    new_cache = {}
+    for name in sorted(os.listdir(data_dir)):
+        filename = path.join(data_dir, name)
+        # .irrpb files are converted on each device, smartrc before
+        # irrp_binary.py could not read them.
+        if (name.startswith(".") or name.endswith((".tmp", ".irrpb")) or
+                not path.isfile(filename)):
+            continue
+        st = os.stat(filename)
+        entry = cache.get(name)
+        if entry is None or entry[:2] != [st.st_mtime_ns, st.st_size]:
+            entry = [st.st_mtime_ns, st.st_size, sha256_of(filename)]
+        new_cache[name] = entry
+        manifest[name] = entry[2]
+    if new_cache != cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_json(new_cache, cache_filename)
+    return manifest
+
+
+class LocalDirTransport:
+    """
+    A local directory standing in for the Drive folder.  File ids are
+    the file names.
+    """
+    def __init__(self, directory):
+        self.DIR = directory
+        self.uploads = 0
+        self.downloads = 0
+
+    def list(self):
+        return {name: name for name in os.listdir(self.DIR)
+                if path.isfile(path.join(self.DIR, name))}
+
+    def upload(self, filename, name, file_id=None):
+        self.uploads += 1
+        with open(filename, "rb") as f:
+            write_atomic(f.read(), path.join(self.DIR, name))
+
+    def download(self, file_id, name, directory):
+        self.downloads += 1
+        shutil.copyfile(path.join(self.DIR, file_id),
+                        path.join(directory, name))
+
+
+class GDriveTransport:
+    """
+    The Drive folder GDRIVE_ID through gdrive 2.x.  Commands run on
+    runner, an AsyncCommandRunner, if given.
+    """
+    TIMEOUT = 300.0
+    MAX_FILES = 100000
+
+    def __init__(self, folder_id, command="gdrive", runner=None):
+        self.FOLDER_ID = folder_id
+        self.COMMAND = command
+        self.runner = runner
+        self.uploads = 0
+        self.downloads = 0
+
+    def run(self, *args, echo=True):
+        args = [self.COMMAND] + list(args)
+        try:
+            if self.runner is not None:
+                completed_process = self.runner.run(args, echo=echo)
+            else:
+                completed_process =\
+                    subprocess.run(args, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   timeout=self.TIMEOUT)
+        except subprocess.TimeoutExpired as err:
+            raise DriveSyncError("Timed out: {}".format(err))
+        except OSError as err:
+            raise DriveSyncError("Can't run {}: {}".format(self.COMMAND, err))
+        if completed_process.returncode != 0:
+            raise DriveSyncError("Error:\n{}".format(completed_process))
+        return completed_process.stdout.decode("utf-8", "replace")
+
+    def list(self):
+        """
+        Return {name: file id} of the files in the folder.
+
+        gdrive pages through the listing up to --max entries.  A listing
+        that reaches MAX_FILES may have been cut short, and files missing
+        from it would be uploaded again as duplicates, so it is an error.
+        """
+        output = self.run("list", "--no-header", "--name-width", "0",
+                          "--max", str(self.MAX_FILES), "--query",
+                          "'{}' in parents and trashed = false"
+                          "".format(self.FOLDER_ID), echo=False)
+        lines = output.splitlines()
+        if len(lines) >= self.MAX_FILES:
+            raise DriveSyncError("The folder has {} or more files, the "
+                                 "listing may be incomplete".format(
+                                     self.MAX_FILES))
+        files = {}
+        for line in lines:
+            # Id Name Type Size Created, names in data/ have no spaces.
+            columns = line.split()
+            if len(columns) >= 3 and columns[2] != "dir":
+                files[columns[1]] = columns[0]
+        return files
+
+    def upload(self, filename, name, file_id=None):
+        self.uploads += 1
+        if file_id is None:
+            self.run("upload", "--parent", self.FOLDER_ID, "--name", name,
+                     filename)
+        else:
+            self.run("update", "--name", name, file_id, filename)
+
+    def download(self, file_id, name, directory):
+        self.downloads += 1
+        self.run("download", "--force", "--path", directory, file_id)
+
+
+class DriveSync:
+    """
+    Sync data/ with a transport through a manifest {name: sha256} kept
+    next to the files.  Names removed by SnapshotStore.gc() or compact()
+    are uploaded as tombstones, {name: None}, and are neither downloaded
+    nor uploaded again by any Pi.  Code files are the exception to the
+    latter: one a new snapshot refers to again is uploaded, its name
+    always stands for the same contents.
+    """
+    MANIFEST_NAME = "smartrc_manifest.json"
+
+    def __init__(self, smartrc_dir, transport):
+        self.SMARTRC_DIR = smartrc_dir
+        self.DATA_DIR = path.join(smartrc_dir, "data")
+        self.CACHE_DIR = path.join(smartrc_dir, ".cache")
+        self.transport = transport
+
+    def local_manifest(self):
+        return data_manifest(self.SMARTRC_DIR)
+
+    def remote_manifest(self, listing, tmp_dir):
+        file_id = listing.get(self.MANIFEST_NAME)
+        if file_id is None:
+            return {}
+        self.transport.download(file_id, self.MANIFEST_NAME, tmp_dir)
+        with open(path.join(tmp_dir, self.MANIFEST_NAME), "r") as f:
+            return json.load(f)
+
+    def upload(self):
+        """
+        Upload the files that are new or changed.  Return their names.
+        """
+        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.CACHE_DIR)
+        try:
+            listing = self.transport.list()
+            remote = self.remote_manifest(listing, tmp_dir)
+            local = self.local_manifest()
+            changed = [name for name in sorted(local)
+                       if (remote.get(name) != local[name] or
+                           name not in listing) and
+                       (name not in remote or remote[name] is not None or
+                        CODE_PATTERN.match(name))]
+            for name in changed:
+                self.transport.upload(path.join(self.DATA_DIR, name), name,
+                                      listing.get(name))
+                remote[name] = local[name]
+            buried = [name for name in sorted(read_tombstones(self.DATA_DIR))
+                      if name not in local and (name not in remote or
+                                                remote[name] is not None)]
+            for name in buried:
+                remote[name] = None
+            if changed or buried:
+                manifest_filename = path.join(tmp_dir, self.MANIFEST_NAME)
+                write_json(remote, manifest_filename)
+                self.transport.upload(manifest_filename, self.MANIFEST_NAME,
+                                      listing.get(self.MANIFEST_NAME))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return changed
+
+    def download(self):
+        """
+        Download the files that are new or changed.  Return their names.
+        """
+        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.CACHE_DIR)
+        try:
+            listing = self.transport.list()
+            remote = self.remote_manifest(listing, tmp_dir)
+            local = self.local_manifest()
+            tombstones = read_tombstones(self.DATA_DIR)
+            if remote:
+                changed = [name for name in sorted(remote)
+                           if name in listing and
+                           remote[name] is not None and
+                           name not in tombstones and
+                           local.get(name) != remote[name]]
+            else:
+                # A folder without a manifest, e.g. from gdrive sync.
+                changed = [name for name in sorted(listing)
+                           if name not in local and
+                           name not in tombstones and
+                           name != self.MANIFEST_NAME]
+            downloaded = []
+            for name in changed:
+                self.transport.download(listing[name], name, tmp_dir)
+                filename = path.join(tmp_dir, name)
+                if name in remote and sha256_of(filename) != remote[name]:
+                    # Replaced by another upload since the manifest was
+                    # read, the next download gets it.
+                    print("{} does not match the manifest".format(name))
+                    continue
+                os.replace(filename, path.join(self.DATA_DIR, name))
+                downloaded.append(name)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return downloaded
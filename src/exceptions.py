@@ -35,3 +35,63 @@ class SlackClassNotFound(Exception):
     """
     def __init__(self, message):
         self.message = message
+
+
+class PigpioConnectionError(Exception):
+    """Exception raised for errors that pigpiod could not be connected.
+
+    Attributes:
+        message -- explanation of the error
+    """
+    def __init__(self, message):
+        self.message = message
+
+
+class DriveSyncError(Exception):
+    """Exception raised for errors in transferring files to or from Drive.
+
+    Attributes:
+        message -- explanation of the error
+    """
+    def __init__(self, message):
+        self.message = message
+
+
+class PeerSyncError(Exception):
+    """Exception raised for errors in pushing files to a peer.
+
+    Attributes:
+        message -- explanation of the error
+    """
+    def __init__(self, message):
+        self.message = message
+
+
+class SceneError(Exception):
+    """Exception raised for errors in a scene of the [SCENE] section.
+
+    Attributes:
+        message -- explanation of the error
+    """
+    def __init__(self, message):
+        self.message = message
+
+
+class WaveBudgetError(Exception):
+    """Exception raised for codes whose waves do not fit in pigpiod.
+
+    Attributes:
+        message -- explanation of the error
+    """
+    def __init__(self, message):
+        self.message = message
+
+
+class RoutingError(Exception):
+    """Exception raised for errors in the [ROUTING] section.
+
+    Attributes:
+        message -- explanation of the error
+    """
+    def __init__(self, message):
+        self.message = message
@@ -11,10 +11,17 @@ import sys
 # gdrive sync download [GDRIVE_ID] [DIRNAME]
 # gdrive sync upload [DIRNAME] [GDRIVE_ID]
 # gdrive sync content [GDRIVE_ID]
+# upload and download only transfer changed files, see drive_sync.py.
 
 
 class GDrive:
-    def __init__(self, is_initialization=False, smartrc_dir=None):
+    TIMEOUT = 300.0
+
+    def __init__(self, is_initialization=False, smartrc_dir=None,
+                 runner=None):
+        # AsyncCommandRunner of a long-lived process, otherwise commands
+        # run with subprocess.run.
+        self.runner = runner
         if smartrc_dir is None:
             self.SMARTRC_DIR = sys.argv[1]
         else:
@@ -44,24 +51,45 @@ class GDrive:
                     as configfile:
                 setting.config.write(configfile)
 
+    def drive_sync(self):
+        from drive_sync import DriveSync, GDriveTransport
+        return DriveSync(self.SMARTRC_DIR,
+                         GDriveTransport(self.GDRIVE_ID, runner=self.runner))
+
     def download(self):
-        command_download =\
-            ("gdrive sync download "
-             "{gdrive_id} {dirname}".format(gdrive_id=self.GDRIVE_ID,
-                                            dirname=self.DATA_DIR))
-        self.run_command(command_download)
+        from exceptions import DriveSyncError
+        try:
+            names = self.drive_sync().download()
+        except DriveSyncError as err:
+            print(err.message)
+            return []
+        print("Downloaded {} files".format(len(names)))
+        return names
 
     def upload(self):
-        command_upload =\
-            ("gdrive sync upload "
-             "{dirname} {gdrive_id}".format(gdrive_id=self.GDRIVE_ID,
-                                            dirname=self.DATA_DIR))
-        self.run_command(command_upload)
+        from exceptions import DriveSyncError
+        try:
+            names = self.drive_sync().upload()
+        except DriveSyncError as err:
+            print(err.message)
+            return []
+        print("Uploaded {} files".format(len(names)))
+        return names
 
     def run_command(self, command):
-        completed_process =\
-            subprocess.run(command.split(" "), stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE)
+        args = command.split(" ")
+        try:
+            if self.runner is not None:
+                completed_process = self.runner.run(args)
+            else:
+                completed_process =\
+                    subprocess.run(args, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   timeout=self.TIMEOUT)
+        except subprocess.TimeoutExpired as err:
+            completed_process = subprocess.CompletedProcess(args, -1)
+            print("Error:\n{}".format(err))
+            return completed_process
         if completed_process.returncode == 1:
             print("Error:\n"
                   "{}".format(completed_process))
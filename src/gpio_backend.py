@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GPIO backends for PigpioConnection and IRRP.
+
+A backend is a callable taking the keyword arguments of pigpio.pi and
+returning an object with the pigpio.pi methods IRRP uses.  "pigpio" is
+pigpiod itself.  "simulated" is SimulatedPi, which runs in the process,
+so record and playback can be run and measured off a Raspberry Pi.
+"""
+
+
+from collections import Counter
+import queue
+import threading
+import time
+
+import pigpio
+
+from notify_capture import REPORT
+from scene import MAX_CHAIN, MAX_LOOPS
+
+
+def error(code):
+    return pigpio.error(pigpio.error_text(code))
+
+
+class SimulatedCallback:
+    def __init__(self, pi, gpio, edge, func):
+        self.pi = pi
+        self.gpio = gpio
+        self.edge = edge
+        self.func = func
+
+    def cancel(self):
+        self.pi.command("callback_cancel")
+        with self.pi.lock:
+            if self in self.pi.callbacks:
+                self.pi.callbacks.remove(self)
+
+
+class SimulatedNotifications:
+    """
+    The notification stream of a handle, read by NotifyCapture.
+    """
+    def __init__(self, handle):
+        self.handle = handle
+        self.bits = 0
+        self.chunks = queue.Queue()
+
+    def write(self, data):
+        self.chunks.put(data)
+
+    def read(self):
+        data = self.chunks.get()
+        if not data:
+            return b""
+        chunks = [data]
+        # What else is there, as a socket would return it.
+        while True:
+            try:
+                data = self.chunks.get_nowait()
+            except queue.Empty:
+                break
+            if not data:
+                self.chunks.put(data)
+                break
+            chunks.append(data)
+        return b"".join(chunks)
+
+    def close(self):
+        pass
+
+
+class SimulatedPi:
+    """
+    An in-process stand-in for pigpio.pi.
+
+    Waves and chains are checked against the limits of pigpiod, whose
+    wave memory is a stack: a deleted wave is only given back once the
+    waves above it are deleted too, or reused by a new wave of exactly
+    the same size.  Every call that would be a command to pigpiod is
+    counted in commands, and
+    wave_chain() keeps busy for the duration of the chain and stores
+    what it sent in sent.  replay() feeds the edges of a code to the
+    callbacks and notification streams, as an IR receiver on a GPIO
+    would.
+    """
+    MAX_WAVES = 250
+    MAX_PULSES = 12000
+    MAX_CBS = 25016
+    # pigpiod needs about two DMA control blocks per pulse.
+    CBS_PER_PULSE = 2
+
+    def __init__(self, host="localhost", port=8888, show_errors=True):
+        self.connected = True
+        self.commands = Counter()
+        self.lock = threading.RLock()
+        self.modes = {}
+        self.glitch_filters = {}
+        self.watchdogs = {}
+        self.callbacks = []
+        self.levels = {}
+        self.notifications = {}
+        self.pending = []
+        self.waves = {}
+        # Pulses of each wave id up to the top of the stack, deleted
+        # waves below it included.
+        self.slots = []
+        self.busy_until = 0.0
+        # [(wave id or None for a delay, microseconds, pulses), ...] per
+        # chain.
+        self.sent = []
+
+    def command(self, name):
+        self.commands[name] += 1
+
+    @property
+    def round_trips(self):
+        return sum(self.commands.values())
+
+    def get_current_tick(self):
+        self.command("get_current_tick")
+        return int(time.monotonic() * 1e6) & 0xFFFFFFFF
+
+    def set_mode(self, gpio, mode):
+        self.command("set_mode")
+        self.modes[gpio] = mode
+        return 0
+
+    def set_glitch_filter(self, user_gpio, steady):
+        self.command("set_glitch_filter")
+        self.glitch_filters[user_gpio] = steady
+        return 0
+
+    def set_watchdog(self, user_gpio, wdog_timeout):
+        self.command("set_watchdog")
+        with self.lock:
+            self.watchdogs[user_gpio] = wdog_timeout
+        return 0
+
+    def read(self, gpio):
+        self.command("read")
+        return self.levels.get(gpio, 1)
+
+    def notify_open(self):
+        self.command("notify_open")
+        with self.lock:
+            handle = min(set(range(32)) - set(self.notifications))
+            self.notifications[handle] = SimulatedNotifications(handle)
+        return handle
+
+    def open_notifications(self):
+        """
+        Open a handle like NotifyCapture does with a socket of its own,
+        and return its stream.
+        """
+        return self.notifications[self.notify_open()]
+
+    def notify_begin(self, handle, bits):
+        self.command("notify_begin")
+        self.notifications[handle].bits = bits
+        return 0
+
+    def notify_close(self, handle):
+        self.command("notify_close")
+        with self.lock:
+            stream = self.notifications.pop(handle)
+        stream.write(b"")
+        return 0
+
+    def callback(self, user_gpio, edge=pigpio.RISING_EDGE, func=None):
+        self.command("callback")
+        cb = SimulatedCallback(self, user_gpio, edge, func)
+        with self.lock:
+            self.callbacks.append(cb)
+        return cb
+
+    def wave_add_new(self):
+        self.command("wave_add_new")
+        self.pending = []
+        return 0
+
+    def wave_add_generic(self, pulses):
+        self.command("wave_add_generic")
+        if len(self.pending) + len(pulses) > self.MAX_PULSES:
+            raise error(pigpio.PI_TOO_MANY_PULSES)
+        self.pending.extend((p.gpio_on, p.gpio_off, p.delay)
+                            for p in pulses)
+        return len(self.pending)
+
+    def pulses_in_use(self):
+        return sum(self.slots)
+
+    def wave_create(self):
+        self.command("wave_create")
+        if not self.pending:
+            raise error(pigpio.PI_EMPTY_WAVEFORM)
+        size = len(self.pending)
+        for wave_id, pulses in enumerate(self.slots):
+            if pulses == size and wave_id not in self.waves:
+                break
+        else:
+            if len(self.slots) >= self.MAX_WAVES:
+                raise error(pigpio.PI_NO_WAVEFORM_ID)
+            pulses = self.pulses_in_use() + size
+            if pulses > self.MAX_PULSES:
+                raise error(pigpio.PI_TOO_MANY_PULSES)
+            if pulses * self.CBS_PER_PULSE > self.MAX_CBS:
+                raise error(pigpio.PI_TOO_MANY_CBS)
+            wave_id = len(self.slots)
+            self.slots.append(size)
+        self.waves[wave_id] = self.pending
+        self.pending = []
+        return wave_id
+
+    def wave_delete(self, wave_id):
+        self.command("wave_delete")
+        if wave_id not in self.waves:
+            raise error(pigpio.PI_BAD_WAVE_ID)
+        del self.waves[wave_id]
+        while self.slots and len(self.slots) - 1 not in self.waves:
+            self.slots.pop()
+        return 0
+
+    def wave_clear(self):
+        self.command("wave_clear")
+        self.waves.clear()
+        self.slots = []
+        self.pending = []
+        return 0
+
+    def wave_get_max_pulses(self):
+        self.command("wave_get_max_pulses")
+        return self.MAX_PULSES
+
+    def wave_get_max_cbs(self):
+        self.command("wave_get_max_cbs")
+        return self.MAX_CBS
+
+    def wave_chain(self, data):
+        self.command("wave_chain")
+        sent, forever = self.expand(list(data))
+        self.sent.append(sent)
+        if forever:
+            self.busy_until = float("inf")  # Until wave_tx_stop().
+        else:
+            duration = sum(entry[1] for entry in sent)
+            self.busy_until = time.monotonic() + duration / 1e6
+        return 0
+
+    def expand(self, chain):
+        """
+        Return the waves and delays chain sends in order, and whether
+        it ends in a loop forever, which is included once.
+        """
+        if len(chain) > MAX_CHAIN:
+            raise error(pigpio.PI_CHAIN_TOO_BIG)
+        # The entries of the chain and of every loop that is open.
+        blocks = [[]]
+        loops = 0
+        i = 0
+        while i < len(chain):
+            entry = chain[i]
+            if entry != 255:
+                if entry not in self.waves:
+                    raise error(pigpio.PI_BAD_WAVE_ID)
+                pulses = self.waves[entry]
+                blocks[-1].append((entry, sum(p[2] for p in pulses),
+                                   pulses))
+                i += 1
+                continue
+            if i + 1 >= len(chain):
+                raise error(pigpio.PI_BAD_CHAIN_CMD)
+            command = chain[i + 1]
+            if command == 0:  # Loop start
+                loops += 1
+                if loops > MAX_LOOPS:
+                    raise error(pigpio.PI_CHAIN_COUNTER)
+                blocks.append([])
+                i += 2
+            elif command in (1, 2) and i + 3 < len(chain):
+                value = chain[i + 2] | chain[i + 3] << 8
+                if command == 1:  # Loop repeat
+                    if len(blocks) < 2:
+                        raise error(pigpio.PI_BAD_CHAIN_LOOP)
+                    body = blocks.pop()
+                    if not body:
+                        raise error(pigpio.PI_BAD_CHAIN_LOOP)
+                    blocks[-1].extend(body * value)
+                else:  # Delay
+                    blocks[-1].append((None, value, []))
+                i += 4
+            elif command == 3:  # Loop forever
+                if len(blocks) > 1:
+                    body = blocks.pop()
+                    blocks[-1].extend(body)
+                if len(blocks) > 1 or not blocks[0]:
+                    raise error(pigpio.PI_BAD_CHAIN_LOOP)
+                return blocks[0], True
+            else:
+                raise error(pigpio.PI_BAD_CHAIN_CMD)
+        if len(blocks) > 1:
+            raise error(pigpio.PI_BAD_CHAIN_LOOP)
+        return blocks[0], False
+
+    def wave_tx_busy(self):
+        self.command("wave_tx_busy")
+        return 1 if time.monotonic() < self.busy_until else 0
+
+    def wave_tx_stop(self):
+        self.command("wave_tx_stop")
+        self.busy_until = 0.0
+        return 0
+
+    def stop(self):
+        self.connected = False
+
+    def sent_code(self, gpio, index=-1):
+        """
+        Return the marks and spaces on gpio of the chain sent index,
+        like a code of IRRP.  Pulses that switch gpio, the carrier, are
+        marks, other pulses and delays are spaces.  The final space is
+        dropped.
+        """
+        mask = 1 << gpio
+        code = []
+        for _, micros, pulses in self.sent[index]:
+            parts = [(bool((p[0] | p[1]) & mask), p[2]) for p in pulses]
+            for is_mark, micros in parts or [(False, micros)]:
+                if code and (len(code) % 2 == 1) == is_mark:
+                    code[-1] += micros
+                elif code or is_mark:
+                    code.append(micros)
+        if len(code) % 2 == 0:
+            code = code[:-1]
+        return code
+
+    def notify(self, gpio, level, tick):
+        if level != pigpio.TIMEOUT:
+            self.levels[gpio] = level
+        with self.lock:
+            callbacks = [cb for cb in self.callbacks if cb.gpio == gpio]
+            streams = [n for n in self.notifications.values()
+                       if n.bits & (1 << gpio)]
+        if streams:
+            if level == pigpio.TIMEOUT:
+                report = REPORT.pack(0, pigpio.NTFY_FLAGS_WDOG | gpio,
+                                     tick, 0)
+            else:
+                bits = 0
+                for g, l in self.levels.items():
+                    bits |= l << g
+                report = REPORT.pack(0, 0, tick, bits)
+            for stream in streams:
+                stream.write(report)
+        for cb in callbacks:
+            if (level == pigpio.TIMEOUT or cb.edge == pigpio.EITHER_EDGE or
+                    cb.edge == level):
+                cb.func(gpio, level, tick)
+
+    def replay(self, gpio, code, realtime=False, idle_us=300000):
+        """
+        Feed code to the callbacks of gpio as an active low IR receiver
+        would: a falling edge after idle_us of silence, an edge after each
+        mark and space, and then a watchdog timeout if the watchdog is
+        set.  With realtime the edges come at the times of code,
+        otherwise at once with the ticks they would have.
+        """
+        start = time.monotonic()
+        tick = (int(start * 1e6) + idle_us) & 0xFFFFFFFF
+        offset = idle_us
+        level = 0
+        for length in [0] + list(code):
+            tick = (tick + length) & 0xFFFFFFFF
+            offset += length
+            if realtime:
+                delay = start + offset / 1e6 - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self.notify(gpio, level, tick)
+            level = 1 - level
+        with self.lock:
+            timeout = self.watchdogs.get(gpio, 0)
+        if timeout:
+            if realtime:
+                time.sleep(timeout / 1000.0)
+            tick = (tick + timeout * 1000) & 0xFFFFFFFF
+            self.notify(gpio, pigpio.TIMEOUT, tick)
+
+
+BACKENDS = {"pigpio": pigpio.pi, "simulated": SimulatedPi}
+
+
+def backend(name):
+    """
+    Return the factory of backend name for PigpioConnection.
+    """
+    if name not in BACKENDS:
+        print("Unknown GPIO backend {}, using pigpio".format(name))
+        return pigpio.pi
+    return BACKENDS[name]
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Decode recorded codes of well-known IR protocols into descriptors and
+encode descriptors back into mark/space lengths.
+
+    NEC   {"protocol": "NEC", "address": 0x40, "command": 0x12,
+           "repeat": 2, "gap": 40000}
+    SONY  {"protocol": "SONY", "address": 1, "command": 21, "bits": 12,
+           "repeat": 2, "gap": 25000}
+    RC5   {"protocol": "RC5", "address": 0, "command": 12, "toggle": 0,
+           "repeat": 0}
+    AEHA  {"protocol": "AEHA", "address": 0x2002, "data": [128, 0, 61, 189],
+           "unit": 425, "repeat": 0}
+
+A code holds the first frame and "repeat" more frames, separated by
+"gap" microseconds of silence.  NEC repeats are NEC repeat codes, the
+other protocols repeat the whole frame.  An NEC address or command
+whose second byte is not the inverse of the first is stored as 16 bits.
+
+describe() only returns a descriptor if encoding it gives back the
+recorded code within TOLERANCE, so playback sends what was recorded.
+"""
+
+
+from collections import OrderedDict
+
+TOLERANCE = 0.3
+# Spaces longer than this separate frames.
+FRAME_GAP = 6000
+
+NEC_UNIT = 562
+NEC_LEADER = (9000, 4500)
+NEC_REPEAT = (9000, 2250)
+
+SONY_UNIT = 600
+SONY_BITS = (12, 15, 20)
+
+RC5_UNIT = 889
+
+AEHA_UNITS = (300, 550)
+
+
+def near(value, nominal):
+    return abs(value - nominal) <= nominal * TOLERANCE
+
+
+def split_frames(code):
+    """
+    Split code at the long spaces into frames.  Return the frames and
+    the spaces between them.
+    """
+    frames = []
+    gaps = []
+    start = 0
+    for i in range(1, len(code), 2):
+        if code[i] > FRAME_GAP:
+            frames.append(code[start:i])
+            gaps.append(code[i])
+            start = i + 1
+    frames.append(code[start:])
+    return frames, gaps
+
+
+def join_frames(frames, gap):
+    code = list(frames[0])
+    for frame in frames[1:]:
+        code.append(gap)
+        code += frame
+    return code
+
+
+def to_int(bits):
+    """
+    Value of bits sent least significant bit first.
+    """
+    return sum(b << i for i, b in enumerate(bits))
+
+
+def to_bits(value, count):
+    return [(value >> i) & 1 for i in range(count)]
+
+
+def pulse_distance_bits(frame, unit, zero_space, one_space):
+    """
+    Bits of (mark, space) pairs where the space length is the bit.
+    """
+    bits = []
+    for i in range(0, len(frame) - 1, 2):
+        if not near(frame[i], unit):
+            return None
+        if near(frame[i + 1], zero_space):
+            bits.append(0)
+        elif near(frame[i + 1], one_space):
+            bits.append(1)
+        else:
+            return None
+    return bits
+
+
+def pulse_distance_frame(leader, bits, unit, zero_space, one_space):
+    frame = list(leader)
+    for bit in bits:
+        frame += [unit, one_space if bit else zero_space]
+    frame.append(unit)
+    return frame
+
+
+def split_bytes(value):
+    """
+    An NEC byte pair: one byte if the second is its inverse.
+    """
+    low, high = value & 0xFF, value >> 8
+    if high == low ^ 0xFF:
+        return low
+    return value
+
+
+def join_bytes(value):
+    if value < 0x100:
+        return value | (value ^ 0xFF) << 8
+    return value
+
+
+def decode_nec(frames):
+    frame = frames[0]
+    if (len(frame) != 67 or not near(frame[0], NEC_LEADER[0]) or
+            not near(frame[1], NEC_LEADER[1]) or
+            not near(frame[66], NEC_UNIT)):
+        return None
+    bits = pulse_distance_bits(frame[2:66], NEC_UNIT, NEC_UNIT,
+                               3 * NEC_UNIT)
+    if bits is None:
+        return None
+    for repeat in frames[1:]:
+        if (len(repeat) != 3 or not near(repeat[0], NEC_REPEAT[0]) or
+                not near(repeat[1], NEC_REPEAT[1]) or
+                not near(repeat[2], NEC_UNIT)):
+            return None
+    return {"protocol": "NEC",
+            "address": split_bytes(to_int(bits[:16])),
+            "command": split_bytes(to_int(bits[16:]))}
+
+
+def encode_nec(descriptor):
+    bits = (to_bits(join_bytes(descriptor["address"]), 16) +
+            to_bits(join_bytes(descriptor["command"]), 16))
+    frame = pulse_distance_frame(NEC_LEADER, bits, NEC_UNIT, NEC_UNIT,
+                                 3 * NEC_UNIT)
+    repeat = list(NEC_REPEAT) + [NEC_UNIT]
+    return [frame] + [repeat] * descriptor.get("repeat", 0)
+
+
+def decode_sony_frame(frame):
+    bits = (len(frame) - 1) // 2
+    if bits not in SONY_BITS or not near(frame[0], 4 * SONY_UNIT):
+        return None
+    values = []
+    for i in range(1, len(frame), 2):
+        if not near(frame[i], SONY_UNIT):
+            return None
+        if near(frame[i + 1], SONY_UNIT):
+            values.append(0)
+        elif near(frame[i + 1], 2 * SONY_UNIT):
+            values.append(1)
+        else:
+            return None
+    return {"protocol": "SONY", "address": to_int(values[7:]),
+            "command": to_int(values[:7]), "bits": bits}
+
+
+def encode_sony_frame(descriptor):
+    bits = descriptor["bits"]
+    values = (to_bits(descriptor["command"], 7) +
+              to_bits(descriptor["address"], bits - 7))
+    frame = [4 * SONY_UNIT]
+    for value in values:
+        frame += [SONY_UNIT, 2 * SONY_UNIT if value else SONY_UNIT]
+    return frame
+
+
+def decode_rc5_frame(frame):
+    # Half bit levels.  The first half of the start bit is a space that
+    # is not part of the code, and so is the last half if the last bit
+    # is 0.
+    levels = [0]
+    for i, length in enumerate(frame):
+        level = 0 if i & 1 else 1
+        if near(length, RC5_UNIT):
+            levels.append(level)
+        elif near(length, 2 * RC5_UNIT):
+            levels += [level, level]
+        else:
+            return None
+    if len(levels) & 1:
+        levels.append(0)
+    if len(levels) != 28:
+        return None
+    bits = []
+    for first, second in zip(levels[0::2], levels[1::2]):
+        if (first, second) == (0, 1):
+            bits.append(1)
+        elif (first, second) == (1, 0):
+            bits.append(0)
+        else:
+            return None
+    if bits[0] != 1:
+        return None
+    command = int("".join(str(b) for b in bits[8:]), 2)
+    if not bits[1]:
+        command |= 0x40  # RC5X
+    return {"protocol": "RC5",
+            "address": int("".join(str(b) for b in bits[3:8]), 2),
+            "command": command, "toggle": bits[2]}
+
+
+def encode_rc5_frame(descriptor):
+    command = descriptor["command"]
+    bits = ([1, 0 if command & 0x40 else 1, descriptor["toggle"]] +
+            [int(b) for b in "{:05b}".format(descriptor["address"])] +
+            [int(b) for b in "{:06b}".format(command & 0x3F)])
+    levels = []
+    for bit in bits:
+        levels += [0, 1] if bit else [1, 0]
+    levels = levels[1:]
+    while levels[-1] == 0:
+        levels.pop()
+    frame = []
+    previous = None
+    for level in levels:
+        if level == previous:
+            frame[-1] += RC5_UNIT
+        else:
+            frame.append(RC5_UNIT)
+        previous = level
+    return frame
+
+
+def decode_aeha_frame(frame):
+    if len(frame) < 3 + 2 * 16 or (len(frame) - 3) % 16:
+        return None
+    unit = (frame[0] + frame[1]) / 12.0
+    if not AEHA_UNITS[0] <= unit <= AEHA_UNITS[1]:
+        return None
+    if (not near(frame[0], 8 * unit) or not near(frame[1], 4 * unit) or
+            not near(frame[-1], unit)):
+        return None
+    bits = pulse_distance_bits(frame[2:-1], unit, unit, 3 * unit)
+    if bits is None:
+        return None
+    # Average over the whole frame, the leader alone is too coarse.
+    units = 12 + sum(4 if b else 2 for b in bits) + 1
+    values = [to_int(bits[i:i + 8]) for i in range(0, len(bits), 8)]
+    return {"protocol": "AEHA",
+            "address": values[0] | values[1] << 8,
+            "data": values[2:],
+            "unit": int(round(sum(frame) / float(units)))}
+
+
+def encode_aeha_frame(descriptor):
+    unit = descriptor["unit"]
+    bits = (to_bits(descriptor["address"], 16) +
+            [b for value in descriptor["data"] for b in to_bits(value, 8)])
+    return pulse_distance_frame((8 * unit, 4 * unit), bits, unit, unit,
+                                3 * unit)
+
+
+def repeated(decode_frame):
+    """
+    Decoder of protocols that repeat the whole frame.  The frames must
+    decode the same apart from "unit", which is averaged.
+    """
+    def decode(frames):
+        descriptors = [decode_frame(frame) for frame in frames]
+        if None in descriptors:
+            return None
+        units = [d.pop("unit", None) for d in descriptors]
+        descriptor = descriptors[0]
+        if any(d != descriptor for d in descriptors[1:]):
+            return None
+        if units[0] is not None:
+            descriptor["unit"] = int(round(sum(units) / float(len(units))))
+        return descriptor
+    return decode
+
+
+def repeating(encode_frame):
+    def encode(descriptor):
+        return [encode_frame(descriptor)] * (descriptor.get("repeat", 0) + 1)
+    return encode
+
+
+PROTOCOLS = OrderedDict([
+    ("NEC", (decode_nec, encode_nec)),
+    ("AEHA", (repeated(decode_aeha_frame), repeating(encode_aeha_frame))),
+    ("SONY", (repeated(decode_sony_frame), repeating(encode_sony_frame))),
+    ("RC5", (repeated(decode_rc5_frame), repeating(encode_rc5_frame))),
+])
+
+
+def decode(code):
+    """
+    Return the descriptor of code, or None if no protocol matches.
+    """
+    if len(code) % 2 != 1:
+        return None
+    frames, gaps = split_frames(code)
+    for protocol in PROTOCOLS:
+        descriptor = PROTOCOLS[protocol][0](frames)
+        if descriptor is not None:
+            descriptor["repeat"] = len(gaps)
+            if gaps:
+                descriptor["gap"] = int(round(sum(gaps) / float(len(gaps))))
+            return descriptor
+    return None
+
+
+def encode(descriptor):
+    """
+    Return the mark/space lengths of a descriptor.
+    """
+    frames = PROTOCOLS[descriptor["protocol"]][1](descriptor)
+    return join_frames(frames, descriptor.get("gap", 0))
+
+
+def matches(code, other):
+    return (len(code) == len(other) and
+            all(near(c, o) for c, o in zip(code, other)))
+
+
+def describe(code):
+    """
+    Return the descriptor of code if it reproduces code, otherwise code.
+    """
+    descriptor = decode(code)
+    if descriptor is not None and matches(code, encode(descriptor)):
+        return descriptor
+    return code
+
+
+def to_code(record):
+    """
+    Return the mark/space lengths of a record of an .irrp file.
+    """
+    if type(record) is dict:
+        return encode(record)
+    return record
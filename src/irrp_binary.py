@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact binary .irrp format with random access to single codes.
+
+Layout (little-endian)
+
+    header   b"IRRB", version u8, 3 reserved bytes, count u32
+    index    count entries of
+                 id length u16, id (UTF-8),
+                 type u8 (b"H" uint16, b"I" uint32, b"d" float64,
+                          b"j" JSON),
+                 values u32, offset u32 (from the start of the file)
+    data     the packed pulse lengths of every code
+
+A code is stored as uint16 if all its lengths are integers below 65536,
+as uint32 if they fit 32 bits, and as float64 otherwise, so conversion
+from and to the JSON layout written by IRRP.record is lossless.  Protocol
+descriptors (see ir_protocols.py) are stored as UTF-8 JSON, "values" is
+then their length in bytes.  Version 1 files have no descriptors.
+
+To convert use
+
+python3 src/irrp_binary.py to-binary data/smartrc_xxx.irrp
+python3 src/irrp_binary.py to-json data/smartrc_xxx.irrpb smartrc_xxx.irrp
+
+to-binary writes data/smartrc_xxx.irrpb next to the .irrp file, which
+IRRPFile then resolves instead.  .irrpb files are left out of the Drive
+and peer sync, so other devices keep getting the .irrp file.
+"""
+
+
+from collections.abc import Mapping
+from os import path
+import argparse
+import json
+import mmap
+import struct
+
+from irrp_file import dumps_records, write_atomic
+from snapshot_store import is_manifest, open_snapshot
+
+MAGIC = b"IRRB"
+VERSION = 2
+VERSIONS = (1, 2)
+HEADER = struct.Struct("<4sB3xI")
+ENTRY = struct.Struct("<cII")
+ITEM_SIZE = {b"H": 2, b"I": 4, b"d": 8, b"j": 1}
+
+
+def is_binary(filename):
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def type_code(code):
+    if type(code) is dict:
+        return b"j"
+    if all(type(v) is int and 0 <= v for v in code):
+        if max(code, default=0) < 1 << 16:
+            return b"H"
+        if max(code) < 1 << 32:
+            return b"I"
+    return b"d"
+
+
+def write_binary(records, filename):
+    """
+    Write records {id: [pulse lengths]} in the binary layout.
+    """
+    ids = sorted(records)
+    encoded_ids = [i.encode("utf-8") for i in ids]
+    types = [type_code(records[i]) for i in ids]
+    offset = HEADER.size + sum(2 + len(e) + ENTRY.size for e in encoded_ids)
+
+    index = [HEADER.pack(MAGIC, VERSION, len(ids))]
+    data = []
+    for code_id, encoded_id, t in zip(ids, encoded_ids, types):
+        code = records[code_id]
+        if t == b"j":
+            packed = json.dumps(code, sort_keys=True).encode("utf-8")
+        else:
+            packed = struct.pack("<{}{}".format(len(code), t.decode()), *code)
+        index.append(struct.pack("<H", len(encoded_id)) + encoded_id)
+        index.append(ENTRY.pack(t, len(packed) // ITEM_SIZE[t], offset))
+        data.append(packed)
+        offset += len(packed)
+
+    write_atomic(b"".join(index + data), filename)
+
+
+class IRRPBinaryFile(Mapping):
+    """
+    Read-only mapping {id: [pulse lengths]} over a memory-mapped binary
+    .irrp file.  Only the index is read when the file is opened, and a
+    code is unpacked from the map the first time it is looked up.
+    """
+    def __init__(self, filename):
+        self.FILE = filename
+        with open(filename, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version not in VERSIONS:
+            self.mm.close()
+            raise ValueError("Not a binary irrp file: {}".format(filename))
+        self.index = {}
+        pos = HEADER.size
+        for _ in range(count):
+            (id_length,) = struct.unpack_from("<H", self.mm, pos)
+            pos += 2
+            code_id = self.mm[pos:pos + id_length].decode("utf-8")
+            pos += id_length
+            self.index[code_id] = ENTRY.unpack_from(self.mm, pos)
+            pos += ENTRY.size
+        self.codes = {}
+
+    def __getitem__(self, code_id):
+        code = self.codes.get(code_id)
+        if code is None:
+            t, values, offset = self.index[code_id]
+            if t == b"j":
+                code = json.loads(
+                    self.mm[offset:offset + values].decode("utf-8"))
+            else:
+                code = list(struct.unpack_from(
+                    "<{}{}".format(values, t.decode()), self.mm, offset))
+            self.codes[code_id] = code
+        return code
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, code_id):
+        return code_id in self.index
+
+    def close(self):
+        self.mm.close()
+
+
+def open_records(filename):
+    """
+    Return the records of a JSON or binary .irrp file or of a snapshot
+    of snapshot_store.  Binary files are returned as a read-only
+    IRRPBinaryFile, snapshots as a read-only SnapshotRecords.
+    """
+    if is_manifest(filename):
+        return open_snapshot(filename)
+    if is_binary(filename):
+        return IRRPBinaryFile(filename)
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def binary_filename_of(json_filename):
+    return path.splitext(json_filename)[0] + ".irrpb"
+
+
+def to_binary(json_filename, binary_filename=None):
+    if binary_filename is None:
+        binary_filename = binary_filename_of(json_filename)
+    with open(json_filename, "r") as f:
+        write_binary(json.load(f), binary_filename)
+
+
+def to_json(binary_filename, json_filename):
+    records = IRRPBinaryFile(binary_filename)
+    try:
+        text = dumps_records(dict(records))
+    finally:
+        records.close()
+    with open(json_filename, "w") as f:
+        f.write(text)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("direction", choices=["to-binary", "to-json"])
+    p.add_argument("source")
+    p.add_argument("destination", nargs="?",
+                   help="to-binary: default the source with .irrpb")
+    args = p.parse_args()
+    if args.direction == "to-binary":
+        to_binary(args.source, args.destination)
+    elif args.destination is None:
+        p.error("to-json needs a destination")
+    else:
+        to_json(args.source, args.destination)
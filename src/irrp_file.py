@@ -7,46 +7,185 @@ Created on Thu Jan  3 22:55:57 2019
 """
 
 
-from glob import glob
-from os import path
+from os import chmod, fdopen, listdir, makedirs, path, remove, replace, stat
 from datetime import datetime
 import json
+import re
+import time
+
+
+def file_signature(filename):
+    """
+    Return (realpath, mtime_ns, size) of filename, or None if it does not
+    exist.  Two equal signatures mean the file has not been rewritten.
+    """
+    try:
+        st = stat(filename)
+    except FileNotFoundError:
+        return None
+    return (path.realpath(filename), st.st_mtime_ns, st.st_size)
+
+
+def write_atomic(data, filename):
+    """
+    Replace filename with data, str or bytes, through a temporary file of
+    its own in the same directory.  Readers never see a partial file, and
+    concurrent writers do not collide on a shared temporary name.
+    """
+    # Imported here, it is not needed for starting smartrc.
+    import tempfile
+    fd, tmp_filename = tempfile.mkstemp(dir=path.dirname(filename),
+                                        suffix=".tmp")
+    try:
+        with fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        chmod(tmp_filename, 0o644)
+        replace(tmp_filename, filename)
+    except BaseException:
+        try:
+            remove(tmp_filename)
+        except OSError:
+            pass
+        raise
+
+
+def dumps_records(records):
+    """
+    Return records {id: code} in the layout IRRP.record writes,
+    one code per line.  Codes are lists of lengths or protocol
+    descriptors.
+    """
+    return "{" + ",\n ".join(
+        "{}: {}".format(json.dumps(k), json.dumps(records[k], sort_keys=True))
+        for k in sorted(records)) + "}\n"
 
 
 class IRRPFile:
-    def __init__(self, smartrc_dir):
+    """
+    Resolve the latest snapshot data/smartrc_%Y%m%d_%H%M%S.irrp,
+    data/smartrc_%Y%m%d_%H%M%S.irrpb (see irrp_binary.py) or
+    data/snapshot_%Y%m%d_%H%M%S.json (see snapshot_store.py) and its ID
+    list.
+
+    The result is kept in memory and in .cache/irrp_index.json, and is
+    reused as long as the modification time of data/ (which changes when
+    a snapshot is added, e.g. by gdrive sync download) and of the latest
+    snapshot are unchanged.  Resolving therefore costs one or two stat()
+    calls instead of listing data/ and parsing the snapshot.
+    """
+    SNAPSHOT_PATTERN = re.compile(
+        r"^(?:smartrc_(\d{8}_\d{6})\.irrp(b?)|"
+        r"snapshot_(\d{8}_\d{6})\.json)$")
+    # A directory modified this close to the scan may still get files
+    # with the same modification time, so the scan is not trusted.
+    RACY_SECONDS = 2.0
+
+    def __init__(self, smartrc_dir, code_store=None, storage="irrp"):
         self.SMARTRC_DIR = smartrc_dir
+        self.code_store = code_store
+        # "irrp" or "snapshot", the kind of file get_new_filename() names.
+        self.STORAGE = storage
+        self.DATA_DIR = path.join(self.SMARTRC_DIR, "data")
+        self.INDEX_FILENAME = path.join(self.SMARTRC_DIR, ".cache",
+                                        "irrp_index.json")
+        self.index = None
 
     def get_new_filename(self):
         str_datetime = datetime.strftime(datetime.today(), "%Y%m%d_%H%M%S")
-        filename = path.join(self.SMARTRC_DIR,
-                             "data/smartrc_{}.irrp".format(str_datetime))
+        if self.STORAGE == "snapshot":
+            basename = "snapshot_{}.json".format(str_datetime)
+        else:
+            basename = "smartrc_{}.irrp".format(str_datetime)
+        filename = path.join(self.SMARTRC_DIR, "data", basename)
         return filename
 
     def get_id_list(self):
         filename = self.get_latest_filename()
         if filename is False:
             return []
-        with open(filename, "r") as irrp:
-            irrp_dict = json.load(irrp)
+        signature = file_signature(filename)
+        if signature is None:
+            raise FileNotFoundError("irrpfile could not be found")
+        if self.index.get("latest_signature") == list(signature[1:]):
+            return list(self.index["ids"])
 
-        return list(irrp_dict.keys())
+        if self.code_store is not None:
+            id_list = self.code_store.get_id_list(filename)
+        else:
+            from irrp_binary import open_records
+            id_list = list(open_records(filename).keys())
+
+        self.index["latest_signature"] = list(signature[1:])
+        self.index["ids"] = id_list
+        self.save_index()
+        return list(id_list)
 
     def get_latest_filename(self):
-        filenames = glob(path.join(self.SMARTRC_DIR, "data/smartrc_*.irrp"))
-        if len(filenames) < 1:
+        try:
+            data_mtime_ns = stat(self.DATA_DIR).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if self.index is None:
+            self.index = self.load_index()
+        if self.index.get("data_mtime_ns") != data_mtime_ns:
+            latest = self.scan_latest()
+            if latest != self.index.get("latest"):
+                self.index = {"latest": latest}
+            self.index["data_mtime_ns"] = self.trusted_mtime(data_mtime_ns)
+            self.save_index()
+        if self.index["latest"] is None:
             return False
-        datetime_list = []
-        for filename in filenames:
-            datetime_list.append(
-                datetime.strptime(path.basename(filename),
-                                  "smartrc_%Y%m%d_%H%M%S.irrp"))
-        if not len(datetime_list) > 0:
-            raise FileNotFoundError("irrpfile could not be found")
-
-        str_datetime = datetime.strftime(max(datetime_list), "%Y%m%d_%H%M%S")
         return path.join(self.SMARTRC_DIR,
-                         "data/smartrc_{}.irrp".format(str_datetime))
+                         "data/{}".format(self.index["latest"]))
+
+    def scan_latest(self):
+        """
+        Return the basename of the latest snapshot, or None.
+
+        The timestamps in the names have a fixed width, so the latest
+        snapshot has the greatest timestamp.  Of files with the same
+        timestamp a snapshot is taken before an .irrpb file, converted
+        from the .irrp file, and that before the .irrp file.
+        """
+        try:
+            filenames = listdir(self.DATA_DIR)
+        except FileNotFoundError:
+            return None
+        snapshots = []
+        for f in filenames:
+            match = self.SNAPSHOT_PATTERN.match(f)
+            if match:
+                if match.group(3) is not None:
+                    snapshots.append((match.group(3), 2, f))
+                else:
+                    snapshots.append((match.group(1),
+                                      1 if match.group(2) else 0, f))
+        if len(snapshots) < 1:
+            return None
+        return max(snapshots)[2]
+
+    def trusted_mtime(self, mtime_ns):
+        if time.time() - mtime_ns / 1e9 < self.RACY_SECONDS:
+            return None  # Scan again next time.
+        return mtime_ns
+
+    def load_index(self):
+        try:
+            with open(self.INDEX_FILENAME, "r") as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(index, dict):
+            return {}
+        return index
+
+    def save_index(self):
+        # The index is only a cache, so failing to write it is not an error.
+        try:
+            makedirs(path.dirname(self.INDEX_FILENAME), exist_ok=True)
+            write_atomic(json.dumps(self.index), self.INDEX_FILENAME)
+        except OSError as err:
+            print("Could not write {}: {}".format(self.INDEX_FILENAME, err))
 
 
 if __name__ == "__main__":
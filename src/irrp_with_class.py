@@ -26,7 +26,8 @@ To playback use
 where
 
 -p playback
--g the GPIO connected to the IR transmitter
+-g the GPIO connected to the IR transmitter, repeated to send on
+   several transmitters at once
 -f the file storing the codes to transmit
 
 and 2 3 4 is a list of codes to transmit.
@@ -48,6 +49,7 @@ RECORD
 --short      reject codes with less than short pulses, default 10
 --tolerance  consider pulses the same if within tolerance percent, default 15
 --no-confirm don't require a code to be repeated during record
+--base       start from the codes of this file if file does not exist
 
 TRANSMIT
 
@@ -56,21 +58,45 @@ TRANSMIT
 """
 
 import time
-import json
 import os
 import argparse
+import shutil
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
 
 import pigpio  # http://abyz.co.uk/rpi/pigpio/python.html
 
+from carrier import carrier_table
+import notify_capture
+from irrp_file import dumps_records, file_signature, write_atomic
+from irrp_binary import open_records
+from ir_protocols import describe, to_code
+from wave_cache import CompiledWave
+from scene import STEP_ENTRIES, STEP_LOOPS, scene_chains
+from snapshot_store import is_manifest, write_snapshot
+from tx_scheduler import TxScheduler
+from wave_planner import WaveBudget, build_wave, plan_waves
+from metrics import NULL_TRACE
+from numpy_support import enable_numpy
+from exceptions import PigpioConnectionError
+
 
 class IRRP:
     def __init__(self, gpio, filename,
                  freq=38.0,
                  gap=100, glitch=100, post=15, pre=200, short=10, tolerance=15,
-                 verbose=False, no_confirm=False):
+                 verbose=False, no_confirm=False, wave_cache=None,
+                 connection=None, normalise="sorted", max_edges=2048,
+                 code_store=None, tx_scheduler=None, decode=False,
+                 base=None, capture="callback", trace=None):
 
         self.GPIO = gpio
         self.FILE = filename
+        # Library a recording starts from if FILE does not exist yet.
+        self.BASE = base
 
         self.FREQ = freq
 
@@ -80,10 +106,38 @@ class IRRP:
         self.PRE_MS = pre
         self.SHORT = short
         self.TOLERANCE = tolerance
+        self.NORMALISE = normalise
+        self.DECODE = decode
+        # "callback": cbf() per edge, "notify": cbf_block() per block of
+        # the notification stream, see notify_capture.py.
+        self.CAPTURE = capture
 
         self.VERBOSE = verbose
         self.NO_CONFIRM = no_confirm
 
+        # Keep created waves across sends if a WaveCache is given,
+        # otherwise delete them after each code is sent.
+        self.wave_cache = wave_cache
+
+        # Use a shared PigpioConnection if given, otherwise connect to
+        # pigpiod for each record or playback.
+        self.connection = connection
+
+        # Parsed .irrp files shared with the caller.
+        self.code_store = code_store
+
+        # Waits for the end of each sent chain.
+        if tx_scheduler is None:
+            tx_scheduler = TxScheduler()
+        self.tx_scheduler = tx_scheduler
+
+        # Times the stages of a send, see metrics.py.
+        if trace is None:
+            trace = NULL_TRACE
+        self.trace = trace
+        # Whether a chain has been passed to pigpiod in this send.
+        self.sending = False
+
         self.additional_calculation()
 
         self.last_tick = 0
@@ -91,6 +145,14 @@ class IRRP:
         self.code = []
         self.fetching_code = False
 
+        # Edges of the code being captured.  cbf() writes them from the
+        # pigpio callback thread into this preallocated buffer and sets
+        # code_ready at the end of the code.
+        self.MAX_EDGES = max_edges
+        self.edges = array("I", [0]) * max_edges
+        self.edge_count = 0
+        self.code_ready = threading.Event()
+
     def with_argument(self):
         is_record, identification = self.get_argument()
         self.rec_or_ply(is_record, identification)
@@ -104,8 +166,8 @@ class IRRP:
         g.add_argument("-r", "--record", help="record keys",
                        action="store_true")
 
-        p.add_argument("-g", "--gpio", help="GPIO for RX/TX",
-                       required=True, type=int)
+        p.add_argument("-g", "--gpio", help="GPIO for RX/TX, repeat to TX "
+                       "on several", required=True, type=int, action="append")
         p.add_argument("-f", "--file", help="Filename",       required=True)
 
         p.add_argument('id', nargs='+', type=str, help='IR codes')
@@ -126,6 +188,14 @@ class IRRP:
         p.add_argument("--tolerance", help="tolerance percent",
                        type=int, default=15)
 
+        p.add_argument("--normalise", help="pulse clustering method",
+                       choices=["sorted", "pairwise"], default="sorted")
+        p.add_argument("--decode", help="store known protocols compactly",
+                       action="store_true")
+        p.add_argument("--base", help="record into a copy of this file")
+        p.add_argument("--capture", help="edge capture method",
+                       choices=["callback", "notify"], default="callback")
+
         p.add_argument("-v", "--verbose", help="Be verbose",
                        action="store_true")
         p.add_argument("--no-confirm", help="No confirm needed",
@@ -133,7 +203,7 @@ class IRRP:
 
         args = p.parse_args()
 
-        self.GPIO = args.gpio
+        self.GPIO = args.gpio[0] if len(args.gpio) == 1 else args.gpio
         self.FILE = args.file
         self.GLITCH = args.glitch
         self.PRE_MS = args.pre
@@ -144,6 +214,10 @@ class IRRP:
         self.GAP_MS = args.gap
         self.NO_CONFIRM = args.no_confirm
         self.TOLERANCE = args.tolerance
+        self.NORMALISE = args.normalise
+        self.DECODE = args.decode
+        self.BASE = args.base
+        self.CAPTURE = args.capture
         identification = args.id
         self.additional_calculation()
         if args.record:  # Record mode
@@ -153,6 +227,11 @@ class IRRP:
         return is_record, identification
 
     def additional_calculation(self):
+        # Playback sends on all GPIOs of a list at once.
+        if isinstance(self.GPIO, (list, tuple)):
+            self.GPIOS = tuple(self.GPIO)
+        else:
+            self.GPIOS = (self.GPIO,)
         self.POST_US = self.POST_MS * 1000
         self.PRE_US = self.PRE_MS * 1000
         self.GAP_S = self.GAP_MS / 1000.0
@@ -174,28 +253,23 @@ class IRRP:
         except FileNotFoundError:
             pass
 
+        # Linked rather than renamed, so f stays readable until the
+        # caller replaces it.
         try:
-            os.rename(os.path.realpath(f), os.path.realpath(f)+".bak")
+            os.link(os.path.realpath(f), os.path.realpath(f)+".bak")
         except FileNotFoundError:
             pass
+        except OSError:
+            shutil.copy2(os.path.realpath(f), os.path.realpath(f)+".bak")
 
     def carrier(self, gpio, frequency, micros):
         """
-        Generate carrier square wave.
-        """
-        wf = []
-        cycle = 1000.0 / frequency
-        cycles = int(round(micros/cycle))
-        on = int(round(cycle / 2.0))
-        sofar = 0
-        for c in range(cycles):
-            target = int(round((c+1)*cycle))
-            sofar += on
-            off = target - sofar
-            sofar += off
-            wf.append(pigpio.pulse(1 << gpio, 0, on))
-            wf.append(pigpio.pulse(0, 1 << gpio, off))
-        return wf
+        Generate carrier square wave on a GPIO or a tuple of GPIOs.
+
+        The pulses are memoized per (gpio, frequency, micros) and shared,
+        so the returned list must not be modified.
+        """
+        return carrier_table.get(gpio, frequency, micros)
 
     def normalise(self, c):
         """
@@ -234,6 +308,18 @@ class IRRP:
         """
         if self.VERBOSE:
             print("before normalise", c)
+        if self.NORMALISE == "pairwise":
+            self.normalise_pairwise(c)
+        else:
+            self.normalise_sorted(c)
+        if self.VERBOSE:
+            print("after normalise", c)
+
+    def normalise_pairwise(self, c):
+        """
+        Compare every unprocessed pulse with all later pulses of the same
+        kind.  Quadratic in the length of the code.
+        """
         entries = len(c)
         p = [0]*entries  # Set all entries not processed.
         for i in range(entries):
@@ -262,8 +348,77 @@ class IRRP:
                             c[j] = newv
                             p[j] = 1
 
-        if self.VERBOSE:
-            print("after normalise", c)
+    def normalise_sorted(self, c):
+        """
+        Same result as normalise_pairwise() in O(n log n).
+
+        The pulses of each kind are sorted by length once.  The pulses
+        similar to the first unprocessed pulse v form a contiguous range
+        of the sorted lengths, so the processed pulses are kept as a list
+        of disjoint ranges of sorted positions and each new group is the
+        gaps of its range between the already processed ranges.
+        """
+        toler_min = self.TOLER_MIN
+        toler_max = self.TOLER_MAX
+        for base in (0, 1):  # Marks, then spaces.
+            order = sorted(range(base, len(c), 2), key=c.__getitem__)
+            lengths = [c[i] for i in order]
+            position = [0]*len(c)
+            for k, i in enumerate(order):
+                position[i] = k
+            n = len(order)
+            starts = []  # Processed ranges of sorted positions.
+            ends = []
+
+            for i in range(base, len(c), 2):
+                k_i = position[i]
+                r = bisect_right(starts, k_i) - 1
+                if r >= 0 and k_i < ends[r]:  # Processed.
+                    continue
+                v = c[i]
+
+                # Sorted range where length*TOLER_MIN < v < length*TOLER_MAX.
+                lo = bisect_left(lengths, v / toler_max)
+                while lo > 0 and v < lengths[lo-1]*toler_max:
+                    lo -= 1
+                while lo < n and not v < lengths[lo]*toler_max:
+                    lo += 1
+                hi = bisect_left(lengths, v / toler_min, lo)
+                while hi > lo and not lengths[hi-1]*toler_min < v:
+                    hi -= 1
+                while hi < n and lengths[hi]*toler_min < v:
+                    hi += 1
+
+                if not lo <= k_i < hi:  # Only if v <= 0.
+                    lo, hi = k_i, k_i + 1
+
+                # Collect the unprocessed gaps and merge the processed
+                # ranges overlapping [lo, hi) into one.
+                first = bisect_right(ends, lo)
+                last = bisect_left(starts, hi)
+                similar = []
+                cur = lo
+                for r in range(first, last):
+                    if starts[r] > cur:
+                        similar.extend(order[cur:starts[r]])
+                    cur = max(cur, ends[r])
+                if cur < hi:
+                    similar.extend(order[cur:hi])
+                if first < last:
+                    lo = min(lo, starts[first])
+                    hi = max(hi, ends[last-1])
+                starts[first:last] = [lo]
+                ends[first:last] = [hi]
+
+                # Sum in index order, like normalise_pairwise().  The
+                # leader has the lowest index of all unprocessed pulses.
+                similar.sort()
+                tot = v
+                for j in similar[1:]:
+                    tot = tot + c[j]
+                newv = round(tot / float(len(similar)), 2)
+                for j in similar:
+                    c[j] = newv
 
     def compare(self, p1, p2):
         """
@@ -363,19 +518,97 @@ class IRRP:
 
     def tidy(self, records):
 
+        # Protocol descriptors are already exact.
+        records = {k: v for k, v in records.items() if type(v) is list}
+
         self.tidy_mark_space(records, 0)  # Marks.
 
         self.tidy_mark_space(records, 1)  # Spaces.
 
+    def tidy_new(self, records, new_ids):
+        """
+        Tidy the codes new_ids of records like tidy(), against the other
+        codes, which are tidy already and are not changed.
+        """
+        new = {k: records[k] for k in new_ids
+               if type(records.get(k)) is list}
+        old = {k: v for k, v in records.items()
+               if type(v) is list and k not in new}
+
+        self.tidy_new_mark_space(old, new, 0)  # Marks.
+
+        self.tidy_new_mark_space(old, new, 1)  # Spaces.
+
+    def tidy_new_mark_space(self, old, new, base):
+
+        ms = {}
+        for rec in new:
+            for plen in new[rec][base::2]:
+                ms[plen] = ms.get(plen, 0) + 1
+        if not ms:
+            return
+
+        known = set()
+        for rec in old:
+            known.update(old[rec][base::2])
+        levels = sorted(known)
+
+        # A length within tolerance of a known length becomes the
+        # nearest one.  The others are collapsed as tidy_mark_space()
+        # does.
+
+        rest = []
+        for plen in sorted(ms):
+            i = bisect_left(levels, plen)
+            near = [k for k in levels[max(i - 1, 0):i + 1]
+                    if k*self.TOLER_MIN <= plen <= k*self.TOLER_MAX]
+            if near:
+                ms[plen] = min(near, key=lambda k: abs(k - plen))
+            else:
+                rest.append(plen)
+
+        clusters = []
+        for plen in rest:
+            if not clusters or plen >= clusters[-1][0]*self.TOLER_MAX:
+                clusters.append([])
+            clusters[-1].append(plen)
+        for e in clusters:
+            tot = sum(plen * ms[plen] for plen in e)
+            similar = sum(ms[plen] for plen in e)
+            v = int(round(tot/float(similar)))
+            for plen in e:
+                ms[plen] = v
+
+        if self.VERBOSE:
+            print("t_n_m_s", ms)
+
+        for rec in new:
+            rl = len(new[rec])
+            for i in range(base, rl, 2):
+                new[rec][i] = ms[new[rec][i]]
+
     def end_of_code(self):
-        # global code, fetching_code
-        if len(self.code) > self.SHORT:
-            self.normalise(self.code)
+        # Called from the pigpio callback thread, fetch_code() does the rest.
+        if self.edge_count > self.SHORT:
             self.fetching_code = False
+            self.code_ready.set()
         else:
-            self.code = []
+            self.edge_count = 0
             print("Short code, probably a repeat, try again")
 
+    def fetch_code(self):
+        """
+        Wait until a code longer than SHORT pulses has been captured and
+        return it normalised.
+        """
+        self.edge_count = 0
+        self.code_ready.clear()
+        self.fetching_code = True
+        self.code_ready.wait()
+        self.code = self.edges[:self.edge_count].tolist()
+        self.normalise(self.code)
+        return self.code
+
     def cbf(self, gpio, level, tick):
 
         # global last_tick, in_code, code, fetching_code
@@ -400,7 +633,14 @@ class IRRP:
                     self.end_of_code()
 
                 elif self.in_code:
-                    self.code.append(edge)
+                    n = self.edge_count
+                    if n < self.MAX_EDGES:
+                        self.edges[n] = edge
+                        self.edge_count = n + 1
+                    else:  # Buffer full, end the code here.
+                        self.in_code = False
+                        self.pi.set_watchdog(self.GPIO, 0)
+                        self.end_of_code()
 
         else:
             self.pi.set_watchdog(self.GPIO, 0)  # Cancel watchdog.
@@ -408,6 +648,40 @@ class IRRP:
                 self.in_code = False
                 self.end_of_code()
 
+    def cbf_block(self, lengths, timed_out):
+        """
+        cbf() for a block of edges.  lengths are the microseconds between
+        edges, timed_out is whether the watchdog fired after them.  The
+        watchdog is left to NotifyCapture.
+        """
+        i = 0
+        n = len(lengths)
+        while i < n and self.fetching_code:
+            if not self.in_code:
+                # Start of a code.
+                i = notify_capture.first_above(lengths, i, self.PRE_US)
+                self.in_code = i < n
+                i += 1
+                continue
+            end = notify_capture.first_above(lengths, i, self.POST_US)
+            count = min(end - i, self.MAX_EDGES - self.edge_count)
+            start = self.edge_count
+            self.edges[start:start + count] =\
+                notify_capture.to_array(lengths[i:i + count])
+            self.edge_count = start + count
+            if count < end - i or end < n:
+                # Buffer full or end of a code.
+                self.in_code = False
+                self.end_of_code()
+                # As cbf(), the edge that did not fit is dropped.
+                i = i + count + 1 if count < end - i else end + 1
+            else:
+                i = end
+
+        if timed_out and self.in_code:
+            self.in_code = False
+            self.end_of_code()
+
     def rec_or_ply(self, is_record, identification):
         if is_record:
             self.record(identification=identification)
@@ -416,6 +690,21 @@ class IRRP:
 
     def pigpio_for_rcd_ply(func):
         def wrapper(self, *args, **kwargs):
+            if self.connection is not None:
+                self.pi = self.connection.acquire()
+                self.sending = False
+                try:
+                    return func(self, *args, **kwargs)
+                except (ConnectionError, struct.error):
+                    # The socket to pigpiod broke, reconnect and retry once.
+                    self.pi = self.connection.reconnect()
+                    if self.sending:
+                        # pigpiod may have sent the chain.  Sending it
+                        # again would undo toggles such as TV power.
+                        raise PigpioConnectionError(
+                            "Connection to pigpiod broke while sending, "
+                            "not sent again")
+                    return func(self, *args, **kwargs)
             self.pi = pigpio.pi()  # Connect to Pi.
             if not self.pi.connected:
                 exit(0)
@@ -431,10 +720,14 @@ class IRRP:
         elif type(identification) == str:
             identification = [identification]
 
+        source = self.FILE
+        merge = self.BASE and not os.path.exists(self.FILE)
+        if merge:
+            source = self.BASE
         try:
-            f = open(self.FILE, "r")
-            records = json.load(f)
-            f.close()
+            # Copy, since tidy() modifies the codes in place.
+            records = {k: v if type(v) is dict else list(v)
+                       for k, v in open_records(source).items()}
         except FileNotFoundError:
             records = {}
 
@@ -443,17 +736,21 @@ class IRRP:
 
         self.pi.set_glitch_filter(self.GPIO, self.GLITCH)  # Ignore glitches.
 
-        cb = self.pi.callback(self.GPIO, pigpio.EITHER_EDGE, self.cbf)
+        if self.CAPTURE == "notify":
+            enable_numpy()
+            cb = notify_capture.NotifyCapture(self.pi, self.GPIO,
+                                              self.cbf_block,
+                                              watchdog_ms=self.POST_MS)
+            cb.start()
+        else:
+            cb = self.pi.callback(self.GPIO, pigpio.EITHER_EDGE, self.cbf)
 
         # Process each id
 
         print("Recording")
         for arg in identification:
             print("Press key for '{}'".format(arg))
-            self.code = []
-            self.fetching_code = True
-            while self.fetching_code:
-                time.sleep(0.1)
+            self.fetch_code()
             print("Okay")
             time.sleep(0.5)
 
@@ -464,10 +761,7 @@ class IRRP:
                 tries = 0
                 while not done:
                     print("Press key for '{}' to confirm".format(arg))
-                    self.code = []
-                    self.fetching_code = True
-                    while self.fetching_code:
-                        time.sleep(0.1)
+                    self.fetch_code()
                     press_2 = self.code[:]
                     the_same = self.compare(press_1, press_2)
                     if the_same:
@@ -486,34 +780,181 @@ class IRRP:
             else:  # No confirm.
                 records[arg] = self.code[:]
 
+        if self.CAPTURE == "notify":
+            cb.stop()
+        else:
+            cb.cancel()
         self.pi.set_glitch_filter(self.GPIO, 0)  # Cancel glitch filter.
         self.pi.set_watchdog(self.GPIO, 0)  # Cancel watchdog.
 
-        self.tidy(records)
+        if merge:
+            self.tidy_new(records, identification)
+        else:
+            self.tidy(records)
+
+        if self.DECODE:
+            for arg in identification:
+                if arg in records:
+                    records[arg] = describe(records[arg])
+
+        if is_manifest(self.FILE):
+            # No backup, each recording session writes a new snapshot.
+            write_snapshot(records, self.FILE)
+            return
 
+        text = dumps_records(records)
         self.backup(self.FILE)
+        write_atomic(text, os.path.realpath(self.FILE))
+
+    def load_records(self):
+        """
+        Read the codes of FILE, from the shared CodeStore if given.
+        """
+        if self.code_store is not None:
+            return self.code_store.load(self.FILE)
+        return open_records(self.FILE)
+
+    def wave_budget(self, scene=False):
+        """
+        What the waves of one send may use of pigpiod: all of it, or as
+        much as the wave cache holds.  The steps of a scene add loops and
+        delays to the chains of its codes.
+        """
+        if self.wave_cache is None:
+            budget = WaveBudget()
+        else:
+            budget = WaveBudget(self.wave_cache.max_pulses,
+                                self.wave_cache.max_cbs,
+                                self.wave_cache.max_waves)
+        if scene:
+            budget.chain -= STEP_ENTRIES
+            budget.loops -= STEP_LOOPS
+        return budget
+
+    def plan_waves(self, codes, scene=False):
+        """
+        Plan the waves of codes within the budget, see wave_planner.py.
+        """
+        return plan_waves(codes, self.FREQ, self.wave_budget(scene))
 
-        f = open(self.FILE, "w")
-        f.write(json.dumps(records, sort_keys=True).replace("],", "],\n")+"\n")
-        f.close()
+    def add_waves(self, codes, plan=None):
+        """
+        Create the waves of codes as planned and return the wave chain
+        of each code.
+        """
+        if plan is None:
+            plan = self.plan_waves(codes)
+
+        wave_ids = []
+        sizes = {}
+        durations = {}
+
+        try:
+            for shape in plan.shapes:
+                wf = build_wave(self.GPIOS, self.FREQ, shape)
+                self.pi.wave_add_generic(wf)
+                wid = self.pi.wave_create()
+                wave_ids.append(wid)
+                sizes[wid] = len(wf)
+                durations[wid] = sum(p.delay for p in wf)
+        except pigpio.error:
+            for wid in wave_ids:
+                self.pi.wave_delete(wid)
+            raise
+
+        return wave_ids, plan.chains(wave_ids), sizes, durations
+
+    def create_waves(self, code, signature=None, plan=None):
+        """
+        Create the waves of code, see add_waves().
+        """
+        wave_ids, chains, sizes, durations = self.add_waves([code], plan)
+        return CompiledWave(wave_ids, chains[0], sizes, signature,
+                            durations)
+
+    def scene_codes(self, steps, records):
+        code_ids = list(OrderedDict.fromkeys(s[0] for s in steps))
+        return code_ids, [to_code(records[i]) for i in code_ids]
+
+    def create_scene_waves(self, steps, records, signature=None, plan=None):
+        """
+        Create the waves of all codes of a scene at once, so that steps
+        share their waves.  The chain of the returned CompiledWave is a
+        list of chains to send one after another.
+        """
+        code_ids, codes = self.scene_codes(steps, records)
+        if plan is None:
+            plan = self.plan_waves(codes, scene=True)
+        wave_ids, chains, sizes, durations = self.add_waves(codes, plan)
+        chains = scene_chains(steps, dict(zip(code_ids, chains)), self.GAP_MS)
+        return CompiledWave(wave_ids, chains, sizes, signature, durations)
+
+    def get_waves(self, arg, code, signature):
+        """
+        Return the waves of code, reusing them from the wave cache.
+        """
+        return self.cached_waves(
+            (arg, self.GPIOS, self.FREQ), signature, [code], False,
+            lambda plan: self.create_waves(code, signature, plan))
+
+    def get_scene_waves(self, steps, records, signature):
+        key = (("scene",) + tuple(steps), self.GPIOS, self.FREQ,
+               self.GAP_MS)
+        return self.cached_waves(
+            key, signature, self.scene_codes(steps, records)[1], True,
+            lambda plan: self.create_scene_waves(steps, records, signature,
+                                                 plan))
+
+    def cached_waves(self, key, signature, codes, scene, create):
+        if self.wave_cache is None:
+            return create(None)
+
+        if self.connection is not None:
+            self.wave_cache.bind(self.pi, self.connection.generation)
+
+        waves = self.wave_cache.lookup(self.pi, key, signature)
+        if waves is None:
+            # Within the limits of the cache, see wave_budget(), so it
+            # fits once enough entries are evicted.
+            plan = self.plan_waves(codes, scene)
+            self.wave_cache.reserve(self.pi, plan.pulses, plan.waves)
+            try:
+                waves = create(plan)
+            except pigpio.error:
+                # pigpiod has less room than the cache counts, e.g. for
+                # waves of another process, so free everything we hold
+                # and try once more.
+                self.wave_cache.clear(self.pi)
+                waves = create(plan)
+            self.wave_cache.store(self.pi, key, waves)
+        return waves
+
+    def send_chain(self, chain, durations):
+        # From here on a broken connection is not retried.
+        self.sending = True
+        self.tx_scheduler.send(self.pi, chain, durations, self.trace)
+
+    def delete_waves(self, waves):
+        for wid in waves.wave_ids:
+            self.pi.wave_delete(wid)
 
     @pigpio_for_rcd_ply
     def playback(self, identification):
         if type(identification) == str:
             identification = [identification]
 
+        signature = file_signature(self.FILE)
+
         try:
-            f = open(self.FILE, "r")
+            records = self.load_records()
         except FileNotFoundError:
             print("Can't open: {}".format(self.FILE))
             exit(0)
+        self.trace.mark("load")
 
-        records = json.load(f)
-
-        f.close()
-
-        self.pi.set_mode(self.GPIO, pigpio.OUTPUT)
-        # IR TX connected to this GPIO.
+        for gpio in self.GPIOS:
+            self.pi.set_mode(gpio, pigpio.OUTPUT)
+        # IR TX connected to these GPIOs.
 
         self.pi.wave_add_new()
 
@@ -525,55 +966,65 @@ class IRRP:
         for arg in identification:
             if arg in records:
 
-                self.code = records[arg]
-
-                # Create wave
+                self.code = to_code(records[arg])
 
-                marks_wid = {}
-                spaces_wid = {}
-
-                wave = [0]*len(self.code)
-
-                for i in range(0, len(self.code)):
-                    ci = self.code[i]
-                    if i & 1:  # Space
-                        if ci not in spaces_wid:
-                            self.pi.wave_add_generic([pigpio.pulse(0, 0, ci)])
-                            spaces_wid[ci] = self.pi.wave_create()
-                        wave[i] = spaces_wid[ci]
-                    else:  # Mark
-                        if ci not in marks_wid:
-                            wf = self.carrier(self.GPIO, self.FREQ, ci)
-                            self.pi.wave_add_generic(wf)
-                            marks_wid[ci] = self.pi.wave_create()
-                        wave[i] = marks_wid[ci]
+                waves = self.get_waves(arg, self.code, signature)
+                self.trace.mark("wave_build")
 
                 delay = emit_time - time.time()
 
                 if delay > 0.0:
                     time.sleep(delay)
-
-                self.pi.wave_chain(wave)
+                    self.trace.mark("gap")
 
                 if self.VERBOSE:
                     print("key " + arg)
 
-                while self.pi.wave_tx_busy():
-                    time.sleep(0.002)
+                self.send_chain(waves.chain, waves.durations)
 
                 emit_time = time.time() + self.GAP_S
 
-                for i in marks_wid:
-                    self.pi.wave_delete(marks_wid[i])
+                if self.wave_cache is None:
+                    self.delete_waves(waves)
+            else:
+                print("Id {} not found".format(arg))
+
+    @pigpio_for_rcd_ply
+    def play_scene(self, steps):
+        """
+        Send the steps [(id, repeat, gap_ms), ...] of a scene.
+        """
+        signature = file_signature(self.FILE)
+
+        try:
+            records = self.load_records()
+        except FileNotFoundError:
+            print("Can't open: {}".format(self.FILE))
+            exit(0)
+        self.trace.mark("load")
 
-                marks_wid = {}
+        missing = [s[0] for s in steps if s[0] not in records]
+        if missing:
+            print("Id {} not found".format(", ".join(missing)))
+            return
 
-                for i in spaces_wid:
-                    self.pi.wave_delete(spaces_wid[i])
+        for gpio in self.GPIOS:
+            self.pi.set_mode(gpio, pigpio.OUTPUT)
+        # IR TX connected to these GPIOs.
 
-                spaces_wid = {}
-            else:
-                print("Id {} not found".format(arg))
+        self.pi.wave_add_new()
+
+        waves = self.get_scene_waves(steps, records, signature)
+        self.trace.mark("wave_build")
+
+        if self.VERBOSE:
+            print("Playing scene")
+
+        for chain in waves.chain:
+            self.send_chain(chain, waves.durations)
+
+        if self.wave_cache is None:
+            self.delete_waves(waves)
 
 
 if __name__ == "__main__":
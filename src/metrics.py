@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latency of the stages of a send, from the request to the reply.
+
+A Trace is started when a request arrives and handed along with it.
+Each stage ends with trace.mark(stage), timed with time.monotonic():
+
+    parse       the message is parsed (analyze_message, the socket)
+    queue       waiting for the transmitter in the dispatcher
+    resolve     the latest snapshot and its IDs (IRRPFile)
+    load        the codes are read (JSON, CodeStore)
+    wave_build  waves are planned and created, or found in the cache
+    wave_chain  pigpiod has started sending
+    tx          pigpiod has finished sending
+    reply       the reply is posted to Slack or written to the socket
+
+trace.finish() adds the stages and their total to the histograms of
+Metrics.  They are shown by "smartrc stats" and served in the
+Prometheus text format on http://HOST:PORT/metrics by metrics_server.py.
+
+Without a [METRICS] section requests carry NULL_TRACE, whose methods do
+nothing, so the stages cost a method call each.
+"""
+
+
+from bisect import bisect_left
+from collections import OrderedDict
+import threading
+import time
+
+
+class Histogram:
+    """
+    Number of observations of at most each bucket in seconds, as in a
+    Prometheus histogram.
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last count is of observations above every bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """
+        Estimate the q quantile by interpolating within its bucket.
+        """
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / count,
+                           self.max)
+            seen += count
+        return self.max
+
+
+class Metrics:
+    """
+    Histograms of the stages of sends, in the order stages were first
+    seen.
+    """
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+               0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.histograms = OrderedDict()
+        self.lock = threading.Lock()
+
+    def trace(self):
+        return Trace(self)
+
+    def observe(self, stages):
+        """
+        Add [(stage, seconds), ...] to the histograms.
+        """
+        with self.lock:
+            for stage, seconds in stages:
+                histogram = self.histograms.get(stage)
+                if histogram is None:
+                    histogram = self.histograms[stage] =\
+                        Histogram(self.buckets)
+                histogram.observe(seconds)
+
+    def prometheus(self):
+        """
+        Return the histograms in the Prometheus text format.
+        """
+        lines = ["# HELP smartrc_stage_seconds Time spent in each stage "
+                 "of a send.",
+                 "# TYPE smartrc_stage_seconds histogram"]
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                cumulative = 0
+                les = ["{}".format(b) for b in self.buckets] + ["+Inf"]
+                for le, count in zip(les, histogram.counts):
+                    cumulative += count
+                    lines.append('smartrc_stage_seconds_bucket{{stage="{}",'
+                                 'le="{}"}} {}'.format(stage, le,
+                                                       cumulative))
+                lines.append('smartrc_stage_seconds_sum{{stage="{}"}} '
+                             '{:.6f}'.format(stage, histogram.sum))
+                lines.append('smartrc_stage_seconds_count{{stage="{}"}} '
+                             '{}'.format(stage, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Return a table of the stages for "smartrc stats".
+        """
+        with self.lock:
+            if not self.histograms:
+                return "No sends yet"
+            lines = ["{:<11} {:>6} {:>9} {:>9} {:>9} {:>9}".format(
+                "stage", "count", "p50 ms", "p90 ms", "p99 ms", "max ms")]
+            for stage, h in self.histograms.items():
+                lines.append(
+                    "{:<11} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                        stage, h.count, h.quantile(0.5) * 1000,
+                        h.quantile(0.9) * 1000, h.quantile(0.99) * 1000,
+                        h.max * 1000))
+        return "\n".join(lines)
+
+
+class Trace:
+    """
+    The stages of one request, timed from its arrival.
+    """
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.start = self.last = time.monotonic()
+        self.stages = []
+
+    def mark(self, stage):
+        """
+        End stage, which began at the previous mark.
+        """
+        now = time.monotonic()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def finish(self, stage):
+        """
+        End the last stage and add the stages to the histograms.
+        """
+        self.mark(stage)
+        self.metrics.observe(self.stages +
+                             [("total", self.last - self.start)])
+        self.stages = []
+
+
+class NullTrace:
+    def mark(self, stage):
+        pass
+
+    def finish(self, stage):
+        pass
+
+
+NULL_TRACE = NullTrace()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serve Metrics on http://HOST:PORT/metrics for Prometheus.  Kept apart
+from metrics.py because importing http.server takes longer than a
+whole smartrc command should.
+"""
+
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import socketserver
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scraped every few seconds.
+
+
+class MetricsServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, metrics, host, port):
+        self.metrics = metrics
+        super().__init__((host, port), MetricsRequestHandler)
+
+
+def start_metrics_server(metrics, host="127.0.0.1", port=9464):
+    """
+    Serve metrics in a background thread.  Return the server, or None
+    if the port could not be bound.
+    """
+    try:
+        server = MetricsServer(metrics, host, port)
+    except OSError as err:
+        print("metrics endpoint was not started: {}".format(err))
+        return None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Capture edges from the notification stream of pigpiod in blocks.
+
+pigpiod reports every level change of the monitored GPIOs as a 12 byte
+report (seqno u16, flags u16, tick u32, levels u32).  pigpio.pi unpacks
+the reports one at a time and calls a Python callback per edge.
+NotifyCapture reads the stream on a socket of its own, turns a whole
+block of reports into edge lengths at once, with numpy if
+numpy_support.enable_numpy() was called, and hands the lengths to a sink
+such as IRRP.cbf_block().
+"""
+
+
+from array import array
+import socket
+import struct
+import threading
+
+import pigpio
+
+import numpy_support
+
+REPORT = struct.Struct("<HHII")
+REPORT_SIZE = REPORT.size
+READ_SIZE = 4096 * REPORT_SIZE
+
+# Open a notification handle on this socket, see pigpio.py.
+CMD_NOIB = 99
+
+
+def edge_segments(data, gpio, last_tick, last_level):
+    """
+    Split the reports in data into segments ending at the watchdog
+    timeouts of gpio.  Return ([(lengths, timed_out), ...], last_tick,
+    last_level), lengths being the microseconds between level changes
+    of gpio, the first measured from last_tick.
+    """
+    if numpy_support.numpy is not None:
+        return edge_segments_numpy(data, gpio, last_tick, last_level)
+    wdog = pigpio.NTFY_FLAGS_WDOG | gpio
+    wdog_mask = pigpio.NTFY_FLAGS_WDOG | pigpio.NTFY_FLAGS_GPIO
+    segments = []
+    lengths = array("I")
+    for _, flags, tick, level in REPORT.iter_unpack(data):
+        if flags == 0:
+            level = (level >> gpio) & 1
+            if level != last_level:
+                lengths.append((tick - last_tick) & 0xFFFFFFFF)
+                last_tick = tick
+                last_level = level
+        elif (flags & wdog_mask) == wdog:
+            segments.append((lengths, True))
+            lengths = array("I")
+    if lengths or not segments:
+        segments.append((lengths, False))
+    return segments, last_tick, last_level
+
+
+REPORT_DTYPE = [("seqno", "<u2"), ("flags", "<u2"), ("tick", "<u4"),
+                ("level", "<u4")]
+
+
+def edge_segments_numpy(data, gpio, last_tick, last_level):
+    numpy = numpy_support.numpy
+    reports = numpy.frombuffer(data, dtype=REPORT_DTYPE)
+    flags = reports["flags"]
+    levels = ((reports["level"] >> gpio) & 1).astype(numpy.int8)
+    ticks = reports["tick"]
+    is_level = flags == 0
+    is_wdog = ((flags & (pigpio.NTFY_FLAGS_WDOG | pigpio.NTFY_FLAGS_GPIO)) ==
+               (pigpio.NTFY_FLAGS_WDOG | gpio))
+
+    # The level of gpio after each report, carried over other reports.
+    level_index = numpy.where(is_level, numpy.arange(len(reports)), -1)
+    numpy.maximum.accumulate(level_index, out=level_index)
+    level_after = numpy.where(level_index >= 0,
+                              levels[numpy.maximum(level_index, 0)],
+                              last_level)
+    level_before = numpy.concatenate(([last_level], level_after[:-1]))
+    is_edge = is_level & (levels != level_before)
+
+    edge_ticks = ticks[is_edge]
+    lengths = numpy.diff(numpy.concatenate(
+        (numpy.array([last_tick], dtype=numpy.uint32), edge_ticks)))
+    if len(edge_ticks):
+        last_tick = int(edge_ticks[-1])
+    if len(reports):
+        last_level = int(level_after[-1])
+
+    # Number of edges before each watchdog timeout.
+    edge_count = numpy.cumsum(is_edge)
+    cuts = edge_count[is_wdog].tolist()
+    segments = []
+    start = 0
+    for cut in cuts:
+        segments.append((lengths[start:cut], True))
+        start = cut
+    if start < len(lengths) or not segments:
+        segments.append((lengths[start:], False))
+    return segments, last_tick, last_level
+
+
+def first_above(lengths, start, limit):
+    """
+    Return the index of the first of lengths[start:] above limit, or
+    len(lengths).
+    """
+    numpy = numpy_support.numpy
+    if numpy is not None and isinstance(lengths, numpy.ndarray):
+        above = numpy.flatnonzero(lengths[start:] > limit)
+        return start + int(above[0]) if len(above) else len(lengths)
+    for i in range(start, len(lengths)):
+        if lengths[i] > limit:
+            return i
+    return len(lengths)
+
+
+def to_array(lengths):
+    if isinstance(lengths, array):
+        return lengths
+    return array("I", lengths.astype(numpy_support.numpy.uint32).tobytes())
+
+
+class NotificationSocket:
+    """
+    The notification stream of pigpiod on a connection of its own.
+    """
+    def __init__(self, host="localhost", port=8888):
+        self.sock = socket.create_connection((host, port))
+        self.sock.sendall(struct.pack("IIII", CMD_NOIB, 0, 0, 0))
+        reply = b""
+        while len(reply) < 16:
+            chunk = self.sock.recv(16 - len(reply))
+            if not chunk:
+                raise ConnectionError("pigpiod closed the connection")
+            reply += chunk
+        self.handle = struct.unpack("12si", reply)[1]
+        if self.handle < 0:
+            self.sock.close()
+            raise pigpio.error(pigpio.error_text(self.handle))
+
+    def read(self):
+        try:
+            return self.sock.recv(READ_SIZE)
+        except OSError:
+            return b""
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class NotifyCapture:
+    """
+    Read level changes of gpio in a thread and call sink(lengths,
+    timed_out) for each segment of a block, see edge_segments().
+
+    The watchdog of gpio is kept at watchdog_ms while capturing, so the
+    end of a code is reported in the stream as well.
+    """
+    def __init__(self, pi, gpio, sink, watchdog_ms=0, host=None,
+                 port=None):
+        self.pi = pi
+        self.gpio = gpio
+        self.sink = sink
+        self.watchdog_ms = watchdog_ms
+        # pigpio.pi keeps the address it is connected to.
+        self.host = host or getattr(pi, "_host", None) or "localhost"
+        self.port = port or getattr(pi, "_port", None) or 8888
+        self.stream = None
+        self.thread = None
+        self.blocks = 0
+        self.reports = 0
+
+    def start(self):
+        if hasattr(self.pi, "open_notifications"):  # SimulatedPi
+            self.stream = self.pi.open_notifications()
+        else:
+            self.stream = NotificationSocket(self.host, int(self.port))
+        last_tick = self.pi.get_current_tick()
+        last_level = self.pi.read(self.gpio)
+        self.thread = threading.Thread(target=self.run,
+                                       args=(last_tick, last_level),
+                                       daemon=True)
+        self.thread.start()
+        self.pi.notify_begin(self.stream.handle, 1 << self.gpio)
+        if self.watchdog_ms:
+            self.pi.set_watchdog(self.gpio, self.watchdog_ms)
+
+    def run(self, last_tick, last_level):
+        buf = b""
+        while True:
+            data = self.stream.read()
+            if not data:
+                return
+            buf += data
+            usable = len(buf) - len(buf) % REPORT_SIZE
+            if not usable:
+                continue
+            segments, last_tick, last_level = edge_segments(
+                buf[:usable], self.gpio, last_tick, last_level)
+            buf = buf[usable:]
+            self.blocks += 1
+            self.reports += usable // REPORT_SIZE
+            for lengths, timed_out in segments:
+                self.sink(lengths, timed_out)
+
+    def stop(self):
+        if self.watchdog_ms:
+            self.pi.set_watchdog(self.gpio, 0)
+        self.pi.notify_close(self.stream.handle)
+        self.stream.close()
+        self.thread.join()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+numpy is optional.  carrier.py and notify_capture.py use it once
+enable_numpy() was called and it is installed.
+
+Importing numpy takes longer than it saves for a single send, so only
+long-lived processes and recording enable it.
+"""
+
+
+numpy = None
+
+
+def enable_numpy():
+    """
+    Import numpy if it is installed.  Return whether it is used.
+    """
+    global numpy
+    try:
+        import numpy as np
+    except ImportError:
+        return False
+    numpy = np
+    return True
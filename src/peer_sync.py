@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Push new snapshots of data/ directly to the other Pis on the LAN.
+
+Every bot with a [PEERS] section serves its data/ over TCP.  The
+recording Pi asks each peer for its manifest {name: sha256} and sends
+the files that are missing or differ.  Peers are the HOSTS of [PEERS]
+and, if MULTICAST is on, the bots that answer a multicast query.  Drive
+stays the backup and the way to reach Pis that are not on the LAN.
+
+Protocol (version 1): a request is one JSON line
+
+    {"version": 1, "command": "manifest" | "push", "mac": ...,
+     "name": ..., "size": ..., "sha256": ...}
+
+followed for "push" by size bytes of the file.  "mac" is the hex
+HMAC-SHA256 with the SECRET of [PEERS] of the line without "mac" and the
+file, so the secret itself is never sent.  The reply is one JSON line
+{"ok": ..., "message": ..., "files": {...}}.  A connection may carry
+several requests.  Snapshots and code files are never rewritten, so a
+push of an existing one with other contents is refused.
+"""
+
+
+from os import path
+import hashlib
+import hmac
+import json
+import re
+import socket
+import socketserver
+import struct
+import threading
+import uuid
+
+from drive_sync import data_manifest, sha256_of
+from exceptions import PeerSyncError
+from irrp_file import write_atomic
+from snapshot_store import CODE_PATTERN, MANIFEST_PATTERN
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 51515
+# Discovery always uses this UDP port, whatever port the server has.
+DISCOVERY_PORT = 51515
+MULTICAST_GROUP = "239.255.51.51"
+DISCOVER = b"SMARTRC_DISCOVER 1"
+MAX_FILE_SIZE = 16 * 1024 * 1024
+MAX_LINE = 1024 * 1024
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.-]*$")
+
+
+def sign(secret, header, payload=b""):
+    """
+    Return the "mac" of a request, header without "mac".
+    """
+    message = json.dumps(header, sort_keys=True).encode("utf-8") + payload
+    return hmac.new(secret.encode("utf-8"), message,
+                    hashlib.sha256).hexdigest()
+
+
+def read_reply(rfile):
+    line = rfile.readline(MAX_LINE)
+    if not line:
+        raise PeerSyncError("Connection closed by peer")
+    return json.loads(line.decode("utf-8"))
+
+
+def write_line(wfile, obj):
+    wfile.write(json.dumps(obj, sort_keys=True).encode("utf-8") + b"\n")
+    wfile.flush()
+
+
+class PeerRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_LINE)
+            if not line:
+                return
+            try:
+                request = json.loads(line.decode("utf-8"))
+                reply = self.server.answer(request, self.rfile,
+                                           self.client_address[0])
+            except (ValueError, PeerSyncError) as err:
+                message = getattr(err, "message", str(err))
+                write_line(self.wfile, {"ok": False, "message": message})
+                # The rest of the stream can't be trusted.
+                return
+            write_line(self.wfile, reply)
+
+
+class PeerServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Receive snapshots pushed by peers into data/.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, smartrc_dir, port=DEFAULT_PORT, host="",
+                 secret=None, verbose=True):
+        if not secret:
+            raise PeerSyncError("A SECRET is required to serve data/")
+        self.SMARTRC_DIR = smartrc_dir
+        self.VERBOSE = verbose
+        self.DATA_DIR = path.join(smartrc_dir, "data")
+        self.secret = secret
+        self.node_id = uuid.uuid4().hex
+        self.received = 0
+        # Pushes of the same file from two peers must not interleave.
+        self.lock = threading.Lock()
+        super().__init__((host, port), PeerRequestHandler)
+
+    def answer(self, request, rfile, client):
+        if request.get("version") != PROTOCOL_VERSION:
+            raise PeerSyncError("Unsupported protocol version: {}".format(
+                request.get("version")))
+        mac = str(request.pop("mac", ""))
+        command = request.get("command")
+        data = b""
+        if command == "push":
+            data = self.read_file(request, rfile)
+        if not hmac.compare_digest(mac, sign(self.secret, request, data)):
+            raise PeerSyncError("Wrong secret")
+        if command == "manifest":
+            return {"ok": True, "files": data_manifest(self.SMARTRC_DIR)}
+        elif command == "push":
+            return self.receive(request, data, client)
+        raise PeerSyncError("Unknown command: {}".format(command))
+
+    def read_file(self, request, rfile):
+        size = request.get("size")
+        if type(size) is not int or not 0 <= size <= MAX_FILE_SIZE:
+            raise PeerSyncError("Invalid size: {}".format(size))
+        data = rfile.read(size)
+        if len(data) != size:
+            raise PeerSyncError("Connection closed by peer")
+        return data
+
+    def receive(self, request, data, client):
+        name = str(request.get("name"))
+        if not NAME_PATTERN.match(name) or name.endswith(".tmp"):
+            raise PeerSyncError("Invalid name: {}".format(name))
+        sha256 = hashlib.sha256(data).hexdigest()
+        if sha256 != request.get("sha256"):
+            raise PeerSyncError("Checksum mismatch: {}".format(name))
+        filename = path.join(self.DATA_DIR, name)
+        is_immutable = (CODE_PATTERN.match(name) is not None or
+                        MANIFEST_PATTERN.match(name) is not None)
+        with self.lock:
+            if is_immutable and path.exists(filename):
+                if sha256_of(filename) != sha256:
+                    raise PeerSyncError("{} exists with other contents, "
+                                        "not overwritten".format(name))
+                return {"ok": True, "message": "Kept {}".format(name)}
+            write_atomic(data, filename)
+            self.received += 1
+        if self.VERBOSE:
+            print("Received {} from {}".format(name, client))
+        return {"ok": True, "message": "Stored {}".format(name)}
+
+
+class DiscoveryResponder:
+    """
+    Answer multicast queries with the port of a PeerServer.
+    """
+    def __init__(self, server, group=MULTICAST_GROUP, port=DISCOVERY_PORT):
+        self.server = server
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            # Several bots on one host, e.g. when testing.
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind(("", port))
+        membership = struct.pack("4s4s", socket.inet_aton(group),
+                                 socket.inet_aton("0.0.0.0"))
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                             membership)
+
+    def serve_forever(self):
+        while True:
+            try:
+                data, address = self.sock.recvfrom(1024)
+            except OSError:
+                return
+            if data == DISCOVER:
+                reply = {"version": PROTOCOL_VERSION,
+                         "port": self.server.server_address[1],
+                         "node_id": self.server.node_id}
+                self.sock.sendto(json.dumps(reply).encode("utf-8"), address)
+
+    def close(self):
+        self.sock.close()
+
+
+def discover(timeout=1.0, group=MULTICAST_GROUP, port=DISCOVERY_PORT,
+             exclude=None):
+    """
+    Return [(host, port), ...] of the peers answering within timeout.
+    exclude is the node_id of the own PeerServer.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+    sock.settimeout(timeout)
+    peers = []
+    try:
+        sock.sendto(DISCOVER, (group, port))
+        while True:
+            try:
+                data, address = sock.recvfrom(1024)
+            except socket.timeout:
+                break
+            try:
+                reply = json.loads(data.decode("utf-8"))
+            except ValueError:
+                continue
+            if (reply.get("version") == PROTOCOL_VERSION and
+                    reply.get("node_id") != exclude):
+                peers.append((address[0], int(reply["port"])))
+    except OSError as err:
+        print("Peer discovery failed: {}".format(err))
+    finally:
+        sock.close()
+    return sorted(set(peers))
+
+
+class PeerClient:
+    def __init__(self, host, port=DEFAULT_PORT, secret=None, timeout=5.0):
+        if not secret:
+            raise PeerSyncError("A SECRET is required to push to peers")
+        self.address = (host, port)
+        self.secret = secret
+        self.timeout = timeout
+
+    def request(self, conn, rfile, header, payload=b""):
+        header = dict(header, version=PROTOCOL_VERSION)
+        header["mac"] = sign(self.secret, header, payload)
+        conn.sendall(json.dumps(header, sort_keys=True).encode("utf-8") +
+                     b"\n" + payload)
+        reply = read_reply(rfile)
+        if not reply.get("ok"):
+            raise PeerSyncError(reply.get("message", "Request failed"))
+        return reply
+
+    def push(self, smartrc_dir, manifest=None):
+        """
+        Send the files of data/ the peer does not have.  Return their
+        names.
+        """
+        if manifest is None:
+            manifest = data_manifest(smartrc_dir)
+        try:
+            conn = socket.create_connection(self.address, self.timeout)
+        except OSError as err:
+            raise PeerSyncError("Can't connect to {}:{}: {}".format(
+                self.address[0], self.address[1], err))
+        rfile = conn.makefile("rb")
+        try:
+            remote = self.request(conn, rfile,
+                                  {"command": "manifest"})["files"]
+            sent = []
+            for name in sorted(manifest):
+                if remote.get(name) == manifest[name]:
+                    continue
+                with open(path.join(smartrc_dir, "data", name), "rb") as f:
+                    data = f.read()
+                header = {"command": "push", "name": name,
+                          "size": len(data),
+                          "sha256": hashlib.sha256(data).hexdigest()}
+                self.request(conn, rfile, header, data)
+                sent.append(name)
+            return sent
+        except (OSError, ValueError) as err:
+            raise PeerSyncError("{}:{}: {}".format(
+                self.address[0], self.address[1], err))
+        finally:
+            rfile.close()
+            conn.close()
+
+
+def push_to_peers(smartrc_dir, peers, secret=None):
+    """
+    Push data/ to every (host, port) of peers.  Return
+    {(host, port): names sent, or the PeerSyncError}.
+    """
+    manifest = data_manifest(smartrc_dir)
+    results = {}
+    for host, port in peers:
+        try:
+            results[(host, port)] =\
+                PeerClient(host, port, secret).push(smartrc_dir, manifest)
+        except PeerSyncError as err:
+            results[(host, port)] = err
+    return results
+
+
+def start_peer_server(smartrc_dir, peers_setting):
+    """
+    Serve data/ to peers in background threads.  peers_setting is
+    ReadSetting.return_peers().  Return the server, or None if [PEERS]
+    has no SECRET or the port is in use.
+    """
+    try:
+        server = PeerServer(smartrc_dir, port=peers_setting["port"],
+                            secret=peers_setting["secret"])
+    except PeerSyncError as err:
+        print("Peer server was not started: {}".format(err.message))
+        return None
+    except OSError as err:
+        print("Peer server was not started: {}".format(err))
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if peers_setting["multicast"]:
+        try:
+            responder = DiscoveryResponder(server)
+        except OSError as err:
+            print("Peer discovery is not answered: {}".format(err))
+        else:
+            threading.Thread(target=responder.serve_forever,
+                             daemon=True).start()
+    return server
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A pigpiod connection shared by the sends of a process and reopened
+when it breaks.
+"""
+
+
+import struct
+import threading
+import time
+
+import pigpio
+
+from exceptions import PigpioConnectionError
+
+
+class PigpioConnection:
+    """
+    A connection to pigpiod kept open for the lifetime of a process and
+    shared by every IRRP instance of it.
+
+    The connection is checked with a cheap command only after it has been
+    idle for health_check_interval seconds, and is reopened when the check
+    fails or when a command broke the socket.  generation is incremented
+    on every (re)connection so users of pigpiod resources such as wave ids
+    can tell that they may have to be recreated.
+    """
+    def __init__(self, host=None, port=None, health_check_interval=10.0,
+                 factory=None):
+        self.host = host
+        self.port = port
+        self.health_check_interval = health_check_interval
+        self.factory = pigpio.pi if factory is None else factory
+        self.pi = None
+        self.generation = 0
+        self.last_used = 0.0
+        self.lock = threading.RLock()
+
+    def connect(self):
+        kwargs = {"show_errors": False}
+        if self.host is not None:
+            kwargs["host"] = self.host
+        if self.port is not None:
+            kwargs["port"] = self.port
+        pi = self.factory(**kwargs)
+        if not pi.connected:
+            raise PigpioConnectionError(
+                "Can't connect to pigpiod at {}:{}".format(
+                    self.host or "localhost", self.port or 8888))
+        self.pi = pi
+        self.generation += 1
+        self.last_used = time.monotonic()
+        return pi
+
+    def is_healthy(self):
+        if self.pi is None or not self.pi.connected:
+            return False
+        try:
+            self.pi.get_current_tick()
+        except (pigpio.error, ConnectionError, struct.error):
+            return False
+        return True
+
+    def acquire(self):
+        """
+        Return a connected pigpio.pi, reconnecting if necessary.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.pi is None:
+                self.connect()
+            elif (now - self.last_used > self.health_check_interval and
+                    not self.is_healthy()):
+                self.reconnect()
+            self.last_used = now
+            return self.pi
+
+    def reconnect(self):
+        with self.lock:
+            self.close()
+            return self.connect()
+
+    def close(self):
+        with self.lock:
+            if self.pi is not None:
+                try:
+                    self.pi.stop()
+                except (OSError, struct.error):
+                    pass
+                self.pi = None
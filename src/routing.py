@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Codes can be sent on several IR LEDs at once.  [GPIO] PLAYBACK lists
+the GPIOs codes are sent on, and the optional [ROUTING] section of
+.smartrc.cfg sends the codes of a device on GPIOs of its own:
+
+[GPIO]
+PLAYBACK = 17, 27
+
+[ROUTING]
+aircon_* = 22
+tv_* = 17, 27
+
+Keys are code ids or fnmatch patterns of them, without regard to case
+as configparser lowercases keys.  The first key that matches a code id
+gives its GPIOs, and codes that match none are sent on PLAYBACK.
+
+pigpio switches all GPIOs of a pulse at once, so a single wave drives
+every LED of a send and sending on N LEDs takes as long as on one.
+"""
+
+
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+
+from exceptions import RoutingError
+
+MAX_GPIO = 53
+
+
+def parse_gpios(name, text):
+    """
+    Return the GPIOs of "17, 27" without duplicates.
+    """
+    gpios = []
+    for gpio in text.split(","):
+        gpio = gpio.strip()
+        if not gpio.isdigit() or int(gpio) > MAX_GPIO:
+            raise RoutingError("Invalid GPIO '{}' in {}".format(gpio, name))
+        if int(gpio) not in gpios:
+            gpios.append(int(gpio))
+    return gpios
+
+
+def parse_routing(section):
+    """
+    Return {pattern: [GPIO, ...]} of the [ROUTING] section in its order.
+    """
+    return OrderedDict((pattern, parse_gpios(pattern, section[pattern]))
+                       for pattern in section)
+
+
+def route(code_id, routing, default):
+    """
+    Return the GPIOs to send code_id on.
+    """
+    for pattern, gpios in routing.items():
+        if fnmatchcase(code_id.lower(), pattern.lower()):
+            return gpios
+    return default
+
+
+def route_all(code_ids, routing, default):
+    """
+    Return the GPIOs of all of code_ids, e.g. the steps of a scene,
+    which are sent with the same waves.
+    """
+    gpios = []
+    for code_id in code_ids:
+        for gpio in route(code_id, routing, default):
+            if gpio not in gpios:
+                gpios.append(gpio)
+    return gpios
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dispatch Slack RTM events as soon as they arrive.
+"""
+
+
+import asyncio
+
+
+class RtmReceiver:
+    """
+    Pass Slack RTM events to handler as soon as they arrive.
+
+    The websocket of a connected SlackClient is registered with an
+    asyncio event loop.  Whenever it becomes readable every buffered
+    event is read with rtm_read() and dispatched, so no message waits for
+    a polling interval and no message of a batch is dropped.  A ping is
+    sent after ping_interval seconds without traffic to keep the
+    connection alive.
+    """
+    def __init__(self, sc, handler, ping_interval=30.0):
+        self.sc = sc
+        self.handler = handler
+        self.ping_interval = ping_interval
+
+    def run(self):
+        """
+        Receive events until the RTM connection is closed.
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.receive())
+        finally:
+            loop.close()
+
+    async def receive(self):
+        loop = asyncio.get_event_loop()
+        readable = asyncio.Event()
+        fd = self.sc.server.websocket.sock.fileno()
+        loop.add_reader(fd, readable.set)
+        try:
+            self.read_events()
+            while self.sc.server.connected:
+                try:
+                    await asyncio.wait_for(readable.wait(),
+                                           self.ping_interval)
+                except asyncio.TimeoutError:
+                    self.sc.server.ping()
+                    continue
+                readable.clear()
+                self.read_events()
+        finally:
+            loop.remove_reader(fd)
+
+    def read_events(self):
+        """
+        Dispatch events until the websocket has nothing more to read.
+
+        rtm_read() returns one frame at a time, and frames may already be
+        buffered by the TLS layer without the socket being readable.
+        """
+        while True:
+            try:
+                events = self.sc.rtm_read()
+            except BlockingIOError:  # Plain ws:// socket has no data.
+                return
+            except ConnectionError:
+                # Reset instead of closed, end as on a closed websocket.
+                self.sc.server.connected = False
+                return
+            if not events:
+                return
+            for event in events:
+                self.handler(event)
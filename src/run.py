@@ -14,9 +14,16 @@ import requests
 import json
 import sys
 
+from slackclient.server import SlackConnectionError
+
 from smartrc import SmartRemoteControl
+from metrics import NULL_TRACE
 from exceptions import SlackTokenAuthError, SlackError
-from gdrive import GDrive
+from rtm_receiver import RtmReceiver
+from dispatcher import CommandDispatcher, Coalescer
+from async_runner import AsyncCommandRunner
+from smartrc_daemon import start_server
+from peer_sync import start_peer_server
 
 
 class RunSmartrcBot(SmartRemoteControl):
@@ -27,58 +34,112 @@ class RunSmartrcBot(SmartRemoteControl):
         if not self.is_settingfile:
             raise FileNotFoundError("smartrc setting file is not found")
         self.smartrc_pattern = re.compile(r'smartrc.*')
-        self.gdrive = GDrive(smartrc_dir=smartrc_dir)
+        self.keep_warm()
+        self.dispatcher = CommandDispatcher()
+        # gdrive runs with a timeout and never more than two at a time,
+        # so a hung gdrive does not hold up the bot.
+        self.command_runner = AsyncCommandRunner(max_concurrent=2)
+        self.drive_runs = Coalescer(self.dispatcher.submit)
 
     def main(self):
+        # Also serve local smartrc commands, see smartrc_client.py.
+        start_server(self)
+        self.serve_metrics()
+        peers_setting = self.setting.return_peers()
+        if peers_setting is not None:
+            start_peer_server(self.SMARTRC_DIR, peers_setting)
         is_tryConnection = True
         while is_tryConnection:
             is_tryConnection = False
             try:
                 self.try_connection()
                 if self.sc.rtm_connect(timeout=1):
-                    while self.sc.server.connected is True:
-                        try:
-                            msg = self.sc.rtm_read()
-                            # print("msg_raw:", msg)
-                            if "text" in msg[0]:
-                                message = msg[0]["text"]
-                                print("msg:", message)
-                                self.analyze_message(message)
-                        except IndexError as index_err:
-                            pass
-                            # print("IndexError: {}".format(index_err))
-                        except KeyError as key_err:
-                            print("KeyError: {}".format(key_err))
-                        except TimeoutError as time_err:
-                            print("TimeoutError: {}".format(time_err))
-                            sleep(60)
-                            is_tryConnection = True
-                            break
-                        finally:
-                            sleep(1)
+                    RtmReceiver(self.sc, self.receive_event).run()
+                    print("Disconnected from slack")
+                    is_tryConnection = True
                 else:
                     print("Connection Failed")
+            except TimeoutError as time_err:
+                print("TimeoutError: {}".format(time_err))
+                sleep(60)
+                is_tryConnection = True
+            except SlackConnectionError as err:
+                print("SlackConnectionError: {}".format(err))
+                sleep(60)
+                is_tryConnection = True
             except requests.exceptions.ConnectionError as err:
                 print("ConnectionError: {}".format(err))
                 sleep(60)
                 is_tryConnection = True
 
-    def analyze_message(self, message):
+    def handle_request(self, request, trace=NULL_TRACE):
+        if request.get("command") == "stats":
+            # Not queued behind the sends it reports on.
+            return super().handle_request(request)
+        # Local sends share the transmitter queue with Slack sends.
+        return self.dispatcher.submit(
+            super().handle_request, request, trace,
+            resource="gpio{}".format(self.setting.gpio_playback)).result()
+
+    def receive_event(self, event):
+        try:
+            # print("msg_raw:", event)
+            if "text" in event:
+                trace = self.new_trace()
+                message = event["text"]
+                print("msg:", message)
+                self.analyze_message(message, trace)
+        except KeyError as key_err:
+            print("KeyError: {}".format(key_err))
+
+    def analyze_message(self, message, trace=NULL_TRACE):
         try:
             if self.smartrc_pattern.match(message):
                 splited_msg = message.split()
                 if splited_msg[1] == "send" or splited_msg[1] == "playback":
-                    self.print_std_sc(self.playback(
-                                      playback_id=splited_msg[2]))
-                elif splited_msg[1] == "list":
-                    self.print_std_sc(self.show_id_list())
+                    trace.mark("parse")
+                    # The transmitter is a single resource.
+                    self.dispatcher.submit(
+                        self.playback_and_reply, splited_msg[2], trace,
+                        resource="gpio{}".format(self.setting.gpio_playback))
+                elif splited_msg[1] == "scene":
+                    trace.mark("parse")
+                    self.dispatcher.submit(
+                        self.scene_and_reply, splited_msg[2], trace,
+                        resource="gpio{}".format(self.setting.gpio_playback))
+                elif (splited_msg[1] == "list" or
+                      splited_msg[1] == "stats"):
+                    self.dispatcher.submit(self.command_and_reply,
+                                           splited_msg[1])
+                elif splited_msg[1] == "queue":
+                    self.dispatcher.submit(self.print_std_sc,
+                                           self.dispatcher.report())
                 elif splited_msg[1] == "download_irrp_files":
                     print("gdrive downloading...")
-                    self.gdrive.download()
+                    self.drive_runs.submit("download", self.gdrive.download)
         except IndexError:
             pass
             # print("IndexError: {}".format(index_err))
 
+    def playback_and_reply(self, playback_id, trace=NULL_TRACE):
+        message = self.playback(playback_id=playback_id, trace=trace)
+        # Reply from the network workers so the next send can start.
+        self.dispatcher.submit(self.reply, message, trace)
+
+    def scene_and_reply(self, scene_name, trace=NULL_TRACE):
+        message = self.scene(scene_name, trace)
+        self.dispatcher.submit(self.reply, message, trace)
+
+    def command_and_reply(self, command):
+        # Not through self.handle_request, that waits for the
+        # transmitter queue.
+        self.print_std_sc(super().handle_request({"command": command})[
+            "message"])
+
+    def reply(self, message, trace=NULL_TRACE):
+        self.print_std_sc(message)
+        trace.finish("reply")
+
     def print_std_sc(self, message):
         print(message)
         self.stool.send_a_message(message)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scenes are named sequences of codes sent back to back, defined in the
+[SCENE] section of .smartrc.cfg
+
+[SCENE]
+movie = projector_on, av_input_3*2/500, screen_down
+
+Each step is id[*repeat][/gap_ms]: the code is sent repeat times
+(default 1), each time followed by gap_ms milliseconds of silence
+(default the IRRP gap).
+
+A whole scene is sent as wave chains.  Repeats use the chain loop
+command and gaps the chain delay command, so pigpiod sends the scene
+without waiting for the client between steps.
+"""
+
+
+import re
+
+from exceptions import SceneError
+
+STEP_PATTERN = re.compile(r"^([^*/\s]+)(?:\*(\d+))?(?:/(\d+))?$")
+
+# pigpio wave_chain() limits.
+MAX_CHAIN = 600  # Entries of one chain.
+MAX_LOOPS = 20  # Loop start commands of one chain.
+MAX_DELAY = 0xFFFF  # Microseconds of one delay command.
+MAX_REPEAT = 0xFFFF  # Count of one loop repeat command.
+
+# What step_chain() adds at most to the chain of a code: a loop for the
+# repeat and a loop and delays for the gap.
+STEP_ENTRIES = 20
+STEP_LOOPS = 2
+
+LOOP_START = [255, 0]
+
+
+def loop_repeat(count):
+    return [255, 1, count & 0xFF, count >> 8]
+
+
+def delay(micros):
+    return [255, 2, micros & 0xFF, micros >> 8]
+
+
+def parse_scene(name, text):
+    """
+    Return the steps [(id, repeat, gap_ms), ...] of a scene definition.
+    gap_ms is None for the default gap.
+    """
+    steps = []
+    for step in text.split(","):
+        step = step.strip()
+        match = STEP_PATTERN.match(step)
+        if match is None:
+            raise SceneError("Invalid step '{}' in scene {}".format(step,
+                                                                    name))
+        code_id, repeat, gap_ms = match.groups()
+        repeat = 1 if repeat is None else int(repeat)
+        if not 1 <= repeat <= MAX_REPEAT:
+            raise SceneError("Invalid repeat '{}' in scene {}".format(step,
+                                                                      name))
+        if gap_ms is not None:
+            gap_ms = int(gap_ms)
+        steps.append((code_id, repeat, gap_ms))
+    return steps
+
+
+def gap_chain(micros):
+    """
+    Chain entries for micros of silence.  Gaps longer than one delay
+    command are a loop of maximal delays.
+    """
+    chain = []
+    count, rest = divmod(micros, MAX_DELAY)
+    if count == 1:
+        chain += delay(MAX_DELAY)
+    elif count > 1:
+        chain += LOOP_START + delay(MAX_DELAY) + loop_repeat(count)
+    if rest:
+        chain += delay(rest)
+    return chain
+
+
+def step_chain(wave_chain, repeat, gap_micros, is_last=False):
+    """
+    Chain entries for one step.  wave_chain is the code as wave ids.
+    """
+    gap = gap_chain(gap_micros)
+    if repeat == 1:
+        # Nothing follows the last step, so its gap is not waited for.
+        return list(wave_chain) if is_last else list(wave_chain) + gap
+    return LOOP_START + list(wave_chain) + gap + loop_repeat(repeat)
+
+
+def split_chains(step_chains):
+    """
+    Join the chains of the steps into as few chains as pigpio accepts.
+    Chains are split between steps only.  A step that alone exceeds the
+    limits is sent as a chain of its own.
+    """
+    chains = []
+    chain = []
+    loops = 0
+    for sc in step_chains:
+        sc_loops = count_loops(sc)
+        if chain and (len(chain) + len(sc) > MAX_CHAIN or
+                      loops + sc_loops > MAX_LOOPS):
+            chains.append(chain)
+            chain = []
+            loops = 0
+        chain = chain + sc
+        loops += sc_loops
+    if chain:
+        chains.append(chain)
+    return chains
+
+
+def count_loops(chain):
+    loops = 0
+    i = 0
+    while i < len(chain):
+        if chain[i] == 255:
+            if chain[i + 1] == 0:
+                loops += 1
+            i += {0: 2, 1: 4, 2: 4}.get(chain[i + 1], 2)
+        else:
+            i += 1
+    return loops
+
+
+def scene_chains(steps, code_chains, default_gap_ms):
+    """
+    Return the wave chains of a scene.
+
+    steps -- [(id, repeat, gap_ms), ...] from parse_scene()
+    code_chains -- {id: code as wave ids}
+    """
+    step_chains = []
+    for n, (code_id, repeat, gap_ms) in enumerate(steps):
+        if gap_ms is None:
+            gap_ms = default_gap_ms
+        step_chains.append(step_chain(code_chains[code_id], repeat,
+                                      int(gap_ms * 1000),
+                                      is_last=(n == len(steps) - 1)))
+    return split_chains(step_chains)
@@ -7,17 +7,21 @@ Created on Sun Dec 30 09:12:02 2018
 
 
 from os import path
-from slackclient import SlackClient
 import argparse
 import sys
 
 from config import ReadSetting
 from slacktools import SlackTools
-from irrp_file import IRRPFile
-from exceptions import SlackClassNotFound, SlackTokenAuthError, SlackError
-from gdrive import GDrive
+from irrp_file import IRRPFile, write_atomic
+from code_store import CodeStore
+from routing import route_all
+from metrics import NULL_TRACE
+from exceptions import (SlackClassNotFound, SlackTokenAuthError,
+                        SlackError, SceneError, WaveBudgetError,
+                        RoutingError, PigpioConnectionError)
 
-from irrp_with_class import IRRP
+# slackclient, gdrive and irrp_with_class (pigpio) are imported where they
+# are used, so that e.g. a local send does not pay for importing Slack.
 
 
 class SmartRemoteControl:
@@ -26,21 +30,121 @@ class SmartRemoteControl:
             self.SMARTRC_DIR = sys.argv[1]
         else:
             self.SMARTRC_DIR = smartrc_dir
+        self.wave_cache = None
+        self.pigpio_connection = None
+        self.tx_scheduler = None
+        self.command_runner = None
+        self.metrics = None
+        self._sc = None
+        self._stool = None
+        self._gdrive = None
         setting_filename =\
             path.join(self.SMARTRC_DIR, "setting/.smartrc.cfg")
         self.is_settingfile = False
         if path.isfile(setting_filename):
             self.read_setting()
             self.is_settingfile = True
-            self.irrpfile = IRRPFile(smartrc_dir=self.SMARTRC_DIR)
-            self.gdrive = GDrive(smartrc_dir=self.SMARTRC_DIR)
+            self.code_store = CodeStore()
+            self.irrpfile = IRRPFile(smartrc_dir=self.SMARTRC_DIR,
+                                     code_store=self.code_store,
+                                     storage=self.setting.return_storage())
+
+    @property
+    def sc(self):
+        if self._sc is None:
+            from slackclient import SlackClient
+            self._sc = SlackClient(self.setting.slack_token)
+        return self._sc
+
+    @property
+    def stool(self):
+        if self._stool is None:
+            self._stool = SlackTools(self.sc, self.setting)
+        return self._stool
+
+    @property
+    def gdrive(self):
+        if self._gdrive is None:
+            from gdrive import GDrive
+            self._gdrive = GDrive(smartrc_dir=self.SMARTRC_DIR,
+                                  runner=self.command_runner)
+        return self._gdrive
+
+    def keep_warm(self):
+        """
+        Keep the pigpio connection, compiled waves and parsed codes between
+        sends.  For long-lived processes such as the bot and the daemon.
+        """
+        from gpio_backend import backend
+        from metrics import Metrics
+        from numpy_support import enable_numpy
+        from pigpio_connection import PigpioConnection
+        from tx_scheduler import TxScheduler
+        from wave_cache import WaveCache
+        enable_numpy()
+        self.wave_cache = WaveCache()
+        self.tx_scheduler = TxScheduler()
+        host, port = self.setting.return_pigpio_address()
+        self.pigpio_connection = PigpioConnection(
+            host=host, port=port,
+            factory=backend(self.setting.return_pigpio_backend()))
+        if self.setting.return_metrics() is not None:
+            self.metrics = Metrics()
+
+    def new_trace(self):
+        """
+        Return a Trace for the stages of a request, see metrics.py.
+        """
+        if self.metrics is None:
+            return NULL_TRACE
+        return self.metrics.trace()
+
+    def serve_metrics(self):
+        """
+        Serve the metrics over HTTP if [METRICS] has a PORT.
+        """
+        metrics_setting = self.setting.return_metrics()
+        if self.metrics is None or metrics_setting["port"] is None:
+            return None
+        from metrics_server import start_metrics_server
+        return start_metrics_server(self.metrics, metrics_setting["host"],
+                                    metrics_setting["port"])
+
+    def handle_request(self, request, trace=NULL_TRACE):
+        """
+        Answer a request {"command": ..., "id": ...} of smartrc_client.
+        """
+        command = request.get("command")
+        if command == "send" or command == "playback":
+            playback_id = request.get("id")
+            self.update_id_list()
+            if playback_id not in self.id_list:
+                return {"ok": False,
+                        "message": "No recorded ID: {}".format(playback_id)}
+            return {"ok": True,
+                    "message": str(self.playback(playback_id, trace))}
+        elif command == "scene":
+            message = self.scene(request.get("id"), trace)
+            return {"ok": message.startswith("Sending"), "message": message}
+        elif command == "stats":
+            if self.metrics is None:
+                return {"ok": False,
+                        "message": "No metrics without a [METRICS] section"}
+            return {"ok": True, "message": self.metrics.summary()}
+        elif command == "list":
+            self.update_id_list()
+            return {"ok": True, "message": " ".join(self.id_list)}
+        elif command == "ping":
+            return {"ok": True, "message": "pong"}
+        return {"ok": False, "message": "Unknown command: {}".format(command)}
 
     def read_setting(self):
         self.setting = ReadSetting(self.SMARTRC_DIR)
-        self.sc = SlackClient(self.setting.slack_token)
-        self.stool = SlackTools(self.sc, self.setting)
+        self._sc = None
+        self._stool = None
         self.smartrc_commands = ["backup", "send", "playback",
-                                 "learn", "record", "recovery", "update"]
+                                 "learn", "record", "recovery", "update",
+                                 "scene", "compact", "stats"]
         if self.setting.mode is True:
             self.smartrc_commands.append("share")
         self.smartrc_commands.sort()
@@ -62,32 +166,129 @@ class SmartRemoteControl:
         print(self.arguments.command[0])
         if record_id is None:
             record_id = self.rcd_ply_common()
+        from irrp_with_class import IRRP
+        base = None
+        if self.setting.return_merge():
+            base = self.irrpfile.get_latest_filename() or None
         irrp = IRRP(gpio=self.setting.gpio_record,
                     filename=self.irrpfile.get_new_filename(),
-                    post=130, no_confirm=True)
+                    post=130, no_confirm=True,
+                    decode=self.setting.return_decode(), base=base,
+                    capture=self.setting.return_capture())
         irrp.record(record_id)
 
-    def playback(self, playback_id):
+    def playback(self, playback_id, trace=NULL_TRACE):
+        trace.mark("queue")
         self.update_id_list()
         if playback_id is None:
-            self.rcd_ply_common()
+            playback_id = self.rcd_ply_common()
         try:
             filename = self.irrpfile.get_latest_filename()
+            trace.mark("resolve")
             if playback_id in self.id_list:
-                irrp = IRRP(gpio=self.setting.gpio_playback,
-                            filename=filename)
+                from irrp_with_class import IRRP
+                irrp = IRRP(gpio=self.playback_gpios([playback_id]),
+                            filename=filename,
+                            wave_cache=self.wave_cache,
+                            connection=self.pigpio_connection,
+                            code_store=self.code_store,
+                            tx_scheduler=self.tx_scheduler,
+                            trace=trace)
                 irrp.playback(playback_id)
             return "Sending {}".format(playback_id)
         except FileNotFoundError as err:
             return err
+        except (WaveBudgetError, RoutingError, PigpioConnectionError) as err:
+            return err.message
+
+    def scene(self, scene_name, trace=NULL_TRACE):
+        """
+        Send the codes of a scene in the [SCENE] section back to back.
+        """
+        trace.mark("queue")
+        try:
+            scenes = self.setting.return_scenes()
+        except SceneError as err:
+            return err.message
+        if scene_name not in scenes:
+            return "No scene: {}".format(scene_name)
+        steps = scenes[scene_name]
+        self.update_id_list()
+        missing = [s[0] for s in steps if s[0] not in self.id_list]
+        if missing:
+            return "No recorded ID: {}".format(", ".join(missing))
+        try:
+            gpios = self.playback_gpios([s[0] for s in steps])
+        except RoutingError as err:
+            return err.message
+        filename = self.irrpfile.get_latest_filename()
+        trace.mark("resolve")
+        from irrp_with_class import IRRP
+        irrp = IRRP(gpio=gpios,
+                    filename=filename,
+                    wave_cache=self.wave_cache,
+                    connection=self.pigpio_connection,
+                    code_store=self.code_store,
+                    tx_scheduler=self.tx_scheduler,
+                    trace=trace)
+        try:
+            irrp.play_scene(steps)
+        except (WaveBudgetError, PigpioConnectionError) as err:
+            return err.message
+        return "Sending scene {}".format(scene_name)
+
+    def playback_gpios(self, code_ids):
+        """
+        Return the GPIOs to send code_ids on, see routing.py.
+        """
+        return route_all(code_ids, self.setting.return_routing(),
+                         self.setting.gpio_playbacks)
 
     def share(self):
         if self.setting.mode is True:
-            self.gdrive.upload()
-            self.stool.send_a_message("smartrc download_irrp_files")
+            self.push_to_peers()
+            # Other Pis only need to download if something changed.
+            if self.gdrive.upload():
+                self.stool.send_a_message("smartrc download_irrp_files")
         else:
             print("The mode is onlyPlayback")
 
+    def push_to_peers(self):
+        """
+        Push data/ to the Pis on the LAN, if [PEERS] is set.  Drive is
+        still updated afterwards.
+        """
+        peers_setting = self.setting.return_peers()
+        if peers_setting is None:
+            return
+        if peers_setting["secret"] is None:
+            print("Not pushed to peers: [PEERS] has no SECRET")
+            return
+        from peer_sync import discover, push_to_peers
+        peers = list(peers_setting["hosts"])
+        if peers_setting["multicast"]:
+            peers += [p for p in discover() if p not in peers]
+        results = push_to_peers(self.SMARTRC_DIR, peers,
+                                peers_setting["secret"])
+        for (host, port), result in sorted(results.items()):
+            if isinstance(result, Exception):
+                print("{}:{}: {}".format(host, port, result.message))
+            else:
+                print("{}:{}: sent {} files".format(host, port,
+                                                    len(result)))
+
+    def compact(self):
+        """
+        Convert the .irrp files of data/ to snapshots and remove the
+        codes no snapshot refers to.
+        """
+        from snapshot_store import SnapshotStore
+        store = SnapshotStore(path.join(self.SMARTRC_DIR, "data"))
+        for name in store.compact():
+            print("Converted {}".format(name))
+        print("{} snapshots, {} codes written".format(
+            len(store.manifests()), store.writes))
+
     def update_id_list(self):
         try:
             self.id_list = self.irrpfile.get_id_list()
@@ -95,26 +296,33 @@ class SmartRemoteControl:
             return err
 
     def update_smatrc_completion_elements(self):
+        """
+        Rewrite smartrc_completion_elements only when the commands or the
+        recorded IDs changed.  The file is replaced atomically so that a
+        shell sourcing it never sees it half written.
+        """
         self.update_id_list()
         smartrc_completion_elements_filename =\
             path.join(self.SMARTRC_DIR,
                       "smartrc_completion.d",
                       "smartrc_completion_elements")
-        with open(smartrc_completion_elements_filename, "w")\
-                as smartrc_completion_elements:
-            smartrc_completion_elements.write("#!/bin/bash\n\n")
-            smartrc_completion_elements.write("SMARTRC_COMMANDS=")
-            smartrc_completion_elements.write('"')
-            for smartrc_command in self.smartrc_commands:
-                smartrc_completion_elements.write(smartrc_command)
-                smartrc_completion_elements.write(" ")
-            smartrc_completion_elements.write('"\n')
-            smartrc_completion_elements.write("RCD_PLY_ID=")
-            smartrc_completion_elements.write('"')
-            for id_l in self.id_list:
-                smartrc_completion_elements.write(id_l)
-                smartrc_completion_elements.write(" ")
-            smartrc_completion_elements.write('"\n')
+        elements = "".join(["#!/bin/bash\n\n",
+                            "SMARTRC_COMMANDS=",
+                            '"',
+                            "".join(c + " " for c in self.smartrc_commands),
+                            '"\n',
+                            "RCD_PLY_ID=",
+                            '"',
+                            "".join(i + " " for i in self.id_list),
+                            '"\n'])
+        try:
+            with open(smartrc_completion_elements_filename, "r")\
+                    as smartrc_completion_elements:
+                if smartrc_completion_elements.read() == elements:
+                    return
+        except FileNotFoundError:
+            pass
+        write_atomic(elements, smartrc_completion_elements_filename)
 
     def get_arguments(self):
         parser = argparse.ArgumentParser()
@@ -126,6 +334,8 @@ class SmartRemoteControl:
         parser.add_argument("record_playback_id", nargs="?", type=str,
                             default=None,
                             help="record or playback id")
+        parser.add_argument("--yes", action="store_true",
+                            help="do not ask to confirm the id")
         self.arguments = parser.parse_args()
 
     def main(self):
@@ -133,7 +343,8 @@ class SmartRemoteControl:
         self.get_arguments()
         command = self.arguments.command[0]
         if self.arguments.record_playback_id:
-            if command not in ["send", "playback", "learn", "record"]:
+            if command not in ["send", "playback", "learn", "record",
+                               "scene"]:
                 print("The argument '{}' "
                       "was ignored".format(self.arguments.record_playback_id))
         if command == "backup":
@@ -144,8 +355,21 @@ class SmartRemoteControl:
             self.playback(None)
         elif command == "learn" or command == "record":
             self.record(None)
+        elif command == "scene":
+            if self.arguments.record_playback_id:
+                print(self.scene(self.arguments.record_playback_id))
+            else:
+                print("Scenes: {}".format(
+                    " ".join(self.setting.return_scenes())))
         elif command == "recovery":
             self.gdrive.download()
+        elif command == "compact":
+            self.compact()
+        elif command == "stats":
+            # Only the bot and smartrc_daemon.py, which run long enough,
+            # keep metrics.  smartrc_client.py asks them.
+            print("No metrics: neither the bot nor smartrc_daemon.py is "
+                  "running")
 
     def rcd_ply_common(self):
         rcd_ply_mode_str = self.arguments.command[0]
@@ -165,6 +389,8 @@ class SmartRemoteControl:
             if rcd_ply_id not in self.id_list:
                 print("No recorded ID: {}".format(rcd_ply_id))
                 return False
+        if self.arguments.yes:
+            return rcd_ply_id
         id_yn = input("Are you sure"
                       " to decide the {} id?:"
                       " {} (y/n): ".format(rcd_ply_mode_str, rcd_ply_id))
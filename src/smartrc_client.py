@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Entry point of the smartrc command.
+
+"smartrc send ID" and "smartrc scene NAME" are passed to the running bot
+or smartrc_daemon.py over a Unix socket, which keeps pigpiod connected
+and the codes compiled.  Any other command, or a send while neither is
+running, runs smartrc.py as before.  "smartrc stats" shows the latency
+of the stages of sends kept by the bot or the daemon, see metrics.py.
+Only the standard library is imported here.
+"""
+
+
+from os import path
+import json
+import os
+import socket
+import sys
+
+SEND_COMMANDS = ("send", "playback", "scene")
+
+
+def socket_filename(smartrc_dir):
+    # Same as smartrc_daemon.socket_filename.
+    return path.join(smartrc_dir, "run", "smartrc.sock")
+
+
+def request(smartrc_dir, command, request_id=None, connect_timeout=10.0):
+    """
+    Send a request to the daemon and return its reply
+    {"ok": ..., "message": ...}, or None if no daemon is listening.
+
+    Only connecting is timed out.  Once the request is sent the reply is
+    awaited however long the send is queued behind others, and a daemon
+    that goes away without replying gives a failed reply rather than
+    None, so the send is never made a second time in this process.
+    """
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(connect_timeout)
+    try:
+        try:
+            s.connect(socket_filename(smartrc_dir))
+        except OSError:
+            return None
+        s.settimeout(None)
+        s.sendall(json.dumps({"command": command, "id": request_id})
+                  .encode("utf-8") + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            data = s.recv(4096)
+            if not data:
+                break
+            reply += data
+        if not reply.endswith(b"\n"):
+            return {"ok": False,
+                    "message": "smartrc daemon closed the connection before "
+                               "replying, {} may have been done".format(
+                                   command)}
+        return json.loads(reply.decode("utf-8"))
+    except OSError as err:
+        return {"ok": False,
+                "message": "smartrc daemon did not reply, {} may have been "
+                           "done: {}".format(command, err)}
+    finally:
+        s.close()
+
+
+def run_smartrc(argv):
+    smartrc_filename = path.join(path.dirname(path.abspath(__file__)),
+                                 "smartrc.py")
+    os.execv(sys.executable, [sys.executable, smartrc_filename] + argv)
+
+
+def main(argv):
+    if len(argv) == 3 and argv[1] in SEND_COMMANDS:
+        smartrc_dir, command, send_id = argv
+        if command != "scene":
+            id_yn = input("Are you sure"
+                          " to decide the {} id?:"
+                          " {} (y/n): ".format(command, send_id))
+            if not id_yn.lower() == "y":
+                print("Canceled")
+                return
+        reply = request(smartrc_dir, command, send_id)
+        if reply is not None:
+            print(reply["message"])
+            if not reply["ok"]:
+                sys.exit(1)
+            return
+        argv = argv + ["--yes"]
+    elif len(argv) == 2 and argv[1] == "stats":
+        reply = request(argv[0], "stats")
+        if reply is not None:
+            print(reply["message"])
+            if not reply["ok"]:
+                sys.exit(1)
+            return
+    run_smartrc(argv)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resident smartrc that answers smartrc_client.py over a Unix socket.
+
+The bot (run.py) serves the socket itself.  Without the bot run
+
+python3 src/smartrc_daemon.py SMARTRC_DIR
+
+Protocol: the client sends one JSON line {"command": ..., "id": ...} and
+reads one JSON line {"ok": ..., "message": ...} back.
+"""
+
+
+from os import path
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+from metrics import NULL_TRACE
+from smartrc import SmartRemoteControl
+from smartrc_client import SEND_COMMANDS
+
+
+def socket_filename(smartrc_dir):
+    return path.join(smartrc_dir, "run", "smartrc.sock")
+
+
+def is_listening(filename):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(filename)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+class SmartrcRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        trace = self.server.smartrc.new_trace()
+        command = None
+        try:
+            request = json.loads(line.decode("utf-8"))
+            command = request.get("command")
+            trace.mark("parse")
+            reply = self.server.smartrc.handle_request(request, trace)
+        except Exception as err:
+            reply = {"ok": False, "message": str(err)}
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+        if command in SEND_COMMANDS:
+            trace.finish("reply")
+
+
+class SmartrcServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, smartrc):
+        self.smartrc = smartrc
+        self.FILE = socket_filename(smartrc.SMARTRC_DIR)
+        os.makedirs(path.dirname(self.FILE), exist_ok=True)
+        if path.exists(self.FILE):
+            if is_listening(self.FILE):
+                raise OSError("smartrc is already served on {}"
+                              "".format(self.FILE))
+            # Left behind by a process that did not shut down cleanly.
+            os.remove(self.FILE)
+        super().__init__(self.FILE, SmartrcRequestHandler)
+        os.chmod(self.FILE, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.FILE)
+        except FileNotFoundError:
+            pass
+
+
+def start_server(smartrc):
+    """
+    Serve smartrc in a background thread.  Return the server, or None if
+    the socket is already served by another process.
+    """
+    try:
+        server = SmartrcServer(smartrc)
+    except OSError as err:
+        print("smartrc socket was not started: {}".format(err))
+        return None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+class SmartrcDaemon(SmartRemoteControl):
+    def __init__(self, smartrc_dir=None):
+        super().__init__(smartrc_dir)
+        if not self.is_settingfile:
+            raise FileNotFoundError("smartrc setting file is not found")
+        self.keep_warm()
+        # Requests are served by several threads, but there is only one
+        # transmitter.
+        self.lock = threading.Lock()
+
+    def handle_request(self, request, trace=NULL_TRACE):
+        if request.get("command") == "stats":
+            return super().handle_request(request)
+        with self.lock:
+            return super().handle_request(request, trace)
+
+    def main(self):
+        server = SmartrcServer(self)
+        self.serve_metrics()
+        print("Serving smartrc on {}".format(server.FILE))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 smartrc_daemon.py SMARTRC_DIR")
+        sys.exit(1)
+    smartrc_daemon = SmartrcDaemon()
+    smartrc_daemon.main()
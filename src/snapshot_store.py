@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content-addressed snapshots of data/.
+
+Each code is stored once as data/code_<sha256>.json, the sha256 of its
+canonical JSON.  A snapshot data/snapshot_%Y%m%d_%H%M%S.json only holds
+{id: sha256}, so a recording session adds a small manifest and the
+codes that are new, and Drive and peer sync move just those files.
+Code files are never rewritten; gc() removes the ones no snapshot
+refers to.  The names gc() and compact() remove are kept in
+data/.removed.json, so that Drive sync does not bring them back.
+
+python3 src/snapshot_store.py compact|gc|export [options]
+"""
+
+
+from collections.abc import Mapping
+from os import path
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from irrp_file import dumps_records, write_atomic
+
+VERSION = 1
+CODE_PATTERN = re.compile(r"^code_([0-9a-f]{64})\.json$")
+MANIFEST_PATTERN = re.compile(r"^snapshot_(\d{8}_\d{6})\.json$")
+IRRP_PATTERN = re.compile(r"^smartrc_(\d{8}_\d{6})\.irrp$")
+TOMBSTONES_NAME = ".removed.json"
+
+
+def canonical(code):
+    return json.dumps(code, sort_keys=True, separators=(",", ":"))
+
+
+def code_hash(code):
+    return hashlib.sha256(canonical(code).encode("utf-8")).hexdigest()
+
+
+def read_tombstones(data_dir):
+    """
+    Return the set of names removed from data_dir by gc() or compact().
+    """
+    try:
+        with open(path.join(data_dir, TOMBSTONES_NAME), "r") as f:
+            return set(json.load(f))
+    except (FileNotFoundError, ValueError):
+        return set()
+
+
+def is_manifest(filename):
+    return MANIFEST_PATTERN.match(path.basename(filename)) is not None
+
+
+class SnapshotRecords(Mapping):
+    """
+    Read-only records {id: code} of a snapshot.  A code file is read on
+    first use of its id.
+    """
+    def __init__(self, store, hashes):
+        self.store = store
+        self.hashes = hashes
+        self.codes = {}
+
+    def __getitem__(self, code_id):
+        code = self.codes.get(code_id)
+        if code is None:
+            code = self.store.get(self.hashes[code_id])
+            self.codes[code_id] = code
+        return code
+
+    def __iter__(self):
+        return iter(self.hashes)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, code_id):
+        return code_id in self.hashes
+
+
+class SnapshotStore:
+    def __init__(self, data_dir):
+        self.DATA_DIR = data_dir
+        self.writes = 0
+
+    def code_filename(self, digest):
+        return path.join(self.DATA_DIR, "code_{}.json".format(digest))
+
+    def put(self, code):
+        """
+        Store code unless a file with its hash exists.  Return the hash.
+        """
+        text = canonical(code)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        filename = self.code_filename(digest)
+        if not path.exists(filename):
+            write_atomic(text + "\n", filename)
+            self.writes += 1
+        return digest
+
+    def get(self, digest):
+        with open(self.code_filename(digest), "r") as f:
+            return json.load(f)
+
+    def read_manifest(self, filename):
+        with open(filename, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != VERSION:
+            raise ValueError("Unsupported snapshot version: {}".format(
+                manifest.get("version")))
+        return manifest["codes"]
+
+    def open(self, filename):
+        return SnapshotRecords(self, self.read_manifest(filename))
+
+    def commit(self, records, filename):
+        """
+        Store the codes of records and write the snapshot filename.
+        """
+        hashes = {code_id: self.put(records[code_id])
+                  for code_id in records}
+        write_atomic(json.dumps({"version": VERSION, "codes": hashes},
+                                sort_keys=True, indent=1) + "\n", filename)
+
+    def manifests(self):
+        return sorted(name for name in os.listdir(self.DATA_DIR)
+                      if MANIFEST_PATTERN.match(name))
+
+    def gc(self, keep=None):
+        """
+        Remove all but the keep latest snapshots if keep is given, then
+        the code files no snapshot refers to.  Return the removed names.
+        """
+        manifests = self.manifests()
+        removed = []
+        if keep is not None and len(manifests) > keep:
+            for name in manifests[:len(manifests) - keep]:
+                os.remove(path.join(self.DATA_DIR, name))
+                removed.append(name)
+            manifests = manifests[len(manifests) - keep:]
+        referenced = set()
+        for name in manifests:
+            referenced.update(self.read_manifest(
+                path.join(self.DATA_DIR, name)).values())
+        for name in sorted(os.listdir(self.DATA_DIR)):
+            match = CODE_PATTERN.match(name)
+            if match and match.group(1) not in referenced:
+                os.remove(path.join(self.DATA_DIR, name))
+                removed.append(name)
+        self.bury(removed)
+        return removed
+
+    def bury(self, names):
+        """
+        Add names to the tombstones of data/.
+        """
+        if not names:
+            return
+        tombstones = read_tombstones(self.DATA_DIR) | set(names)
+        write_atomic(json.dumps(sorted(tombstones), indent=1) + "\n",
+                     path.join(self.DATA_DIR, TOMBSTONES_NAME))
+
+    def export(self, filename, irrp_filename):
+        """
+        Write the snapshot filename as a JSON .irrp file.
+        """
+        records = self.open(filename)
+        write_atomic(dumps_records({k: records[k] for k in records}),
+                     irrp_filename)
+
+    def compact(self):
+        """
+        Convert every data/smartrc_*.irrp to a snapshot of the same time,
+        remove it and its backups, and collect unreferenced codes.
+        Return the converted names.
+        """
+        from irrp_binary import open_records
+        converted = []
+        for name in sorted(os.listdir(self.DATA_DIR)):
+            match = IRRP_PATTERN.match(name)
+            if match is None:
+                continue
+            irrp_filename = path.join(self.DATA_DIR, name)
+            try:
+                records = open_records(irrp_filename)
+            except ValueError as err:
+                print("Skip {}: {}".format(name, err))
+                continue
+            self.commit(records, path.join(
+                self.DATA_DIR, "snapshot_{}.json".format(match.group(1))))
+            if hasattr(records, "close"):
+                records.close()
+            removed = []
+            for suffix in ("", ".bak", ".bak1", ".bak2"):
+                try:
+                    os.remove(irrp_filename + suffix)
+                except FileNotFoundError:
+                    continue
+                removed.append(name + suffix)
+            self.bury(removed)
+            converted.append(name)
+        self.gc()
+        return converted
+
+
+def store_of(filename):
+    return SnapshotStore(path.dirname(path.abspath(filename)))
+
+
+def open_snapshot(filename):
+    return store_of(filename).open(filename)
+
+
+def write_snapshot(records, filename):
+    store_of(filename).commit(records, filename)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["compact", "gc", "export"])
+    parser.add_argument("-d", "--dir", default=path.join(
+        path.dirname(path.abspath(__file__)), "..", "data"),
+        help="data directory")
+    parser.add_argument("--keep", type=int,
+                        help="gc: number of latest snapshots to keep")
+    parser.add_argument("-s", "--snapshot",
+                        help="export: snapshot, default the latest")
+    parser.add_argument("-o", "--output", help="export: .irrp filename")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.dir)
+    if args.command == "compact":
+        for name in store.compact():
+            print("Converted {}".format(name))
+    elif args.command == "gc":
+        for name in store.gc(args.keep):
+            print("Removed {}".format(name))
+    else:
+        snapshot = args.snapshot
+        if snapshot is None:
+            manifests = store.manifests()
+            if not manifests:
+                parser.error("no snapshot in {}".format(args.dir))
+            snapshot = path.join(args.dir, manifests[-1])
+        output = args.output
+        if output is None:
+            match = MANIFEST_PATTERN.match(path.basename(snapshot))
+            output = path.join(args.dir, "smartrc_{}.irrp".format(
+                match.group(1) if match else "export"))
+        store.export(snapshot, output)
+        print("Exported {}".format(output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Wait for pigpiod to finish sending a wave chain.
+"""
+
+
+import time
+
+from metrics import NULL_TRACE
+
+
+def chain_duration(chain, durations):
+    """
+    Return the microseconds pigpiod takes to send chain, or None if it
+    loops forever.  durations is {wave id: microseconds}.
+    """
+    # Total of the chain and of every loop that is open.
+    totals = [0]
+    i = 0
+    while i < len(chain):
+        entry = chain[i]
+        if entry != 255:
+            totals[-1] += durations[entry]
+            i += 1
+            continue
+        command = chain[i + 1]
+        if command == 0:  # Loop start
+            totals.append(0)
+            i += 2
+        elif command == 1:  # Loop repeat
+            count = chain[i + 2] | chain[i + 3] << 8
+            body = totals.pop() if len(totals) > 1 else 0
+            totals[-1] += body * count
+            i += 4
+        elif command == 2:  # Delay
+            totals[-1] += chain[i + 2] | chain[i + 3] << 8
+            i += 4
+        elif command == 3:  # Loop forever
+            return None
+        else:
+            i += 2
+    return sum(totals)
+
+
+class TxScheduler:
+    """
+    Wait for the end of a wave chain without polling wave_tx_busy()
+    while it is being sent.
+
+    The duration of a chain is known from its pulse lengths, so sleep
+    until shortly before it ends and confirm the end with a few
+    wave_tx_busy() calls.  Should pigpiod still be busy after max_checks
+    calls, fall back to polling every POLL_S seconds like before.
+    """
+    POLL_S = 0.002
+
+    def __init__(self, margin=0.001, check_interval=0.0005, max_checks=8):
+        self.margin = margin
+        self.check_interval = check_interval
+        self.max_checks = max_checks
+        self.sends = 0
+        self.checks = 0
+        self.polls = 0
+
+    def send(self, pi, chain, durations, trace=NULL_TRACE):
+        """
+        Send chain with wave_chain() and return when it has been sent.
+        """
+        duration = None
+        if durations is not None:
+            duration = chain_duration(chain, durations)
+        pi.wave_chain(chain)
+        trace.mark("wave_chain")
+        self.wait(pi, time.monotonic(), duration)
+        trace.mark("tx")
+
+    def wait(self, pi, started, duration):
+        """
+        Wait for the chain started at time.monotonic() started, which
+        takes duration microseconds.
+        """
+        self.sends += 1
+        if duration is not None:
+            delay = started + duration / 1e6 - self.margin - time.monotonic()
+            if delay > 0.0:
+                time.sleep(delay)
+            for _ in range(self.max_checks):
+                self.checks += 1
+                if not pi.wave_tx_busy():
+                    return
+                time.sleep(self.check_interval)
+        while True:
+            self.polls += 1
+            if not pi.wave_tx_busy():
+                return
+            time.sleep(self.POLL_S)
+
+    @property
+    def round_trips(self):
+        return self.checks + self.polls
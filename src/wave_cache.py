@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Waves of codes kept in pigpiod between sends, within its wave memory.
+"""
+
+
+from collections import OrderedDict
+from os import path
+
+import pigpio
+
+
+class CompiledWave:
+    """
+    pigpio waves created for one code.
+
+    Attributes:
+        wave_ids -- ids of all waves created for the code
+        chain -- wave ids in transmission order, passed to wave_chain()
+        sizes -- {wave id: number of pulses added to pigpiod}
+        signature -- file_signature() of the .irrp file the code came from
+        durations -- {wave id: microseconds} for TxScheduler
+    """
+    def __init__(self, wave_ids, chain, sizes, signature=None,
+                 durations=None):
+        self.wave_ids = wave_ids
+        self.chain = chain
+        self.sizes = sizes
+        self.signature = signature
+        self.durations = durations
+
+    @property
+    def pulses(self):
+        return sum(self.sizes.values())
+
+    @property
+    def cbs(self):
+        return WaveCache.estimate_cbs(self.pulses, len(self.wave_ids))
+
+
+class WaveCache:
+    """
+    Keep the pigpio waves of sent codes so that a long-lived process
+    does not synthesize the carrier and create waves on every send.
+
+    Entries are keyed by (code id, GPIOs, carrier frequency).  An entry is
+    rebuilt when the .irrp file it was compiled from has been rewritten.
+    pigpiod has room for a limited number of pulses, DMA control blocks
+    and waves, so entries are deleted before a new entry would exceed
+    those limits.
+
+    pigpiod keeps its waves in a stack: wave_delete() only flags a wave,
+    and its memory is given back once every wave with a higher id is
+    deleted too, or to a new wave of exactly the same size.  So the
+    cache counts every wave up to the highest one it holds, and deletes
+    the entries of the highest waves first.
+    """
+    MAX_PULSES = 12000  # pigpio wave_get_max_pulses()
+    MAX_CBS = 25016  # pigpio wave_get_max_cbs()
+    MAX_WAVES = 250  # Wave ids 250-255 are reserved for chain commands.
+
+    def __init__(self, max_pulses=MAX_PULSES, max_cbs=MAX_CBS,
+                 max_waves=MAX_WAVES):
+        self.max_pulses = max_pulses
+        self.max_cbs = max_cbs
+        self.max_waves = max_waves
+        self.entries = OrderedDict()
+        # {wave id: pulses} of the waves pigpiod keeps memory for, those
+        # deleted below a wave of an entry included.
+        self.sizes = {}
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def estimate_cbs(pulses, waves):
+        # Each pulse needs a control block for the level change and one
+        # for the delay, and each wave needs one more to link the chain.
+        return 2 * pulses + waves
+
+    def used(self):
+        pulses = sum(self.sizes.values())
+        waves = len(self.sizes)
+        return pulses, self.estimate_cbs(pulses, waves), waves
+
+    def fits(self, pulses, waves):
+        return (pulses <= self.max_pulses and
+                self.estimate_cbs(pulses, waves) <= self.max_cbs and
+                waves <= self.max_waves)
+
+    def bind(self, pi, generation):
+        """
+        Clear the cache when the PigpioConnection was reopened.  If only
+        the socket broke the waves are still in pigpiod and are deleted.
+        If pigpiod was restarted they are gone and the deletes fail.
+        """
+        if generation != self.generation:
+            if self.generation is not None:
+                self.clear(pi)
+            self.generation = generation
+
+    def lookup(self, pi, key, signature):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.signature != signature:  # The .irrp file was rewritten.
+            self.evict(pi, key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def reserve(self, pi, pulses, waves):
+        """
+        Evict the entries of the highest waves until a new entry of the
+        given size fits.  The size must fit in an empty cache, as a plan
+        of plan_waves() within the limits of the cache does.
+        """
+        while self.entries:
+            used_pulses, _, used_waves = self.used()
+            if self.fits(used_pulses + pulses, used_waves + waves):
+                break
+            self.evict(pi, max(self.entries,
+                               key=lambda k: max(self.entries[k].wave_ids)))
+
+    def store(self, pi, key, entry):
+        if key in self.entries:
+            self.evict(pi, key)
+        self.entries[key] = entry
+        self.sizes.update(entry.sizes)
+
+    def evict(self, pi, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.delete_waves(pi, entry)
+            self.reclaim()
+
+    def reclaim(self):
+        """
+        Forget the deleted waves at the top of the stack, whose memory
+        pigpiod has given back.
+        """
+        held = set()
+        for entry in self.entries.values():
+            held.update(entry.wave_ids)
+        for wid in sorted(self.sizes, reverse=True):
+            if wid in held:
+                break
+            del self.sizes[wid]
+
+    def invalidate(self, pi, filename=None):
+        """
+        Delete the entries compiled from filename, or all entries.
+        """
+        if filename is not None:
+            filename = path.realpath(filename)
+        for key in list(self.entries):
+            signature = self.entries[key].signature
+            if (filename is None or signature is None or
+                    signature[0] == filename):
+                self.evict(pi, key)
+
+    def clear(self, pi):
+        self.invalidate(pi)
+
+    @staticmethod
+    def delete_waves(pi, entry):
+        for wid in entry.wave_ids:
+            try:
+                pi.wave_delete(wid)
+            except pigpio.error:
+                pass  # Already gone, e.g. pigpiod was restarted.
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plan the pigpio waves of a send before any of them is created.
+
+A wave is described by its shape, ((mark, space), ...): each part is
+the carrier for mark microseconds followed by space microseconds of
+silence.  A layout turns the marks and spaces of the codes into shapes
+and chains:
+
+    group 0 -- one wave per distinct mark and per distinct space
+    group n -- one wave per n consecutive (mark, space) pairs
+    chunk   -- marks of at least chunk carrier cycles are sent as a
+               wave of chunk cycles, repeated by a chain loop, and a
+               wave for the rest
+
+plan_waves() computes the pulses, control blocks, waves and chain
+entries of the layouts in turn and returns the first that fits in the
+budget, with the fewest waves.  Long marks are only split if nothing
+fits without.
+"""
+
+
+from collections import OrderedDict
+
+import pigpio
+
+from carrier import carrier_table
+from exceptions import WaveBudgetError
+from scene import MAX_CHAIN, MAX_LOOPS, LOOP_START, loop_repeat
+from wave_cache import WaveCache
+
+PLAIN = 0
+# Layouts tried in turn.  Larger groups take more pulses, so they are
+# only used if the chains are too long otherwise.
+GROUPS = ((PLAIN, 1), (2, 4, 8))
+# A loop takes 255 0 wave 255 1 x y, so fewer chunks are chained as is.
+LOOP_ENTRIES = 7
+
+
+class WaveBudget:
+    """
+    What the waves and chains of one send may use of pigpiod.
+    """
+    def __init__(self, pulses=WaveCache.MAX_PULSES, cbs=WaveCache.MAX_CBS,
+                 waves=WaveCache.MAX_WAVES, chain=MAX_CHAIN,
+                 loops=MAX_LOOPS):
+        self.pulses = pulses
+        self.cbs = cbs
+        self.waves = waves
+        self.chain = chain
+        self.loops = loops
+
+    def fits(self, plan):
+        return (plan.pulses <= self.pulses and plan.cbs <= self.cbs and
+                plan.waves <= self.waves and
+                plan.chain_length <= self.chain)
+
+
+class WavePlan:
+    """
+    The waves of a send and the chains that send them.
+
+    Attributes:
+        shapes -- shape of each wave to create, see the module docstring
+        templates -- chain of each code, with shapes for the wave ids
+        pulses -- number of pulses the waves add to pigpiod
+        group, chunk -- the layout
+    """
+    def __init__(self, shapes, templates, pulses, group, chunk):
+        self.shapes = shapes
+        self.templates = templates
+        self.pulses = pulses
+        self.group = group
+        self.chunk = chunk
+
+    @property
+    def waves(self):
+        return len(self.shapes)
+
+    @property
+    def cbs(self):
+        return WaveCache.estimate_cbs(self.pulses, self.waves)
+
+    @property
+    def chain_length(self):
+        return max([len(t) for t in self.templates] or [0])
+
+    def chains(self, wave_ids):
+        """
+        Return the chain of each code, wave_ids being the ids of shapes.
+        """
+        ids = dict(zip(self.shapes, wave_ids))
+        return [[ids[entry] if isinstance(entry, tuple) else entry
+                 for entry in template] for template in self.templates]
+
+
+def cycles(frequency, micros):
+    # As many carrier cycles as carrier_durations() makes.
+    return int(round(micros / (1000.0 / frequency)))
+
+
+def chunk_cycles(frequency, low=32, high=96):
+    """
+    Return the cycles of a chunk, chosen so that it lasts as close to
+    a whole number of microseconds as possible, and repeating it adds
+    up to the length of the mark.
+    """
+    cycle = 1000.0 / frequency
+    return min(range(low, high + 1),
+               key=lambda c: (round(abs(c * cycle - round(c * cycle)), 6),
+                              c))
+
+
+def split_mark(frequency, chunk, mark):
+    """
+    Return the number of chunks of mark and the microseconds left.
+    """
+    count, rest = divmod(cycles(frequency, mark), chunk)
+    if not count:
+        return 0, mark
+    return count, int(round(rest * 1000.0 / frequency))
+
+
+def shape_pulses(frequency, shape):
+    return sum(2 * cycles(frequency, mark) + (1 if space else 0)
+               for mark, space in shape)
+
+
+def build_wave(gpio, frequency, shape):
+    """
+    Return the pulses of shape on a GPIO or a tuple of GPIOs for
+    wave_add_generic().
+    """
+    wf = []
+    for mark, space in shape:
+        if mark:
+            wf.extend(carrier_table.get(gpio, frequency, mark))
+        if space:
+            wf.append(pigpio.pulse(0, 0, space))
+    return wf
+
+
+def shapes_of(parts, group):
+    if group == PLAIN:
+        shapes = []
+        for mark, space in parts:
+            if mark:
+                shapes.append(((mark, 0),))
+            if space:
+                shapes.append(((0, space),))
+        return shapes
+    if group == 1:
+        return [(part,) for part in parts]
+    return [tuple(parts[i:i + group]) for i in range(0, len(parts), group)]
+
+
+def code_template(code, frequency, group, chunk, max_loops):
+    if not chunk:
+        parts = list(zip(code[0::2], code[1::2]))
+        if len(code) % 2:
+            parts.append((code[-1], 0))
+        return shapes_of(parts, group)
+    template = []
+    # (mark, space) pairs not in template yet.
+    parts = []
+    loops = 0
+    for i in range(0, len(code), 2):
+        mark = code[i]
+        space = code[i + 1] if i + 1 < len(code) else 0
+        count, mark = split_mark(frequency, chunk, mark)
+        if count:
+            template += shapes_of(parts, group)
+            parts = []
+            shape = ((int(round(chunk * 1000.0 / frequency)), 0),)
+            if count > LOOP_ENTRIES and loops < max_loops:
+                template += LOOP_START + [shape] + loop_repeat(count)
+                loops += 1
+            else:
+                template += [shape] * count
+        if mark or space:
+            parts.append((mark, space))
+    template += shapes_of(parts, group)
+    return template
+
+
+def layout(codes, frequency, group=PLAIN, chunk=None, max_loops=MAX_LOOPS):
+    """
+    Return the WavePlan of codes in a layout, see the module docstring.
+    group=PLAIN without chunk is one wave per distinct mark and space.
+    """
+    templates = [code_template(code, frequency, group, chunk, max_loops)
+                 for code in codes]
+    shapes = OrderedDict()
+    for template in templates:
+        for entry in template:
+            if isinstance(entry, tuple) and entry not in shapes:
+                shapes[entry] = shape_pulses(frequency, entry)
+    return WavePlan(list(shapes), templates, sum(shapes.values()), group,
+                    chunk)
+
+
+def plan_waves(codes, frequency, budget=None):
+    """
+    Return the WavePlan of codes with the fewest waves, then pulses,
+    that fits in budget.  Raise WaveBudgetError if none fits.
+    """
+    if budget is None:
+        budget = WaveBudget()
+    plans = []
+    for chunk in (None, chunk_cycles(frequency)):
+        for groups in GROUPS:
+            tried = [layout(codes, frequency, group, chunk, budget.loops)
+                     for group in groups]
+            fitting = [plan for plan in tried if budget.fits(plan)]
+            if fitting:
+                return min(fitting, key=lambda p: (p.waves, p.pulses,
+                                                   p.chain_length))
+            plans += tried
+    plan = min(plans, key=lambda p: p.pulses)
+    raise WaveBudgetError(
+        "Codes need {} pulses, {} waves and {} chain entries, pigpiod "
+        "has room for {}, {} and {}".format(
+            plan.pulses, plan.waves, plan.chain_length, budget.pulses,
+            budget.waves, budget.chain))